@@ -22,7 +22,7 @@ def create_cost_analysis(df):
     freight_ratio = (total_freight / total_revenue * 100) if total_revenue > 0 else 0
     
     # 按目的地计算运费占比
-    dest_cost = df.groupby('发往地').agg({
+    dest_cost = df.groupby('发往地', observed=True).agg({
         '运费': 'sum',
         '预估利润': 'sum',
         '重量（吨）': 'sum'
@@ -41,7 +41,7 @@ def create_cost_analysis(df):
     
     # 2. 亏损预警分析
     # A. 品类亏损
-    category_profit = df.groupby('类别').agg({
+    category_profit = df.groupby('类别', observed=True).agg({
         '吨利润': 'mean',
         '预估利润': 'sum',
         '重量（吨）': 'sum'
@@ -49,7 +49,7 @@ def create_cost_analysis(df):
     loss_categories = category_profit[category_profit['吨利润'] < 0].sort_values('吨利润')
     
     # B. 路线亏损（品类+目的地组合）
-    route_profit = df.groupby(['类别', '发往地']).agg({
+    route_profit = df.groupby(['类别', '发往地'], observed=True).agg({
         '吨利润': 'mean',
         '预估利润': 'sum',
         '重量（吨）': 'sum',
@@ -19,7 +19,7 @@ def create_monthly_comparison(df, is_compare_mode):
         return None, None, None
     
     # 按月份汇总
-    monthly_summary = df.groupby('月份标签').agg({
+    monthly_summary = df.groupby('月份标签', observed=True).agg({
         '重量（吨）': 'sum',
         '预估利润': 'sum',
         '运费': 'sum',
@@ -36,13 +36,13 @@ def create_monthly_comparison(df, is_compare_mode):
     monthly_summary = monthly_summary.fillna(0).round(2)
     
     # 按月份+品类汇总（用于品类对比）
-    monthly_category = df.groupby(['月份标签', '类别']).agg({
+    monthly_category = df.groupby(['月份标签', '类别'], observed=True).agg({
         '重量（吨）': 'sum',
         '预估利润': 'sum'
     }).round(2).reset_index()
     
     # 按月份+目的地汇总
-    monthly_dest = df.groupby(['月份标签', '发往地']).agg({
+    monthly_dest = df.groupby(['月份标签', '发往地'], observed=True).agg({
         '重量（吨）': 'sum',
         '预估利润': 'sum',
         '运费': 'sum'
@@ -15,7 +15,7 @@ def create_summary_table(df):
         tuple: (category_summary, destination_summary, weekly_summary, daily_summary)
     """
     # 品类汇总
-    category_summary = df.groupby('类别').agg({
+    category_summary = df.groupby('类别', observed=True).agg({
         '重量（吨）': ['sum', 'mean', 'std'],
         '预估利润': ['sum', 'mean'],
         '吨利润': 'mean',
@@ -25,7 +25,7 @@ def create_summary_table(df):
     category_summary.columns = ['总重量', '平均重量', '重量标准差', '总利润', '平均利润', '吨利润', '运费单价', '利润率']
     
     # 目的地汇总
-    destination_summary = df.groupby('发往地').agg({
+    destination_summary = df.groupby('发往地', observed=True).agg({
         '重量（吨）': 'sum',
         '预估利润': ['sum', 'mean'],
         '吨利润': 'mean',
@@ -35,7 +35,7 @@ def create_summary_table(df):
     destination_summary.columns = ['总重量', '总利润', '平均利润', '平均吨利润', '平均运费单价', '车次']
     
     # 计算吨均运费
-    destination_freight = df.groupby('发往地').agg({
+    destination_freight = df.groupby('发往地', observed=True).agg({
         '运费': 'sum',
         '重量（吨）': 'sum'
     })
@@ -47,7 +47,7 @@ def create_summary_table(df):
     destination_summary['吨均运费'] = destination_freight['吨均运费'].round(2)
     
     # 周度汇总
-    weekly_summary = df.groupby('周标签').agg({
+    weekly_summary = df.groupby('周标签', observed=True).agg({
         '重量（吨）': ['sum', 'mean'],
         '预估利润': ['sum', 'mean'],
         '中文日期': 'count'
@@ -55,7 +55,7 @@ def create_summary_table(df):
     weekly_summary.columns = ['总重量', '平均重量', '总利润', '平均利润', '运输次数']
     
     # 日度汇总 (High/Low 分析用)
-    daily_summary = df.groupby('中文日期').agg({
+    daily_summary = df.groupby('中文日期', observed=True).agg({
         '重量（吨）': 'sum',
         '预估利润': 'sum',
         '车牌号': 'count'
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""查看与维护数据缓存：列出、查看、校验、清理条目，统计命中率与节省的时间。"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import time
+from datetime import datetime
+
+from core.cache import data_cache
+from core.columnar import META_FILE, load_value
+
+
+def _format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def _format_ms(ms: float) -> str:
+    return f"{ms / 1000:.2f} s" if abs(ms) >= 1000 else f"{ms:.0f} ms"
+
+
+def _format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts else "-"
+
+
+def _hit_rate(hits: int, misses: int) -> str:
+    total = hits + misses
+    return f"{hits / total:.0%}" if total else "-"
+
+
+def _find_entry(key_prefix: str) -> dict:
+    matches = data_cache.list_entries(key_prefix=key_prefix)
+    if not matches:
+        raise SystemExit(f"未找到键以 {key_prefix} 开头的条目。")
+    if len(matches) > 1:
+        raise SystemExit(f"键前缀 {key_prefix} 匹配到 {len(matches)} 个条目，请输入更长的前缀。")
+    return matches[0]
+
+
+def _frame_metas(path: str) -> list[tuple[str, dict]]:
+    """条目目录中各 DataFrame 的列式元数据（旧版 .pkl 条目没有）"""
+    metas = []
+    if not os.path.isdir(path):
+        return metas
+    for root, _dirs, files in sorted(os.walk(path)):
+        if META_FILE in files:
+            with open(os.path.join(root, META_FILE), "r", encoding="utf-8") as f:
+                metas.append((os.path.relpath(root, path), json.load(f)))
+    return metas
+
+
+def cmd_list(args: argparse.Namespace) -> None:
+    entries = data_cache.list_entries(key_name=args.kind)
+    if not entries:
+        print("缓存为空。")
+        return
+    print(f"{'键':<14} {'类型':<18} {'大小':>9} {'命中':>5} {'未命中':>6} {'读取':>9} {'节省':>9}  最近访问          工作表")
+    for info in entries:
+        print(
+            f"{info['key'][:12]:<14} {info['key_name'] or '-':<18} {_format_bytes(info['size']):>9} "
+            f"{info['hits']:>5} {info['misses']:>6} {_format_ms(info['load_ms']):>9} "
+            f"{_format_ms(info['saved_ms']):>9}  {_format_time(info['last_access'])}  "
+            f"{', '.join(info['sheets'])}"
+        )
+    print(f"共 {len(entries)} 个条目，{_format_bytes(sum(info['size'] for info in entries))}")
+
+
+def cmd_inspect(args: argparse.Namespace) -> None:
+    info = _find_entry(args.key)
+    print(f"键:       {info['key']}")
+    print(f"目录:     {info['path']}")
+    print(f"类型:     {info['key_name'] or '-'}")
+    print(f"工作簿:   {info['file_path'] or '-'}")
+    print(f"工作表:   {', '.join(info['sheets']) or '-'}")
+    print(f"大小:     {_format_bytes(info['size'])}（不压缩 {_format_bytes(max(info['raw_size'], info['size']))}）")
+    if info["codecs"]:
+        print(f"列编码:   {', '.join(f'{codec} × {count}' for codec, count in info['codecs'].items())}")
+    print(f"创建:     {_format_time(info['created'])}")
+    print(f"最近访问: {_format_time(info['last_access'])}")
+    print(f"命中:     {info['hits']} 次，未命中 {info['misses']} 次（命中率 {_hit_rate(info['hits'], info['misses'])}）")
+    average_load = info["load_ms"] / info["hits"] if info["hits"] else 0.0
+    print(f"读取耗时: 累计 {_format_ms(info['load_ms'])}，平均 {_format_ms(average_load)}")
+    print(f"计算耗时: {_format_ms(info['compute_ms']) if info['compute_ms'] else '未知'}")
+    print(f"节省时间: {_format_ms(info['saved_ms'])}")
+    for name, meta in _frame_metas(info["path"]):
+        print(f"\n[{name}] {meta['rows']} 行 × {len(meta['columns'])} 列")
+        for spec in meta["columns"]:
+            print(f"  {spec['name']:<16} {spec['dtype']:<14} {spec['kind']:<9} {spec.get('codec', 'raw')}")
+
+
+def cmd_verify(args: argparse.Namespace) -> None:
+    broken = []
+    entries = data_cache.list_entries(key_name=args.kind)
+    for info in entries:
+        path = info["path"]
+        try:
+            if os.path.isdir(path):
+                # 不使用内存映射，完整读取每一列
+                load_value(path, mmap_mode=None)
+            else:
+                with open(path, "rb") as f:
+                    pickle.load(f)
+        except Exception as e:
+            broken.append(info)
+            print(f"损坏: {info['key'][:12]} {info['key_name']} [{', '.join(info['sheets'])}] - {e}")
+    print(f"已校验 {len(entries)} 个条目，损坏 {len(broken)} 个。")
+    if broken and args.fix:
+        data_cache.remove(broken)
+        print(f"已删除 {len(broken)} 个损坏条目。")
+
+
+def cmd_prune(args: argparse.Namespace) -> None:
+    max_bytes = None if args.max_mb is None else int(args.max_mb * 1024 ** 2)
+    if args.unused_days is None and max_bytes is None and not args.all:
+        raise SystemExit("请指定 --unused-days、--max-mb 或 --all。")
+    removed = data_cache.prune(unused_days=args.unused_days, max_bytes=max_bytes, key_name=args.kind)
+    print(f"已删除 {len(removed)} 个条目，释放 {_format_bytes(sum(info['size'] for info in removed))}。")
+
+
+def cmd_stats(args: argparse.Namespace) -> None:
+    stats = data_cache.get_stats()
+    totals = stats["entries"]
+    print(f"条目:     {stats['disk_entries']} 个，{_format_bytes(stats['disk_bytes'])}"
+          f"（压缩节省 {_format_bytes(stats['bytes_saved'])}）")
+    print(f"命中:     {totals['hits']} 次，未命中 {totals['misses']} 次（命中率 {_hit_rate(totals['hits'], totals['misses'])}）")
+    print(f"读取耗时: {totals['load_seconds']:.2f} s")
+    print(f"节省时间: {totals['saved_seconds']:.2f} s")
+
+    by_kind: dict[str, dict] = {}
+    for info in data_cache.list_entries():
+        kind = by_kind.setdefault(info["key_name"] or "-", {"entries": 0, "size": 0, "hits": 0, "misses": 0, "saved_ms": 0.0})
+        kind["entries"] += 1
+        for field in ("size", "hits", "misses", "saved_ms"):
+            kind[field] += info[field]
+    # 尚无条目的未命中（计算失败、被取消）也计入该类数据的命中率
+    for name, misses in data_cache.lookup_misses().items():
+        kind = by_kind.setdefault(name or "-", {"entries": 0, "size": 0, "hits": 0, "misses": 0, "saved_ms": 0.0})
+        kind["misses"] += misses
+    if by_kind:
+        print(f"\n{'类型':<18} {'条目':>5} {'大小':>9} {'命中':>5} {'未命中':>6} {'命中率':>6} {'节省':>9}")
+        for name, kind in sorted(by_kind.items(), key=lambda item: -item[1]["saved_ms"]):
+            print(
+                f"{name:<18} {kind['entries']:>5} {_format_bytes(kind['size']):>9} {kind['hits']:>5} "
+                f"{kind['misses']:>6} {_hit_rate(kind['hits'], kind['misses']):>6} {_format_ms(kind['saved_ms']):>9}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="查看与维护数据缓存（~/.packing_station_cache）。")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="列出缓存条目（最近访问的在前）")
+    list_parser.add_argument("--kind", help="只列出该类数据，如 cleaned、stage_summary")
+    list_parser.set_defaults(func=cmd_list)
+
+    inspect_parser = subparsers.add_parser("inspect", help="查看单个条目的详情与列编码")
+    inspect_parser.add_argument("key", help="条目键或其前缀（list 输出的前 12 位即可）")
+    inspect_parser.set_defaults(func=cmd_inspect)
+
+    verify_parser = subparsers.add_parser("verify", help="完整读取每个条目，检查是否损坏")
+    verify_parser.add_argument("--kind", help="只校验该类数据")
+    verify_parser.add_argument("--fix", action="store_true", help="删除损坏的条目")
+    verify_parser.set_defaults(func=cmd_verify)
+
+    prune_parser = subparsers.add_parser("prune", help="按条件清理条目")
+    prune_parser.add_argument("--unused-days", type=float, help="删除超过该天数未访问的条目")
+    prune_parser.add_argument("--max-mb", type=float, help="按最近访问时间淘汰，直到总大小不超过该值（MB）")
+    prune_parser.add_argument("--kind", help="只清理该类数据")
+    prune_parser.add_argument("--all", action="store_true", help="删除全部（或 --kind 指定类型的全部）条目")
+    prune_parser.set_defaults(func=cmd_prune)
+
+    stats_parser = subparsers.add_parser("stats", help="汇总命中率、读取耗时与节省的时间")
+    stats_parser.set_defaults(func=cmd_stats)
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    args.func(args)
+    if args.command in ("verify", "prune"):
+        print(f"用时 {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 """
 全局配置常量
 """
+import os
 
 # ==========================================
 # 版本与标识
@@ -42,11 +43,111 @@ WEEK_MAP = {
     3: '周四', 4: '周五', 5: '周六', 6: '周日'
 }
 WEEK_ORDER = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+# 数据在原工作表中的 Excel 行号（用于剔除记录与问题追溯）
+SOURCE_ROW_COL = '源行号'
+# 清洗完成后转为分类类型（category）的低基数文本列
+COMPACT_CATEGORY_COLS = ['类别', '发往地', '车牌号', '星期', '周标签', '中文日期', '月份标签']
+# 不同取值数占行数的比例超过该值时不转换（基数太高时分类类型反而更占内存）
+COMPACT_MAX_UNIQUE_RATIO = 0.5
+# 降为 int8 的小整数列
+COMPACT_INT8_COLS = ['星期数字', '周']
+
+# ==========================================
+# 运费异常检测配置
+# ==========================================
+# 按发往地（可选 类别×发往地）分组，以该车之前最近 N 车（不含本车）的中位数 / MAD 计算稳健 Z 分数
+FREIGHT_ANOMALY_WINDOW = 30
+# 线路此前至少有多少车才计算分数，不足时分数为空（不标记异常）
+FREIGHT_ANOMALY_MIN_PERIODS = 5
+# 离散度下限（占中位数的比例）：近期运费几乎不变的线路，小幅上调不会被放大成异常
+FREIGHT_ANOMALY_MIN_SCALE_RATIO = 0.01
+# 稳健 Z 分数超过该值标记为运费异常（只标记偏高）
+FREIGHT_ANOMALY_THRESHOLD = 3.5
+# 是否按 类别×发往地 分组（默认只按发往地）
+FREIGHT_ANOMALY_BY_CATEGORY = False
+
+# ==========================================
+# 数据质量检查配置
+# ==========================================
+# 质量报告中每个问题展开后列出的问题行数（完整明细导出到 Excel）
+VALIDATION_PREVIEW_ROWS = 20
+# 「质量问题明细」工作表中每个问题最多导出的问题行数（其余只计数，避免超出 Excel 行数上限）
+VALIDATION_DETAIL_MAX_ROWS = 1000
+# 校验方式: 'auto' = 超过阈值时抽样, 'exact' = 始终全量, 'sample' = 始终抽样
+VALIDATION_MODE = 'auto'
+# 自动切换为抽样校验的行数阈值
+VALIDATION_SAMPLE_THRESHOLD = 1000000
+# 抽样校验的目标样本行数（按 月份标签 × 类别 分层，各层按比例抽取）
+VALIDATION_SAMPLE_SIZE = 200000
+# 每层至少抽取的行数（不足则整层全取）
+VALIDATION_SAMPLE_MIN_STRATUM = 200
+# 问题数估计的置信水平
+VALIDATION_CONFIDENCE = 0.95
+# 抽样随机种子（同一份数据每次结果一致）
+VALIDATION_SAMPLE_SEED = 42
+
+# ==========================================
+# 数据加载配置
+# ==========================================
+LOADER_MAX_WORKERS = 8  # 多进程并行读取工作表时的最大进程数
+# 读取引擎: 'stream' = 流式 XLSX 引擎（布局不符时自动回退 pandas）, 'pandas' = pandas + openpyxl
+LOADER_ENGINE = 'stream'
+# 流式引擎每读取多少行上报一次进度并检查取消请求
+READ_CHUNK_ROWS = 2000
+# 流式引擎中写入 float 数组的列（列名包含任一关键字）
+STREAM_FLOAT_KEYWORDS = ['重量', '运费', '预估利润', '卖出价', '扣点']
+# 流式引擎中字典编码的低基数文本列
+STREAM_CODE_COLS = ['类别', '发往地', '车牌号']
+# 工作表选择框概况预览：读取表头后的行数 / 扫描 XML 末尾的字节数
+PREVIEW_HEAD_ROWS = 20
+PREVIEW_TAIL_BYTES = 64 * 1024
+# 末尾扫描上限：压缩存储的工作表 XML 只能从头解压，解压后超过该字节数时不扫描（截止日期留空）；
+# 第二轮扫描全部工作表的总耗时上限（秒），超出后其余工作表只显示起始日期
+PREVIEW_TAIL_MAX_SCAN_BYTES = 4 * 1024 ** 2
+PREVIEW_TAIL_BUDGET_SECONDS = 0.2
+
+# ==========================================
+# 表头模板配置
+# ==========================================
+# 程序设置文件（与 template_path 等界面设置共用，模板配置保存在 schema_profiles 键下）
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'permit_settings_pro.json')
+# 是否按模板只读取需要的列并在读取时声明类型
+SCHEMA_PROFILE_ENABLED = True
+# 除关键列外额外保留的列（存在时读取）
+SCHEMA_OPTIONAL_COLS = ['运费', '预估利润', '备注']
+# 是否只读取分析需要的列（关键列与上面的可选列）；裁剪后导出的清洗后明细不再包含其他列
+SCHEMA_PRUNE_COLUMNS = False
 
 # ==========================================
 # 缓存配置
 # ==========================================
+# 缓存目录与恢复目录（默认放在用户目录下，可用环境变量另行指定，如测试时指向临时目录）
+CACHE_DIR = os.environ.get('PACKING_STATION_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.packing_station_cache')
+RECOVERY_DIR = os.environ.get('PACKING_STATION_RECOVERY_DIR') or os.path.join(os.path.expanduser('~'), '.packing_station_recovery')
+# 启动时检查恢复数据最多等待后台检查点写完的秒数（超时则按磁盘上已写完的检查点判断）
+RECOVERY_FLUSH_TIMEOUT_SECONDS = 2
 CACHE_MAX_AGE_DAYS = 7  # 缓存过期天数
+# 缓存总大小上限（字节），超出时按最近访问时间淘汰最久未用的条目
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# 进程内存缓存层的大小上限（字节，按估算占用计），超出时淘汰最久未用的条目
+CACHE_MEMORY_MAX_BYTES = 512 * 1024 ** 2
+# 索引中不存在的条目目录（写入中途退出留下的临时目录等）超过该小时数后清理
+CACHE_ORPHAN_MAX_AGE_HOURS = 24
+# 命中计数与最近访问时间先在内存中累计，后台线程每隔该秒数批量写入索引（退出时也会写入）
+CACHE_HIT_FLUSH_SECONDS = 5
+# 缓存列压缩: 'auto' = 按样本实测的压缩率与解压速度逐列选择, 'none' = 不压缩, 或指定 'zlib' / 'lzma' / 'lz4'
+CACHE_COMPRESSION = 'auto'
+# 估算读取耗时用的磁盘读取速度（MB/s）；压缩后读取更快时才压缩
+CACHE_DISK_READ_MBPS = 200
+# 小于该字节数的列不压缩 / 选择编码时的样本字节数
+CACHE_COMPRESS_MIN_BYTES = 64 * 1024
+CACHE_COMPRESS_SAMPLE_BYTES = 64 * 1024
+# 选择工作表期间后台预取：是否启用 / 最多预先解析几个最近使用且尚未缓存的工作表
+PREFETCH_ENABLED = True
+PREFETCH_MAX_SHEETS = 2
+# 行指纹（重复检测）：参与哈希的关键列（另加含年份的完整日期）与历史指纹保留天数
+FINGERPRINT_KEY_COLS = ['车牌号', '发往地', '类别']
+FINGERPRINT_MAX_AGE_DAYS = 90
 
 # ==========================================
 # 输出目录配置
@@ -1,15 +1,17 @@
 # -*- coding: utf-8 -*-
 """
-核心模块：日志、缓存、性能监控与恢复系统
+核心模块：日志、缓存、阶段结果缓存、性能监控与恢复系统
 """
 from .logger import ErrorLogger, error_logger, print_log
 from .cache import DataCache, data_cache
+from .memo import StageMemo, stage_memo
 from .performance import PerformanceMonitor, perf_monitor
 from .recovery import RecoveryManager, recovery_manager_instance, offer_recovery_dialog, AutoSaveContext
 
 __all__ = [
     'ErrorLogger', 'error_logger', 'print_log', 
     'DataCache', 'data_cache',
+    'StageMemo', 'stage_memo',
     'PerformanceMonitor', 'perf_monitor',
     'RecoveryManager', 'recovery_manager_instance', 'offer_recovery_dialog', 'AutoSaveContext'
 ]
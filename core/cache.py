@@ -1,16 +1,221 @@
 # -*- coding: utf-8 -*-
 """
 磁盘持久化缓存系统
+
+缓存键取自工作表内容签名（工作表 XML 解压后内容的摘要），文件被复制、移动或原样另存后仍可命中；
+清洗结果按工作表分别缓存，任意月份组合都由单表条目拼装。
+条目以列式格式保存（见 core.columnar），命中时各列以内存映射方式打开。
+
+索引保存在 SQLite 表中（每次读写只涉及一行），按总字节数上限以最近访问时间（LRU）淘汰，
+淘汰与过期清理在后台线程中进行。
+
+磁盘层之前另有进程内存层（MemoryTier）：同一进程再次读取时直接返回内存中的结果，
+写入时同时写入两层，两层各自统计命中 / 未命中次数。
+
+多个程序实例 / 批处理任务可共用同一缓存目录：条目先写入临时目录再改名，索引由 SQLite 事务保护；
+get_or_compute / compute_lock 按条目加跨进程锁，同一条目只由一个进程计算，其他进程等待后直接复用。
+
+索引中每个条目另记命中次数、查找未命中次数、累计读取耗时与计算耗时，条目被新版本替换时计数保留；
+条目尚不存在时的未命中（如计算失败或被取消）记在 lookup_misses 表中，写入条目时并入该条目；
+节省时间按 命中次数 × 计算耗时 − 累计读取耗时 估算（计算耗时未知的条目不计）。可用 cache_cli.py 查看、校验与清理。
 """
+import atexit
 import os
 import time
 import hashlib
 import pickle
 import json
+import shutil
+import sqlite3
+import sys
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
 
-from config import CACHE_MAX_AGE_DAYS
+from config import (
+    CACHE_MAX_AGE_DAYS, CACHE_MAX_BYTES, CACHE_MEMORY_MAX_BYTES, CACHE_ORPHAN_MAX_AGE_HOURS,
+    CACHE_HIT_FLUSH_SECONDS, CACHE_DIR
+)
+from .columnar import dump_value, load_value, new_stats
+from .filelock import FileLock
 from .logger import print_log
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    entry TEXT NOT NULL,
+    key_name TEXT,
+    file_path TEXT,
+    sheets TEXT,
+    sheets_meta TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS lookup_misses (
+    key TEXT PRIMARY KEY,
+    key_name TEXT,
+    misses INTEGER NOT NULL DEFAULT 0,
+    last_miss REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recent_sheets (
+    file_path TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (file_path, sheet)
+);
+"""
+# 后续版本新增的条目列（旧索引打开时自动补上）
+_ADDED_COLUMNS = [
+    ('raw_size', 'INTEGER NOT NULL DEFAULT 0'),  # 不压缩时的字节数
+    ('codecs', 'TEXT'),                          # 各压缩编码的列数（JSON）
+    ('hits', 'INTEGER NOT NULL DEFAULT 0'),      # 命中次数（内存层与磁盘层合计）
+    ('misses', 'INTEGER NOT NULL DEFAULT 0'),    # 查找未命中次数
+    ('load_ms', 'REAL NOT NULL DEFAULT 0'),      # 磁盘命中累计读取耗时（毫秒）
+    ('compute_ms', 'REAL NOT NULL DEFAULT 0'),   # 计算一次该条目的耗时（毫秒，未知时为 0）
+]
+_INSERT_ENTRY = (
+    'INSERT OR REPLACE INTO entries '
+    '(key, entry, key_name, file_path, sheets, sheets_meta, size, created, last_access, raw_size, codecs, '
+    'hits, misses, load_ms, compute_ms) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+# 列出条目时读取的列
+_ENTRY_COLUMNS = ('key', 'entry', 'key_name', 'file_path', 'sheets', 'size', 'raw_size', 'codecs',
+                  'created', 'last_access', 'hits', 'misses', 'load_ms', 'compute_ms')
+
+
+def _entry_size(path):
+    """缓存条目占用的字节数（目录按文件累加）"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _frame_nbytes(df, sample_rows=2000):
+    """估算 DataFrame 内存占用（文本列按前若干行的平均长度外推）"""
+    if len(df) <= sample_rows:
+        return int(df.memory_usage(deep=True).sum())
+    sample = df.iloc[:sample_rows].memory_usage(deep=True, index=False).sum()
+    return int(sample * len(df) / sample_rows)
+
+
+def _value_nbytes(value):
+    """估算缓存值的内存占用（递归统计容器中的 DataFrame）"""
+    if isinstance(value, pd.DataFrame):
+        return _frame_nbytes(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_value_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_value_nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+def _detach(value):
+    """复制容器与 DataFrame 外壳（数据按写时复制共享），调用方修改结果不会影响缓存"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_detach(item) for item in value)
+    if isinstance(value, list):
+        return [_detach(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _detach(item) for key, item in value.items()}
+    return value
+
+
+class MemoryTier:
+    """进程内 LRU 缓存层 - 按估算字节数限制总量，超出时淘汰最久未用的条目"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()  # 缓存条目键 -> (缓存值, sharedStrings 元数据, 字节数)
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def get(self, key):
+        """读取条目并标记为最近使用
+
+        Returns:
+            tuple: (缓存值, sharedStrings 元数据)，未命中返回 None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return _detach(item[0]), item[1]
+    
+    def put(self, key, value, sheets_meta):
+        """写入条目（单个条目超过总量上限时不保存）"""
+        nbytes = _value_nbytes(value)
+        with self._lock:
+            self._pop(key)
+            if nbytes > self.max_bytes:
+                return
+            self._items[key] = (_detach(value), sheets_meta, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._items)))
+    
+    def discard(self, key):
+        with self._lock:
+            self._pop(key)
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+    
+    def _pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.nbytes -= item[2]
+
+
+class EntryLock:
+    """一组缓存条目的计算锁（single-flight）- 按键排序依次加锁，避免相互等待造成死锁"""
+    
+    def __init__(self, lock_paths):
+        self._locks = [FileLock(path) for path in sorted(set(lock_paths))]
+    
+    def acquire(self, timeout=None):
+        """获取全部条目锁；超时则释放已获得的锁并返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for i, lock in enumerate(self._locks):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not lock.acquire(timeout=remaining):
+                for held in self._locks[:i]:
+                    held.release()
+                return False
+        return True
+    
+    def release(self):
+        for lock in reversed(self._locks):
+            lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
+
 
 class DataCache:
     """数据缓存管理器 - 磁盘持久化，避免重复计算"""
@@ -23,135 +228,639 @@ class DataCache:
         return cls._instance
     
     def _init_cache(self):
-        """初始化缓存目录和索引"""
-        # 缓存目录放在用户文档目录下
-        self.cache_dir = os.path.join(os.path.expanduser('~'), '.packing_station_cache')
-        self.index_file = os.path.join(self.cache_dir, 'cache_index.json')
+        """初始化缓存路径与进程内状态（缓存目录与索引在首次使用时才打开，见 _db）"""
+        self.cache_dir = CACHE_DIR
+        self.db_file = os.path.join(self.cache_dir, 'cache_index.db')
+        self.lock_dir = os.path.join(self.cache_dir, 'locks')
+        self._init_process_state()
+        atexit.register(self._flush_hits)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._init_process_state)
+    
+    def _init_process_state(self):
+        """进程内状态（fork 出的子进程重新初始化：不沿用父进程的 SQLite 连接、锁与未写入的命中计数）"""
+        self._lock = threading.RLock()
+        self._conn = None
+        self.memory = MemoryTier(CACHE_MEMORY_MAX_BYTES)
+        self._sst_usage = {}  # 工作表签名 -> 引用的 sharedStrings 条数
+        self.stats = {tier: {'hits': 0, 'misses': 0} for tier in ('memory', 'disk')}
+        self.decode_seconds = 0.0  # 本进程读取压缩列的解压耗时
+        self._pending_hits = {}  # 条目键 -> [命中次数, 读取耗时 ms, 最近访问时间, 未命中次数]，由后台线程批量写入索引
+        self._validated = {}  # 条目键 -> 已校验过 sharedStrings 的工作簿会话（弱引用）
+        self._evict_wakeup = threading.Event()
+    
+    @property
+    def _db(self):
+        """索引数据库连接（首次访问时打开）
         
+        进程池中只解析工作表的子进程从不访问索引，因此不会创建缓存目录、打开 SQLite 或启动淘汰线程。
+        """
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._open_index()
+        return self._conn
+    
+    def _open_index(self):
+        """创建缓存目录、打开索引并启动后台淘汰线程"""
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
+        self._conn = self._open_db()
+        self._migrate_json_index(os.path.join(self.cache_dir, 'cache_index.json'))
         
-        # 加载缓存索引
-        self.index = self._load_index()
-        
-        # 自动清理过期缓存
-        self._cleanup_old_cache()
+        # 后台淘汰线程：启动时运行一次，之后在写入超出容量时唤醒；同时定期写入累计的命中计数
+        self._evict_wakeup.set()
+        threading.Thread(target=self._evict_loop, name='cache-evict', daemon=True).start()
     
-    def _load_index(self):
-        """加载缓存索引"""
-        if os.path.exists(self.index_file):
-            try:
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                return {}
-        return {}
+    def _open_db(self):
+        """打开索引数据库（WAL 模式，单行写入无需重写整个索引）"""
+        db = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(_SCHEMA)
+        existing = {row[1] for row in db.execute('PRAGMA table_info(entries)')}
+        for name, decl in _ADDED_COLUMNS:
+            if name not in existing:
+                db.execute(f'ALTER TABLE entries ADD COLUMN {name} {decl}')
+        db.commit()
+        return db
     
-    def _save_index(self):
-        """保存缓存索引"""
+    def _migrate_json_index(self, json_file):
+        """导入旧版 JSON 索引（导入后删除）"""
+        if not os.path.exists(json_file):
+            return
         try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(self.index, f, ensure_ascii=False, indent=2)
+            with open(json_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            with self._lock:
+                for key, info in legacy.items():
+                    path = self._entry_path(key, info)
+                    if 'sheets_meta' not in info or not os.path.exists(path):
+                        continue
+                    size = _entry_size(path)
+                    self._db.execute(
+                        _INSERT_ENTRY,
+                        (key, os.path.basename(path), info.get('key_name'), info.get('file_path'),
+                         json.dumps(info.get('sheets', []), ensure_ascii=False),
+                         json.dumps(info['sheets_meta'], ensure_ascii=False),
+                         size, info.get('created', 0), info.get('created', 0), size, None, 0, 0, 0, 0))
+                self._db.commit()
+            os.remove(json_file)
         except Exception as e:
-            print(f"\033[1;33m[CACHE] 无法保存缓存索引: {e}\033[0m")
+            print(f"\033[1;33m[CACHE] 无法导入旧版缓存索引: {e}\033[0m")
+    
+    def _entry_path(self, full_key, info):
+        """缓存条目路径：列式目录（旧版本为单个 .pkl 文件）"""
+        if 'entry' in info:
+            return os.path.join(self.cache_dir, info['entry'])
+        return os.path.join(self.cache_dir, f"{full_key}.pkl")
     
-    def _cleanup_old_cache(self, max_age_days=None):
-        """清理超过指定天数的旧缓存"""
+    def _remove_entry(self, path):
+        """删除缓存条目（目录或文件；被内存映射占用时留待下次清理）"""
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+    
+    def _row(self, full_key):
+        """读取一条索引记录（含命中计数，替换条目时沿用）"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT entry, sheets_meta, hits, misses, load_ms, compute_ms FROM entries WHERE key = ?',
+                (full_key,)).fetchone()
+        if row is None:
+            return None
+        return {'entry': row[0], 'sheets_meta': json.loads(row[1]),
+                'hits': row[2], 'misses': row[3], 'load_ms': row[4], 'compute_ms': row[5]}
+    
+    def _evict_loop(self):
+        """后台淘汰线程（兼顾命中计数的批量写入）"""
+        while True:
+            woken = self._evict_wakeup.wait(CACHE_HIT_FLUSH_SECONDS)
+            self._evict_wakeup.clear()
+            try:
+                self._flush_hits()
+                if woken:
+                    self._evict_entries()
+            except Exception as e:
+                print(f"\033[1;33m[CACHE] 缓存清理失败: {e}\033[0m")
+    
+    def _evict_entries(self, max_age_days=None, max_bytes=None):
+        """清理过期缓存，并在总大小超出上限时按最近访问时间淘汰最久未用的条目"""
         if max_age_days is None:
             max_age_days = CACHE_MAX_AGE_DAYS
+        if max_bytes is None:
+            max_bytes = CACHE_MAX_BYTES
         
-        now = time.time()
-        max_age_seconds = max_age_days * 24 * 3600
-        keys_to_remove = []
-        
-        for key, info in self.index.items():
-            cache_time = info.get('created', 0)
-            if now - cache_time > max_age_seconds:
-                keys_to_remove.append(key)
-                cache_file = os.path.join(self.cache_dir, f"{key}.pkl")
-                if os.path.exists(cache_file):
-                    try:
-                        os.remove(cache_file)
-                    except Exception:
-                        pass
-        
-        for key in keys_to_remove:
-            del self.index[key]
-        
-        if keys_to_remove:
-            self._save_index()
-            print_log(f"已清理 {len(keys_to_remove)} 个过期缓存", "CACHE")
+        cutoff = time.time() - max_age_days * 24 * 3600
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT key, entry, size, created FROM entries ORDER BY last_access').fetchall()
+        
+        total = sum(row[2] for row in rows)
+        victims = []
+        for key, entry, size, created in rows:
+            if created < cutoff or total > max_bytes:
+                victims.append((key, entry))
+                total -= size
+        if victims:
+            self._remove_rows(victims)
+            print_log(f"已清理 {len(victims)} 个缓存条目（过期或超出 {max_bytes / 1024 ** 2:.0f} MB 上限）", "CACHE")
+        self._remove_lookup_misses(before=cutoff)
+        self._remove_orphans()
+    
+    def _remove_rows(self, victims):
+        """删除索引记录及其条目
+        
+        Args:
+            victims: [(条目键, 条目目录名)]，只删除读取时的那个版本（其间其他进程可能已写入新版本）
+        """
+        with self._lock:
+            self._db.executemany('DELETE FROM entries WHERE key = ? AND entry = ?', victims)
+            self._db.commit()
+        for key, entry in victims:
+            self.memory.discard(key)
+            self._remove_entry(os.path.join(self.cache_dir, entry))
+    
+    def _remove_lookup_misses(self, before=None, key_name=None):
+        """删除没有对应条目的未命中记录
+        
+        Args:
+            before: 只删除最近一次未命中早于该时间戳的记录（None 表示不限）
+            key_name: 只删除该类数据的记录（None 表示全部）
+        """
+        sql, params = 'DELETE FROM lookup_misses WHERE 1 = 1', []
+        if before is not None:
+            sql += ' AND last_miss < ?'
+            params.append(before)
+        if key_name:
+            sql += ' AND key_name = ?'
+            params.append(key_name)
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+    
+    def _remove_orphans(self):
+        """清理索引中不存在的条目目录（写入中途退出的临时目录、删除失败的旧版本）与长期未用的锁文件"""
+        cutoff = time.time() - CACHE_ORPHAN_MAX_AGE_HOURS * 3600
+        with self._lock:
+            known = {row[0] for row in self._db.execute('SELECT entry FROM entries')}
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name in known or name in ('locks', 'fingerprints'):
+                continue
+            if not (os.path.isdir(path) or name.endswith('.pkl')):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    self._remove_entry(path)
+            except OSError:
+                pass
+        if os.path.isdir(self.lock_dir):
+            for name in os.listdir(self.lock_dir):
+                path = os.path.join(self.lock_dir, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+    
+    def _open_session(self, file_path):
+        """工作簿会话（延迟导入，避免 core 与 data 相互依赖）"""
+        from data.workbook import open_workbook
+        return open_workbook(file_path)
     
     def _get_cache_key(self, file_path, sheet_names):
-        """生成缓存键：基于文件路径 + 修改时间 + 选中的工作表"""
+        """生成缓存键：基于各工作表的内容签名（与文件路径、修改时间无关）"""
         try:
-            mtime = os.path.getmtime(file_path)
-            key_str = f"{file_path}:{mtime}:{','.join(sorted(sheet_names))}"
-            return hashlib.md5(key_str.encode()).hexdigest()
+            session = self._open_session(file_path)
+            signatures = [session.sheet_signature(sheet) for sheet in sorted(sheet_names)]
+            return hashlib.md5('|'.join(signatures).encode()).hexdigest()
         except Exception:
             return None
     
-    def get(self, file_path, sheet_names, key_name):
-        """获取缓存数据"""
+    def _strings_match(self, session, sheets_meta):
+        """校验各工作表引用的 sharedStrings 是否未变（只比对前 N 条的摘要）"""
+        for meta in sheets_meta:
+            if session.shared_strings_digest(meta['sst_count']) != meta['sst_digest']:
+                return False
+        return True
+    
+    def _strings_valid(self, file_path, sheets_meta):
+        try:
+            return self._strings_match(self._open_session(file_path), sheets_meta)
+        except Exception:
+            return False
+    
+    def _full_key(self, file_path, sheet_names, key_name, variant=None):
+        """缓存条目键（内存层与磁盘层共用），无法生成时返回 None
+
+        Args:
+            variant: 同一组工作表上的不同派生结果（如流水线阶段参数与代码版本）
+        """
         cache_key = self._get_cache_key(file_path, sheet_names)
         if not cache_key:
             return None
+        if variant:
+            cache_key = hashlib.md5(f"{cache_key}|{variant}".encode('utf-8')).hexdigest()
+        return f"{cache_key}_{key_name}"
+    
+    def _sheets_meta(self, session, sheet_names):
+        """各工作表引用的 sharedStrings 范围与摘要（引用条数按工作表签名记忆，避免重复扫描）"""
+        sheets_meta = []
+        for sheet in sorted(sheet_names):
+            signature = session.sheet_signature(sheet)
+            count = self._sst_usage.get(signature)
+            if count is None:
+                count = self._sst_usage[signature] = session.shared_string_usage(sheet)
+            sheets_meta.append({
+                'sheet': sheet,
+                'sst_count': count,
+                'sst_digest': session.shared_strings_digest(count)
+            })
+        return sheets_meta
+    
+    def _lookup(self, file_path, full_key):
+        """只读索引元数据判断磁盘缓存是否命中
         
-        full_key = f"{cache_key}_{key_name}"
+        Returns:
+            tuple: 命中时返回 (条目路径, sharedStrings 元数据)，否则返回 None
+        """
+        info = self._row(full_key)
+        if info is None or not self._strings_valid(file_path, info['sheets_meta']):
+            return None
+        path = self._entry_path(full_key, info)
+        if not os.path.exists(path):
+            return None
+        return path, info['sheets_meta']
+    
+    def _record_hit(self, full_key, load_ms=0.0):
+        """命中计数加一并更新最近访问时间（先在内存中累计，由 _flush_hits 批量写入）"""
+        with self._lock:
+            pending = self._pending_hits.setdefault(full_key, [0, 0.0, 0.0, 0])
+            pending[0] += 1
+            pending[1] += load_ms
+            pending[2] = time.time()
+    
+    def _record_miss(self, full_key):
+        """未命中计数加一（与命中计数一起批量写入）"""
+        with self._lock:
+            self._pending_hits.setdefault(full_key, [0, 0.0, 0.0, 0])[3] += 1
+    
+    def _flush_hits(self):
+        """把累计的命中 / 未命中计数写入索引（一次事务）
         
-        # 检查索引中是否存在
-        if full_key not in self.index:
+        条目尚不存在时未命中计数写入 lookup_misses，之后写入该条目时并入。
+        """
+        with self._lock:
+            if not self._pending_hits:
+                return
+            pending, self._pending_hits = self._pending_hits, {}
+            now = time.time()
+            for key, (hits, load_ms, last_access, misses) in pending.items():
+                updated = self._db.execute(
+                    'UPDATE entries SET last_access = MAX(last_access, ?), hits = hits + ?, load_ms = load_ms + ?, '
+                    'misses = misses + ? WHERE key = ?',
+                    (last_access, hits, load_ms, misses, key)).rowcount
+                if not updated and misses:
+                    self._db.execute(
+                        'INSERT INTO lookup_misses (key, key_name, misses, last_miss) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET misses = misses + excluded.misses, last_miss = excluded.last_miss',
+                        (key, key.split('_', 1)[1] if '_' in key else None, misses, now))
+            self._db.commit()
+    
+    def _strings_checked(self, file_path, full_key, sheets_meta):
+        """sharedStrings 校验（同一会话内已校验过的条目不再计算摘要；文件修改后会话重建，重新校验）"""
+        try:
+            session = self._open_session(file_path)
+        except Exception:
+            return False
+        with self._lock:
+            ref = self._validated.get(full_key)
+        if ref is not None and ref() is session:
+            return True
+        if not self._strings_match(session, sheets_meta):
+            return False
+        with self._lock:
+            self._validated[full_key] = weakref.ref(session)
+        return True
+    
+    def _count(self, tier, hit):
+        with self._lock:
+            self.stats[tier]['hits' if hit else 'misses'] += 1
+    
+    def get(self, file_path, sheet_names, key_name, variant=None, count_miss=True):
+        """获取缓存数据（先查内存层，未命中再读磁盘并放入内存层）
+        
+        Args:
+            count_miss: 未命中时是否计入条目的未命中次数（取得计算锁后的再次查找传 False，同一次请求只计一次）
+        """
+        full_key = self._full_key(file_path, sheet_names, key_name, variant)
+        if not full_key:
+            return None
+        
+        cached = self.memory.get(full_key)
+        if cached is not None:
+            value, sheets_meta = cached
+            if self._strings_checked(file_path, full_key, sheets_meta):
+                self._count('memory', True)
+                self._record_hit(full_key)
+                return value
+            self.memory.discard(full_key)
+        self._count('memory', False)
+        
+        hit = self._lookup(file_path, full_key)
+        if not hit:
+            self._count('disk', False)
+            if count_miss:
+                self._record_miss(full_key)
             return None
         
-        # 检查文件修改时间是否匹配
-        cached_mtime = self.index[full_key].get('file_mtime', 0)
+        # 读取缓存条目（列式目录按内存映射打开，旧版 .pkl 直接反序列化）
+        path, sheets_meta = hit
+        started = time.perf_counter()
         try:
-            current_mtime = os.path.getmtime(file_path)
-            if abs(cached_mtime - current_mtime) > 1:  # 允许1秒误差
-                return None
+            if os.path.isdir(path):
+                loaded = new_stats()
+                value = load_value(path, stats=loaded)
+                with self._lock:
+                    self.decode_seconds += loaded['decode_seconds']
+            else:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
         except Exception:
+            self._count('disk', False)
+            if count_miss:
+                self._record_miss(full_key)
             return None
         
-        # 读取缓存文件
-        cache_file = os.path.join(self.cache_dir, f"{full_key}.pkl")
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            except Exception:
-                return None
-        return None
+        self._count('disk', True)
+        self._record_hit(full_key, (time.perf_counter() - started) * 1000)
+        self.memory.put(full_key, value, sheets_meta)
+        return value
     
-    def set(self, file_path, sheet_names, key_name, value):
-        """设置缓存数据（持久化到磁盘）"""
-        cache_key = self._get_cache_key(file_path, sheet_names)
-        if not cache_key:
+    def set(self, file_path, sheet_names, key_name, value, variant=None, compute_seconds=None):
+        """设置缓存数据（写入内存层并持久化到磁盘）
+        
+        Args:
+            compute_seconds: 计算该结果的耗时，用于估算命中节省的时间（None 时沿用旧条目的记录）
+        """
+        full_key = self._full_key(file_path, sheet_names, key_name, variant)
+        if not full_key:
             return
         
-        full_key = f"{cache_key}_{key_name}"
-        cache_file = os.path.join(self.cache_dir, f"{full_key}.pkl")
+        # 每次写入新目录：旧条目可能仍被内存映射占用，无法原地覆盖
+        entry = f"{full_key}-{uuid.uuid4().hex[:8]}"
+        entry_path = os.path.join(self.cache_dir, entry)
         
         try:
-            # 写入缓存文件
-            with open(cache_file, 'wb') as f:
-                pickle.dump(value, f)
+            # 记录各工作表引用的 sharedStrings 范围，命中时只需比对摘要
+            sheets_meta = self._sheets_meta(self._open_session(file_path), sheet_names)
+            
+            self.memory.put(full_key, value, sheets_meta)
             
-            # 更新索引
-            self.index[full_key] = {
-                'created': time.time(),
-                'file_path': file_path,
-                'file_mtime': os.path.getmtime(file_path),
-                'sheets': sheet_names,
-                'key_name': key_name
-            }
-            self._save_index()
-            print_log(f"💾 已缓存: {key_name}", "CACHE")
+            # 写入缓存条目（DataFrame 按列保存，其余部分 pickle）：先写临时目录，完整写完后改名
+            tmp_path = f"{entry_path}.tmp"
+            written = dump_value(value, tmp_path)
+            os.rename(tmp_path, entry_path)
+            size = _entry_size(entry_path)
+            raw_size = size - written['stored_bytes'] + written['raw_bytes']
+            
+            # 更新索引（单行写入，读旧版本与写新版本在同一事务中）并删除被替换的旧条目
+            now = time.time()
+            with self._lock:
+                # 先写入累计的计数：条目尚不存在时的未命中并入新条目
+                self._flush_hits()
+                self._db.execute('BEGIN IMMEDIATE')
+                old = self._row(full_key) or {'hits': 0, 'misses': 0, 'load_ms': 0.0, 'compute_ms': 0.0}
+                missed = self._db.execute('SELECT misses FROM lookup_misses WHERE key = ?', (full_key,)).fetchone()
+                if missed:
+                    self._db.execute('DELETE FROM lookup_misses WHERE key = ?', (full_key,))
+                compute_ms = old['compute_ms'] if compute_seconds is None else compute_seconds * 1000
+                self._db.execute(
+                    _INSERT_ENTRY,
+                    (full_key, entry, key_name, file_path,
+                     json.dumps(list(sheet_names), ensure_ascii=False),
+                     json.dumps(sheets_meta, ensure_ascii=False), size, now, now,
+                     raw_size, json.dumps(written['codecs']),
+                     old['hits'], old['misses'] + (missed[0] if missed else 0),
+                     old['load_ms'], compute_ms))
+                self._db.commit()
+                total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if 'entry' in old:
+                self._remove_entry(self._entry_path(full_key, old))
+            if total > CACHE_MAX_BYTES:
+                self._evict_wakeup.set()
+            print_log(f"💾 已缓存: {key_name} [{', '.join(sheet_names)}]", "CACHE")
         except Exception as e:
+            if self._db.in_transaction:
+                self._db.rollback()
+            self._remove_entry(f"{entry_path}.tmp")
+            self._remove_entry(entry_path)
             print(f"\033[1;33m[CACHE] 缓存写入失败: {e}\033[0m")
     
-    def is_valid(self, file_path, sheet_names):
-        """检查缓存是否有效（文件未被修改）"""
-        return self.get(file_path, sheet_names, 'df') is not None
+    def compute_lock(self, file_path, sheet_names, key_name, variant=None, per_sheet=False):
+        """条目计算锁（跨进程），持有期间其他进程 / 线程不会计算同一条目
+        
+        Args:
+            per_sheet: True 时对每个工作表的单表条目分别加锁（与 get_sheets / set_sheets 对应）
+        
+        Returns:
+            EntryLock: 可用作上下文管理器，或调用 acquire(timeout) / release()
+        """
+        groups = [[sheet] for sheet in sheet_names] if per_sheet else [sheet_names]
+        keys = [self._full_key(file_path, group, key_name, variant) for group in groups]
+        return EntryLock([os.path.join(self.lock_dir, f"{key}.lock") for key in keys if key])
+    
+    def get_or_compute(self, file_path, sheet_names, key_name, compute, variant=None, checked=False):
+        """命中则返回缓存，否则在条目锁内计算并写入（single-flight）
+        
+        多个进程同时请求同一条目时只有一个执行 compute()，其他进程等锁释放后直接读取其结果。
+        
+        Args:
+            checked: 调用方刚查找过且未命中（已计入未命中次数）时为 True，不再在锁外重复查找
+        """
+        if not checked:
+            value = self.get(file_path, sheet_names, key_name, variant)
+            if value is not None:
+                return value
+        with self.compute_lock(file_path, sheet_names, key_name, variant):
+            # 等锁期间其他进程可能已经算完
+            value = self.get(file_path, sheet_names, key_name, variant, count_miss=False)
+            if value is None:
+                started = time.perf_counter()
+                value = compute()
+                self.set(file_path, sheet_names, key_name, value, variant,
+                         compute_seconds=time.perf_counter() - started)
+        return value
+    
+    def get_sheets(self, file_path, sheet_names, key_name, variant=None, count_miss=True):
+        """按工作表逐个获取缓存（任意月份组合都由单表条目拼装）
+        
+        Args:
+            variant: 单表条目的区分键（如产生该数据的代码版本）
+            count_miss: 同 get
+        
+        Returns:
+            dict: {工作表名: 缓存数据}，只含命中的工作表
+        """
+        hits = {}
+        for sheet in sheet_names:
+            value = self.get(file_path, [sheet], key_name, variant, count_miss)
+            if value is not None:
+                hits[sheet] = value
+        return hits
+    
+    def set_sheets(self, file_path, values, key_name, variant=None, compute_seconds=None):
+        """按工作表逐个写入缓存
+        
+        Args:
+            values: {工作表名: 缓存数据}
+            variant: 单表条目的区分键（与 get_sheets 一致）
+            compute_seconds: 每个工作表的计算耗时
+        """
+        for sheet, value in values.items():
+            self.set(file_path, [sheet], key_name, value, variant, compute_seconds=compute_seconds)
+    
+    def is_valid(self, file_path, sheet_names, key_name='cleaned', variant=None):
+        """检查各工作表的缓存是否都有效（只读索引元数据，不加载数据）"""
+        for sheet in sheet_names:
+            full_key = self._full_key(file_path, [sheet], key_name, variant)
+            if not full_key or not self._lookup(file_path, full_key):
+                return False
+        return True
+    
+    def record_selection(self, file_path, sheet_names):
+        """记录用户选择的工作表（供预取按最近使用顺序预热）"""
+        now = time.time()
+        key = os.path.normcase(os.path.abspath(file_path))
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO recent_sheets VALUES (?, ?, ?)',
+                [(key, sheet, now - i * 1e-6) for i, sheet in enumerate(sheet_names)])
+            self._db.commit()
+    
+    def recent_sheets(self, file_path):
+        """该工作簿最近选择过的工作表（最近使用的在前）"""
+        key = os.path.normcase(os.path.abspath(file_path))
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT sheet FROM recent_sheets WHERE file_path = ? ORDER BY used DESC', (key,)).fetchall()
+        return [row[0] for row in rows]
+    
+    def list_entries(self, key_name=None, key_prefix=None):
+        """列出索引中的条目（最近访问的在前）
+        
+        Args:
+            key_name: 只列出该类数据（如 'cleaned'、'stage_summary'）
+            key_prefix: 只列出键以此开头的条目
+        
+        Returns:
+            list: 每个条目一个 dict（_ENTRY_COLUMNS 各列，另含 path 与 saved_ms）
+        """
+        sql = f"SELECT {', '.join(_ENTRY_COLUMNS)} FROM entries WHERE 1 = 1"
+        params = []
+        if key_name:
+            sql += ' AND key_name = ?'
+            params.append(key_name)
+        if key_prefix:
+            sql += ' AND substr(key, 1, ?) = ?'
+            params += [len(key_prefix), key_prefix]
+        self._flush_hits()
+        with self._lock:
+            rows = self._db.execute(sql + ' ORDER BY last_access DESC', params).fetchall()
+        entries = []
+        for row in rows:
+            info = dict(zip(_ENTRY_COLUMNS, row))
+            info['sheets'] = json.loads(info['sheets'] or '[]')
+            info['codecs'] = json.loads(info['codecs'] or '{}')
+            info['path'] = self._entry_path(info['key'], info)
+            info['saved_ms'] = info['hits'] * info['compute_ms'] - info['load_ms'] if info['compute_ms'] else 0.0
+            entries.append(info)
+        return entries
+    
+    def lookup_misses(self):
+        """尚无条目的未命中次数（计算失败、被取消或尚未写入），按数据类型汇总
+        
+        Returns:
+            dict: {key_name: 未命中次数}
+        """
+        self._flush_hits()
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT key_name, SUM(misses) FROM lookup_misses GROUP BY key_name').fetchall()
+        return {name: misses for name, misses in rows}
+    
+    def remove(self, entries):
+        """删除指定条目（list_entries 返回的 dict）"""
+        self._remove_rows([(info['key'], info['entry']) for info in entries])
+    
+    def prune(self, unused_days=None, max_bytes=None, key_name=None):
+        """按条件手动清理条目
+        
+        Args:
+            unused_days: 删除超过该天数未访问的条目
+            max_bytes: 总大小超出时按最近访问时间淘汰，直到不超过该字节数
+            key_name: 只处理该类数据（None 表示全部）
+            unused_days 与 max_bytes 都为 None 时删除全部匹配条目
+            尚无条目的未命中记录随之清理（按 unused_days 判断最近一次未命中）
+        
+        Returns:
+            list: 被删除的条目
+        """
+        entries = self.list_entries(key_name)[::-1]  # 最久未用的在前
+        if unused_days is None and max_bytes is None:
+            victims = entries
+            self._remove_lookup_misses(key_name=key_name)
+        else:
+            cutoff = None if unused_days is None else time.time() - unused_days * 24 * 3600
+            if cutoff is not None:
+                self._remove_lookup_misses(before=cutoff, key_name=key_name)
+            total = sum(info['size'] for info in entries)
+            victims = []
+            for info in entries:
+                if (cutoff is not None and info['last_access'] < cutoff) or \
+                        (max_bytes is not None and total > max_bytes):
+                    victims.append(info)
+                    total -= info['size']
+        self.remove(victims)
+        return victims
+    
+    def get_stats(self):
+        """各层命中统计、内存层占用与磁盘压缩效果
+
+        Returns:
+            dict: {'memory': {'hits', 'misses', 'hit_rate'}, 'disk': {...}, 'memory_entries', 'memory_bytes',
+                'disk_entries', 'disk_bytes', 'bytes_saved', 'decode_seconds',
+                'entries': {'hits', 'misses', 'hit_rate', 'load_seconds', 'saved_seconds'}}
+                其中 memory / disk 为本进程的统计，entries 为索引中累计的计数（含尚无条目的未命中）
+        """
+        self._flush_hits()
+        with self._lock:
+            stats = {tier: dict(counts) for tier, counts in self.stats.items()}
+            entries, disk_bytes, raw_bytes, hits, misses, load_ms, saved_ms = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(MAX(raw_size, size)), 0), '
+                'COALESCE(SUM(hits), 0), COALESCE(SUM(misses), 0), COALESCE(SUM(load_ms), 0), '
+                'COALESCE(SUM(CASE WHEN compute_ms > 0 THEN hits * compute_ms - load_ms ELSE 0 END), 0) '
+                'FROM entries'
+            ).fetchone()
+            misses += self._db.execute('SELECT COALESCE(SUM(misses), 0) FROM lookup_misses').fetchone()[0]
+            stats['entries'] = {'hits': hits, 'misses': misses, 'load_seconds': load_ms / 1000,
+                                'saved_seconds': saved_ms / 1000}
+            decode_seconds = self.decode_seconds
+        for counts in (stats['memory'], stats['disk'], stats['entries']):
+            total = counts['hits'] + counts['misses']
+            counts['hit_rate'] = counts['hits'] / total if total else 0.0
+        stats['memory_entries'] = len(self.memory)
+        stats['memory_bytes'] = self.memory.nbytes
+        stats['disk_entries'] = entries
+        stats['disk_bytes'] = disk_bytes
+        stats['bytes_saved'] = raw_bytes - disk_bytes
+        stats['decode_seconds'] = decode_seconds
+        return stats
 
 
 # 初始化全局缓存管理器
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+列式缓存格式 - DataFrame 按列保存为 .npy，命中时以内存映射方式打开
+
+- 数值 / 布尔 / 日期列：原始数组，np.load(mmap_mode='c') 打开，只有用到的列才会读入内存
+- 分类列：整数编码 .npy + 字典
+- 文本等 object 列：先字典编码（pd.factorize）再按分类列保存，读取时按编码还原；
+  空值按种类（None / NaN / pd.NA / NaT）依次编码为 -1、-2 …，同一列混有多种空值时也逐行原样还原
+- 其余无法按列保存的列（可空整数等扩展类型）单独 pickle
+
+数组（含编码数组）可按列压缩：用样本实测各编码的压缩率与解压耗时，
+按「压缩后字节 / 磁盘读取速度 + 解压耗时」估算读取时间，明显快于不压缩时才压缩；
+不压缩的列仍可内存映射。编码名称写入元数据，读取时自动解压。
+
+缓存值中 DataFrame 以外的部分（如 col_info）仍用 pickle 保存，
+其中的 DataFrame 通过 persistent_id 外置为列式子目录，因此任意结构的缓存值都可写入。
+"""
+import io
+import json
+import lzma
+import os
+import pickle
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_object_dtype, is_string_dtype
+
+from config import (
+    CACHE_COMPRESSION, CACHE_COMPRESS_MIN_BYTES, CACHE_COMPRESS_SAMPLE_BYTES, CACHE_DISK_READ_MBPS
+)
+
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+
+# 列式格式版本（格式变化时递增）；可读取的旧版本
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+# 条目目录中的文件名
+META_FILE = 'meta.json'
+VALUE_FILE = 'value.pkl'
+
+
+# 可用的压缩编码: 名称 -> (压缩函数, 解压函数)
+CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 1), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+if _lz4 is not None:
+    CODECS['lz4'] = (_lz4.compress, _lz4.decompress)
+
+
+def new_stats():
+    """写入 / 读取统计：原始字节、实际写入字节、各编码的列数、解压耗时（秒）"""
+    return {'frames': 0, 'raw_bytes': 0, 'stored_bytes': 0, 'codecs': {}, 'decode_seconds': 0.0}
+
+
+def choose_codec(data, mode=None):
+    """为一列数据选择压缩编码
+
+    Args:
+        data: 列的原始字节（memoryview / bytes）
+        mode: 'auto' 按样本实测选择，'none' 不压缩，或指定编码名称；默认取 CACHE_COMPRESSION
+
+    Returns:
+        str: 编码名称，不压缩时返回 None
+    """
+    if mode is None:
+        mode = CACHE_COMPRESSION
+    if mode == 'none' or len(data) < CACHE_COMPRESS_MIN_BYTES:
+        return None
+    if mode != 'auto':
+        return mode if mode in CODECS else None
+
+    sample = bytes(data[:CACHE_COMPRESS_SAMPLE_BYTES])
+    bytes_per_second = CACHE_DISK_READ_MBPS * 1024 ** 2
+    best, best_cost = None, len(sample) / bytes_per_second
+    for name, (compress, decompress) in CODECS.items():
+        packed = compress(sample)
+        start = time.perf_counter()
+        decompress(packed)
+        cost = len(packed) / bytes_per_second + time.perf_counter() - start
+        # 至少快 10% 才值得压缩（不压缩的列还能内存映射、按需读取）
+        if cost < best_cost * 0.9:
+            best, best_cost = name, cost
+    return best
+
+
+def _save_array(directory, stem, arr, stats, compression=None):
+    """保存一个数组：不压缩时写 .npy，否则按所选编码写原始字节
+
+    Returns:
+        dict: 写入列元数据的数组描述
+    """
+    arr = np.ascontiguousarray(arr)
+    stats['raw_bytes'] += arr.nbytes
+    raw = memoryview(arr.reshape(-1).view(np.uint8))
+    codec = choose_codec(raw, compression)
+    if codec is None:
+        file_name = f"{stem}.npy"
+        path = os.path.join(directory, file_name)
+        np.save(path, arr)
+        spec = {'file': file_name}
+    else:
+        file_name = f"{stem}.{codec}"
+        path = os.path.join(directory, file_name)
+        with open(path, 'wb') as f:
+            f.write(CODECS[codec][0](raw))
+        spec = {'file': file_name, 'codec': codec, 'array_dtype': arr.dtype.str, 'shape': list(arr.shape)}
+    stats['stored_bytes'] += os.path.getsize(path)
+    stats['codecs'][codec or 'raw'] = stats['codecs'].get(codec or 'raw', 0) + 1
+    return spec
+
+
+def _load_array(directory, spec, mmap_mode, stats):
+    """读取 _save_array 保存的数组（未压缩的以普通 ndarray 视图返回，底层仍是内存映射）"""
+    path = os.path.join(directory, spec['file'])
+    codec = spec.get('codec')
+    if codec is None:
+        return np.load(path, mmap_mode=mmap_mode).view(np.ndarray)
+    with open(path, 'rb') as f:
+        packed = f.read()
+    start = time.perf_counter()
+    buffer = bytearray(CODECS[codec][1](packed))
+    if stats is not None:
+        stats['decode_seconds'] += time.perf_counter() - start
+    return np.frombuffer(buffer, dtype=np.dtype(spec['array_dtype'])).reshape(spec['shape'])
+
+
+def _is_plain_array(dtype):
+    """可直接保存为 .npy 的 numpy 原生类型（数值 / 布尔 / 日期 / 时间差）"""
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+
+
+def _save_dictionary(values, directory, stem):
+    """保存字典：纯字符串写入 meta（JSON），数值写 .npy，其他类型 pickle
+
+    Returns:
+        dict: 字典描述（写入列元数据）
+    """
+    values = np.asarray(values)
+    if values.dtype == object and all(isinstance(v, str) for v in values):
+        return {'kind': 'json', 'values': values.tolist()}
+    if _is_plain_array(values.dtype):
+        file_name = f"{stem}.dict.npy"
+        np.save(os.path.join(directory, file_name), values)
+        return {'kind': 'npy', 'file': file_name}
+    file_name = f"{stem}.dict.pkl"
+    with open(os.path.join(directory, file_name), 'wb') as f:
+        pickle.dump(values, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'kind': 'pickle', 'file': file_name}
+
+
+def _load_dictionary(spec, directory):
+    """读取字典（_save_dictionary 的逆操作）"""
+    if spec['kind'] == 'json':
+        return np.asarray(spec['values'], dtype=object)
+    path = os.path.join(directory, spec['file'])
+    if spec['kind'] == 'npy':
+        return np.load(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+# object 列中的空值种类（写入列元数据的名称 -> 还原的值）
+_MISSING_VALUES = {'nan': np.nan, 'none': None, 'na': pd.NA, 'nat': pd.NaT}
+
+
+def _missing_kind(value):
+    """object 列中空值的种类名称（见 _MISSING_VALUES）"""
+    if value is None:
+        return 'none'
+    if value is pd.NA:
+        return 'na'
+    if value is pd.NaT:
+        return 'nat'
+    return 'nan'
+
+
+def _encode_missing(codes, values):
+    """按空值种类改写编码：第 1 种保持 -1，第 2 种为 -2，依此类推
+
+    Returns:
+        list: 按编码顺序排列的空值种类（写入列元数据）
+    """
+    positions = np.flatnonzero(codes < 0)
+    if not len(positions):
+        return ['nan']
+    kinds = np.array([_missing_kind(v) for v in values[positions]], dtype=object)
+    order = list(dict.fromkeys(kinds))
+    for i, kind in enumerate(order[1:], start=2):
+        codes[positions[kinds == kind]] = -i
+    return order
+
+
+def _compact_codes(codes, size):
+    """按字典大小选择最小的有符号整数类型（-1 表示空值）"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return codes.astype(dtype, copy=False)
+    return codes.astype(np.int64, copy=False)
+
+
+def save_frame(df, directory, stats=None, compression=None):
+    """把 DataFrame 保存为列式目录
+
+    Args:
+        df: 要保存的 DataFrame（列名需为不重复的字符串）
+        directory: 目标目录（不存在时创建）
+        stats: 可选，累计写入统计（见 new_stats）
+        compression: 压缩方式，默认取 CACHE_COMPRESSION
+
+    Returns:
+        bool: 是否保存成功；列名不满足要求时返回 False，由调用方改用 pickle
+    """
+    names = list(df.columns)
+    if not all(isinstance(name, str) for name in names) or len(set(names)) != len(names):
+        return False
+
+    if stats is None:
+        stats = new_stats()
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for i, name in enumerate(names):
+        series = df.iloc[:, i]
+        stem = f"c{i}"
+        spec = {'name': name, 'dtype': str(series.dtype)}
+        if _is_plain_array(series.dtype):
+            spec.update(_save_array(directory, stem, series.to_numpy(), stats, compression), kind='array')
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            cat = series.array
+            codes = _compact_codes(cat.codes, len(cat.categories))
+            spec.update(_save_array(directory, stem, codes, stats, compression), kind='category',
+                        ordered=bool(cat.ordered),
+                        dictionary=_save_dictionary(cat.categories.to_numpy(), directory, stem))
+        elif is_object_dtype(series.dtype) or is_string_dtype(series.dtype):
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            # object 列逐行记录空值种类（factorize 把 None / NaN 都编码为 -1）；扩展类型还原时自行转换空值
+            na = _encode_missing(codes, series.to_numpy()) if is_object_dtype(series.dtype) else ['nan']
+            spec.update(_save_array(directory, stem, _compact_codes(codes, len(uniques)), stats, compression),
+                        kind='encoded', na=na,
+                        dictionary=_save_dictionary(np.asarray(uniques, dtype=object), directory, stem))
+        else:
+            with open(os.path.join(directory, f"{stem}.pkl"), 'wb') as f:
+                pickle.dump(series, f, protocol=pickle.HIGHEST_PROTOCOL)
+            spec.update(kind='pickle', file=f"{stem}.pkl")
+        columns.append(spec)
+
+    meta = {'version': FORMAT_VERSION, 'rows': len(df), 'columns': columns}
+    if isinstance(df.index, pd.RangeIndex) and df.index.name is None:
+        meta['index'] = {'start': df.index.start, 'stop': df.index.stop, 'step': df.index.step}
+    else:
+        with open(os.path.join(directory, 'index.pkl'), 'wb') as f:
+            pickle.dump(df.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        meta['index'] = None
+    try:
+        meta['attrs'] = json.loads(json.dumps(df.attrs, ensure_ascii=False))
+    except (TypeError, ValueError):
+        with open(os.path.join(directory, 'attrs.pkl'), 'wb') as f:
+            pickle.dump(df.attrs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        meta['attrs'] = None
+
+    with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    stats['frames'] += 1
+    return True
+
+
+def _load_column(spec, directory, mmap_mode, stats=None):
+    """按列描述还原一列（未压缩的数组列保持内存映射）"""
+    kind = spec['kind']
+    if kind == 'pickle':
+        with open(os.path.join(directory, spec['file']), 'rb') as f:
+            return pickle.load(f).array
+    codes = _load_array(directory, spec, mmap_mode, stats)
+    if kind == 'array':
+        return codes
+    dictionary = _load_dictionary(spec['dictionary'], directory)
+    if kind == 'category':
+        return pd.Categorical.from_codes(codes, categories=dictionary, ordered=spec['ordered'])
+    # 字典编码列：在字典末尾倒序追加各种空值，编码 -1、-2 … 恰好取到对应种类（旧版本条目只记一种）
+    na = spec.get('na', 'nan')
+    if isinstance(na, str):
+        na = [na]
+    missing = np.empty(len(na), dtype=object)
+    missing[:] = [_MISSING_VALUES[kind] for kind in reversed(na)]
+    values = np.concatenate([np.asarray(dictionary, dtype=object), missing])[codes]
+    return pd.array(values, dtype=spec['dtype']) if spec['dtype'] != 'object' else values
+
+
+def load_frame(directory, mmap_mode='c', stats=None):
+    """读取列式目录为 DataFrame
+
+    Args:
+        directory: save_frame 写入的目录
+        mmap_mode: 未压缩数组列的内存映射方式；默认 'c'（写时复制，修改不会写回缓存文件），
+            None 表示一次读入内存
+        stats: 可选，累计解压耗时（见 new_stats）
+
+    Returns:
+        pd.DataFrame
+    """
+    with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') not in READABLE_VERSIONS:
+        raise ValueError(f"不支持的列式缓存版本: {meta.get('version')}")
+
+    data = {spec['name']: _load_column(spec, directory, mmap_mode, stats) for spec in meta['columns']}
+    if meta['index'] is not None:
+        index = pd.RangeIndex(**meta['index'])
+    else:
+        with open(os.path.join(directory, 'index.pkl'), 'rb') as f:
+            index = pickle.load(f)
+    # copy=False 且逐列传入时 pandas 不合并数据块，各列仍指向各自的内存映射
+    df = pd.DataFrame(data, index=index, copy=False)
+    if meta['attrs'] is not None:
+        df.attrs = meta['attrs']
+    else:
+        with open(os.path.join(directory, 'attrs.pkl'), 'rb') as f:
+            df.attrs = pickle.load(f)
+    return df
+
+
+class _FramePickler(pickle.Pickler):
+    """把缓存值中的 DataFrame 外置为列式子目录，其余部分照常 pickle"""
+
+    def __init__(self, file, directory, compression=None):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.compression = compression
+        self.stats = new_stats()
+
+    def persistent_id(self, obj):
+        if type(obj) is not pd.DataFrame:
+            return None
+        name = f"frame{self.stats['frames']}"
+        if not save_frame(obj, os.path.join(self.directory, name), self.stats, self.compression):
+            return None
+        return ('frame', name)
+
+
+class _FrameUnpickler(pickle.Unpickler):
+    """按 persistent_id 从列式子目录还原 DataFrame"""
+
+    def __init__(self, file, directory, mmap_mode, stats=None):
+        super().__init__(file)
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        self.stats = stats
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind != 'frame':
+            raise pickle.UnpicklingError(f"未知的外置对象: {kind}")
+        return load_frame(os.path.join(self.directory, name), self.mmap_mode, self.stats)
+
+
+def dump_value(value, directory, compression=None):
+    """保存任意缓存值（DataFrame 按列式格式保存，其他部分 pickle）
+
+    Args:
+        value: 缓存值
+        directory: 条目目录（不存在时创建）
+        compression: 压缩方式，默认取 CACHE_COMPRESSION
+
+    Returns:
+        dict: 写入统计（见 new_stats）
+    """
+    os.makedirs(directory, exist_ok=True)
+    buffer = io.BytesIO()
+    pickler = _FramePickler(buffer, directory, compression)
+    pickler.dump(value)
+    with open(os.path.join(directory, VALUE_FILE), 'wb') as f:
+        f.write(buffer.getvalue())
+    return pickler.stats
+
+
+def load_value(directory, mmap_mode='c', stats=None):
+    """读取 dump_value 保存的缓存值
+
+    Args:
+        stats: 可选，累计解压耗时（见 new_stats）
+    """
+    with open(os.path.join(directory, VALUE_FILE), 'rb') as f:
+        return _FrameUnpickler(f, directory, mmap_mode, stats).load()
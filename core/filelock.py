@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+跨进程文件锁 - 多个程序实例 / 批处理任务共用同一缓存目录时互斥
+
+Windows 使用 msvcrt.locking，其他平台使用 fcntl.flock；
+同一进程内的线程另由线程锁互斥（同一路径共用一把）。
+"""
+import os
+import threading
+import time
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.Lock()
+        return lock
+
+
+class FileLock:
+    """跨进程文件锁（可用作上下文管理器）"""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._thread_lock = _thread_lock(self.path)
+        self._fh = None
+
+    def _try_lock_file(self):
+        fh = open(self.path, 'a+b')
+        try:
+            if msvcrt is not None:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def acquire(self, timeout=None, poll=0.05):
+        """获取锁
+
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待，0 表示只尝试一次
+            poll: 轮询间隔（秒）
+
+        Returns:
+            bool: 是否获得锁
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while not self._try_lock_file():
+            if deadline is not None and time.monotonic() >= deadline:
+                self._thread_lock.release()
+                return False
+            time.sleep(poll)
+        return True
+
+    def release(self):
+        if self._fh is None:
+            return
+        try:
+            if msvcrt is not None:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+            self._fh = None
+            self._thread_lock.release()
+
+    @property
+    def locked(self):
+        return self._fh is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+流水线阶段结果缓存 - 按（输入数据摘要, 阶段参数, 代码版本）记忆各阶段输出
+
+输入数据摘要即所选工作表的内容签名（与 DataCache 的缓存键相同）：工作簿未变时重复运行，
+合并清洗、汇总、成本分析、图表等阶段直接复用上次结果；任一月份改动后签名变化，依赖它的阶段重新计算。
+代码版本取程序版本号、阶段函数所在模块与 config.py 的源码摘要，修改算法或配置后旧结果自动失效。
+各阶段的键还包含上游阶段的键（upstream），上游代码变化时下游阶段一并失效。
+数据质量检查（需与每次变化的历史行指纹比对）与含生成时间的报告 HTML 不做记忆，每次运行都重新生成。
+"""
+import hashlib
+import sys
+import threading
+
+from config import VERSION
+from .cache import data_cache
+from .logger import print_log
+
+
+class StageMemo:
+    """流水线阶段结果缓存（条目存放在 DataCache 中，共用内存层与磁盘淘汰策略）"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_memo()
+        return cls._instance
+
+    def _init_memo(self):
+        self._code_digests = {}
+        self._lock = threading.Lock()
+
+    def _source_digest(self, path):
+        """源文件摘要（打包后无源码时为空）"""
+        if not path:
+            return ''
+        with self._lock:
+            if path not in self._code_digests:
+                try:
+                    with open(path, 'rb') as f:
+                        self._code_digests[path] = hashlib.md5(f.read()).hexdigest()
+                except OSError:
+                    self._code_digests[path] = ''
+            return self._code_digests[path]
+
+    def _code_version(self, func):
+        """阶段代码版本：程序版本号 + 函数所在模块源码 + 配置源码"""
+        module = sys.modules.get(func.__module__)
+        config = sys.modules.get('config')
+        return '|'.join([
+            VERSION,
+            f"{func.__module__}.{func.__qualname__}",
+            self._source_digest(getattr(module, '__file__', None)),
+            self._source_digest(getattr(config, '__file__', None))
+        ])
+
+    def code_variant(self, *funcs):
+        """一组函数的代码版本摘要，供阶段之外的缓存条目作 variant（如单表清洗结果）"""
+        parts = [self._code_version(func) for func in funcs]
+        return hashlib.md5('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def stage_key(self, stage, func, sheet_names, params=None, upstream=()):
+        """阶段条目的区分键（工作表按所选顺序参与，合并顺序不同结果也不同）
+
+        下游阶段把它作为 upstream 传入，输入数据的产生方式变化时下游随之失效。
+        """
+        parts = [stage, self._code_version(func), '|'.join(map(str, sheet_names)), repr(params), *upstream]
+        return hashlib.md5('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def lookup(self, stage, func, file_path, sheet_names, params=None, upstream=()):
+        """查找阶段结果
+
+        Args:
+            stage: 阶段名称
+            func: 阶段函数（用于确定代码版本）
+            file_path: 工作簿路径
+            sheet_names: 所选工作表（阶段输入即这些工作表的数据）
+            params: 影响结果的其他参数（需有稳定的 repr）
+            upstream: 输入数据所来自的上游阶段键（stage_key 或 code_variant 的结果）
+
+        Returns:
+            缓存的阶段结果，未命中返回 None
+        """
+        value = data_cache.get(file_path, sheet_names, f"stage_{stage}",
+                               variant=self.stage_key(stage, func, sheet_names, params, upstream))
+        if value is not None:
+            print_log(f"⚡ 复用阶段结果: {stage}", "CACHE")
+        return value
+
+    def store(self, stage, func, file_path, sheet_names, value, params=None, upstream=()):
+        """保存阶段结果（参数同 lookup）"""
+        data_cache.set(file_path, sheet_names, f"stage_{stage}", value,
+                       variant=self.stage_key(stage, func, sheet_names, params, upstream))
+
+    def run(self, stage, func, file_path, sheet_names, *args, params=None, upstream=(), **kwargs):
+        """命中则返回缓存结果，否则执行 func(*args, **kwargs) 并保存
+
+        args / kwargs 须完全由所选工作表的数据、params 与 upstream 阶段的结果决定。
+        多个进程同时计算同一阶段时只有一个执行，其他进程等待后复用其结果。
+        """
+        value = self.lookup(stage, func, file_path, sheet_names, params, upstream)
+        if value is None:
+            value = data_cache.get_or_compute(
+                file_path, sheet_names, f"stage_{stage}", lambda: func(*args, **kwargs),
+                variant=self.stage_key(stage, func, sheet_names, params, upstream), checked=True)
+        return value
+
+
+# 初始化全局阶段结果缓存
+stage_memo = StageMemo()
@@ -1,15 +1,61 @@
 # -*- coding: utf-8 -*-
 """
 错误恢复模块 - 自动保存中间结果，防止数据丢失
+
+检查点由后台线程写入，save_checkpoint 只记录快照后立即返回：
+DataFrame 按写时复制取快照（pandas 未启用写时复制时深拷贝），数据以列式格式写入新目录，
+再以临时文件改名的方式原子替换检查点索引，中途退出不会留下半个检查点。
+写入尚未开始时到达的新检查点直接替换旧的（只保留最新的一个），程序退出前自动写完。
 """
+import atexit
 import os
 import json
 import pickle
 import shutil
+import threading
+import time
+import uuid
 from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import RECOVERY_DIR, RECOVERY_FLUSH_TIMEOUT_SECONDS
+from core.columnar import dump_value, load_value
 from core.logger import print_log, error_logger
 
 
+def _copy_on_write_enabled():
+    """pandas 是否启用写时复制（3.0 起始终启用）"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except Exception:
+        return False
+
+
+_COPY_ON_WRITE = _copy_on_write_enabled()
+
+
+def _snapshot(value):
+    """检查点数据快照：之后调用方修改原数据不会影响待写入的检查点
+    
+    DataFrame / Series 在写时复制下只复制外壳，其余情况深拷贝；容器递归处理，其他对象按引用保存。
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not _COPY_ON_WRITE)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_snapshot(item) for item in value)
+    if isinstance(value, list):
+        return [_snapshot(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    return value
+
+
 class RecoveryManager:
     """恢复管理器 - 自动保存检查点，支持断点恢复"""
     
@@ -23,10 +69,9 @@ class RecoveryManager:
     
     def _init_manager(self):
         """初始化恢复管理器"""
-        # 恢复目录放在用户目录下
-        self.recovery_dir = os.path.join(os.path.expanduser('~'), '.packing_station_recovery')
+        self.recovery_dir = RECOVERY_DIR
         self.checkpoint_file = os.path.join(self.recovery_dir, 'checkpoint.json')
-        self.data_file = os.path.join(self.recovery_dir, 'checkpoint_data.pkl')
+        self.data_file = os.path.join(self.recovery_dir, 'checkpoint_data.pkl')  # 旧版本的 pickle 数据文件
         
         # 确保目录存在
         if not os.path.exists(self.recovery_dir):
@@ -36,14 +81,24 @@ class RecoveryManager:
         self.session_id = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.checkpoints = {}  # 存储检查点信息
         self.current_stage = None
+        
+        # 后台写入：_pending 为尚未开始写入的最新检查点，_writing 表示正在写入
+        self._cond = threading.Condition()
+        self._pending = None
+        self._writing = False
+        self._writer = None
+        atexit.register(self._flush_at_exit)
     
     def save_checkpoint(self, stage_name, data=None, metadata=None):
-        """保存检查点
+        """保存检查点（取快照后交给后台线程写入，立即返回）
         
         Args:
             stage_name: 阶段名称（如 'data_loaded', 'analysis_complete'）
             data: 要保存的数据（DataFrame 或其他可序列化对象）
             metadata: 额外的元数据信息
+        
+        Returns:
+            bool: 是否已提交写入（写入失败在后台记录警告）
         """
         try:
             checkpoint_info = {
@@ -56,46 +111,135 @@ class RecoveryManager:
             self.checkpoints[stage_name] = checkpoint_info
             self.current_stage = stage_name
             
-            # 保存检查点索引
-            with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'latest_checkpoint': checkpoint_info,
-                    'all_checkpoints': self.checkpoints
-                }, f, ensure_ascii=False, indent=2)
-            
-            # 如果有数据，保存到单独文件
+            job = {'info': checkpoint_info, 'all': dict(self.checkpoints)}
             if data is not None:
-                data_backup = {
+                job['data'] = {
                     'stage': stage_name,
-                    'data': data,
-                    'timestamp': datetime.now().isoformat()
+                    'data': _snapshot(data),
+                    'timestamp': checkpoint_info['timestamp']
                 }
-                with open(self.data_file, 'wb') as f:
-                    pickle.dump(data_backup, f)
-                
-                print_log(f"💾 检查点已保存: {stage_name}", "SAVE")
             
+            with self._cond:
+                # 上一个检查点还没开始写就被新检查点取代；新检查点不带数据时沿用其数据
+                if self._pending is not None and 'data' not in job and 'data' in self._pending:
+                    job['data'] = self._pending['data']
+                self._pending = job
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(
+                        target=self._write_loop, name='checkpoint-writer', daemon=True)
+                    self._writer.start()
+                self._cond.notify_all()
             return True
             
         except Exception as e:
             print_log(f"⚠️ 检查点保存失败: {e}", "WARN")
             return False
     
+    def _write_loop(self):
+        """后台写入线程：依次写入最新的待写检查点"""
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                job, self._pending = self._pending, None
+                self._writing = True
+            try:
+                self._write_checkpoint(job)
+            except Exception as e:
+                print_log(f"⚠️ 检查点保存失败: {e}", "WARN")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+    
+    def _write_checkpoint(self, job):
+        """写入一个检查点：数据写入新目录，再原子替换索引，最后删除旧数据"""
+        started = time.perf_counter()
+        previous = self._read_index() or {}
+        data_entry = previous.get('data_entry')
+        
+        if 'data' in job:
+            data_entry = f"checkpoint_data-{uuid.uuid4().hex[:8]}"
+            data_path = os.path.join(self.recovery_dir, data_entry)
+            # 检查点讲究写得快，不压缩
+            dump_value(job['data'], f"{data_path}.tmp", compression='none')
+            os.rename(f"{data_path}.tmp", data_path)
+        
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'latest_checkpoint': job['info'],
+                'all_checkpoints': job['all'],
+                'data_entry': data_entry
+            }, f, ensure_ascii=False)
+        os.replace(tmp_file, self.checkpoint_file)
+        
+        if 'data' in job:
+            self._remove_data(keep=data_entry)
+            print_log(f"💾 检查点已保存: {job['info']['stage']}（{time.perf_counter() - started:.2f}s）", "SAVE")
+    
+    def _remove_data(self, keep=None):
+        """删除检查点数据目录（keep 除外）与旧版本的 pickle 数据文件"""
+        for name in os.listdir(self.recovery_dir):
+            if name.startswith('checkpoint_data-') and name != keep:
+                shutil.rmtree(os.path.join(self.recovery_dir, name), ignore_errors=True)
+        if os.path.exists(self.data_file):
+            os.remove(self.data_file)
+    
+    def flush(self, timeout=None):
+        """等待已提交的检查点写完
+        
+        Returns:
+            bool: 是否在超时前写完
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._writing, timeout)
+    
+    def _flush_at_exit(self):
+        """程序退出时写完尚未写入的检查点"""
+        with self._cond:
+            busy = self._pending is not None or self._writing
+        if busy:
+            print_log("正在写入最后的检查点...", "SAVE")
+            self.flush()
+    
+    def _read_index(self):
+        """读取检查点索引，不存在或损坏时返回 None"""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+    
+    def _data_path(self, info):
+        """检查点数据路径（列式目录；旧版本索引对应 pickle 数据文件）"""
+        if info.get('data_entry'):
+            return os.path.join(self.recovery_dir, info['data_entry'])
+        if 'data_entry' in info:
+            return None
+        return self.data_file
+    
     def has_recovery_data(self):
-        """检查是否有可恢复的数据"""
-        return os.path.exists(self.checkpoint_file) and os.path.exists(self.data_file)
+        """检查是否有可恢复的数据
+        
+        最多等待 RECOVERY_FLUSH_TIMEOUT_SECONDS 让后台写完检查点；写入线程迟迟未完成时不再等待，
+        按磁盘上的索引判断（索引以原子替换写入，总是指向最近一个完整写完的检查点）。
+        """
+        if not self.flush(RECOVERY_FLUSH_TIMEOUT_SECONDS):
+            print_log("检查点仍在写入，按已写完的检查点判断", "WARN")
+        info = self._read_index()
+        if info is None:
+            return False
+        path = self._data_path(info)
+        return path is not None and os.path.exists(path)
     
     def get_recovery_info(self):
         """获取恢复信息"""
         if not self.has_recovery_data():
             return None
         
-        try:
-            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
-                info = json.load(f)
-            return info.get('latest_checkpoint')
-        except Exception:
-            return None
+        info = self._read_index()
+        return info.get('latest_checkpoint') if info else None
     
     def load_recovery_data(self):
         """加载恢复数据
@@ -111,9 +255,13 @@ class RecoveryManager:
             with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
                 info = json.load(f)
             
-            # 读取数据
-            with open(self.data_file, 'rb') as f:
-                data_backup = pickle.load(f)
+            # 读取数据（完整读入内存，不占用文件，之后可以直接清理）
+            data_path = self._data_path(info)
+            if os.path.isdir(data_path):
+                data_backup = load_value(data_path, mmap_mode=None)
+            else:
+                with open(data_path, 'rb') as f:
+                    data_backup = pickle.load(f)
             
             checkpoint = info.get('latest_checkpoint', {})
             
@@ -130,12 +278,14 @@ class RecoveryManager:
             return None
     
     def clear_recovery_data(self):
-        """清除恢复数据（正常完成后调用）"""
+        """清除恢复数据（正常完成后调用，尚未写入的检查点直接丢弃）"""
         try:
+            with self._cond:
+                self._pending = None
+                self._cond.wait_for(lambda: not self._writing)
             if os.path.exists(self.checkpoint_file):
                 os.remove(self.checkpoint_file)
-            if os.path.exists(self.data_file):
-                os.remove(self.data_file)
+            self._remove_data()
             self.checkpoints = {}
             print_log("🗑️ 恢复数据已清理", "CLEAN")
             return True
@@ -2,13 +2,30 @@
 """
 数据模块：加载、清洗与验证
 """
-from .loader import ThreadedDataLoader, load_and_clean_sheet
-from .cleaner import clean_dataframe, find_col_name, convert_to_chinese_date
-from .validator import DataValidator, validate_dataframe
+from .workbook import WorkbookSession, open_workbook, close_workbook
+from .xlsx_stream import ReadCancelled
+from .loader import ThreadedDataLoader, load_and_clean_sheet, read_raw_sheet, cleaned_cache_variant
+from .cleaner import (
+    clean_dataframe, clean_sheet_frame, finalize_cleaned_frames,
+    find_col_name, convert_to_chinese_date, normalize_excel_dates
+)
+from .audit import RejectionAudit
+from .schema import SchemaStore, schema_store, detect_schema, header_fingerprint
+from .preview import collect_sheet_previews, format_sheet_preview, read_workbook_properties
+from .fingerprint import FingerprintIndex, fingerprint_index, row_fingerprints
+from .prefetch import SheetPrefetcher
+from .validator import DataValidator, RowBitmap, SheetChecks, validate_dataframe
 
 __all__ = [
-    'ThreadedDataLoader', 'load_and_clean_sheet',
-    'clean_dataframe', 'find_col_name', 'convert_to_chinese_date',
-    'DataValidator', 'validate_dataframe'
+    'WorkbookSession', 'open_workbook', 'close_workbook',
+    'ReadCancelled', 'ThreadedDataLoader', 'load_and_clean_sheet', 'read_raw_sheet', 'cleaned_cache_variant',
+    'clean_dataframe', 'clean_sheet_frame', 'finalize_cleaned_frames',
+    'find_col_name', 'convert_to_chinese_date', 'normalize_excel_dates',
+    'RejectionAudit',
+    'SchemaStore', 'schema_store', 'detect_schema', 'header_fingerprint',
+    'collect_sheet_previews', 'format_sheet_preview', 'read_workbook_properties',
+    'FingerprintIndex', 'fingerprint_index', 'row_fingerprints',
+    'SheetPrefetcher',
+    'DataValidator', 'RowBitmap', 'SheetChecks', 'validate_dataframe'
 ]
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+清洗剔除记录 - 记录每条被剔除的行及其剔除规则
+"""
+import numpy as np
+import pandas as pd
+
+from config import SOURCE_ROW_COL
+from core.logger import print_log
+
+# 剔除原因码（按清洗规则的判定顺序，一行只记录最先命中的规则）
+REASON_KEPT = 0
+REASON_NO_DATE = 1
+REASON_NO_DEDUCTION = 2
+REASON_NO_PRICE = 3
+REASON_LOW_PRICE = 4
+REASON_MISSING_BASE = 5
+REASON_BAD_WEIGHT = 6
+REASON_BAD_DATE = 7
+
+REASON_LABELS = {
+    REASON_NO_DATE: '缺少卸货日期',
+    REASON_NO_DEDUCTION: '扣点未出',
+    REASON_NO_PRICE: '卖出价为空',
+    REASON_LOW_PRICE: '卖出价≤1',
+    REASON_MISSING_BASE: '基础信息不全',
+    REASON_BAD_WEIGHT: '重量≤0',
+    REASON_BAD_DATE: '日期无法识别',
+}
+
+
+class RejectionAudit:
+    """剔除记录 - 只保存被剔除行的工作表、源行号与原因码（uint8）"""
+
+    def __init__(self, sheets=None, rows=None, codes=None):
+        """初始化
+
+        Args:
+            sheets: 被剔除行所在工作表（array-like）
+            rows: 被剔除行的 Excel 源行号（array-like）
+            codes: 原因码（array-like，uint8）
+        """
+        self.sheets = np.asarray(sheets if sheets is not None else [], dtype=object)
+        self.rows = np.asarray(rows if rows is not None else [], dtype=np.int64)
+        self.codes = np.asarray(codes if codes is not None else [], dtype=np.uint8)
+
+    @classmethod
+    def from_codes(cls, df, codes):
+        """从整表的原因码数组中取出被剔除的行
+
+        Args:
+            df: 清洗前的 DataFrame（用于取 月份标签 / 源行号）
+            codes: 与 df 等长的原因码数组，0 表示保留
+        """
+        rejected = np.flatnonzero(codes)
+        if SOURCE_ROW_COL in df.columns:
+            rows = df[SOURCE_ROW_COL].to_numpy()[rejected]
+        else:
+            rows = rejected
+        if '月份标签' in df.columns:
+            sheets = df['月份标签'].to_numpy()[rejected]
+        else:
+            sheets = np.full(len(rejected), '', dtype=object)
+        return cls(sheets, rows, codes[rejected])
+
+    @classmethod
+    def merge(cls, audits):
+        """合并多个工作表的剔除记录"""
+        audits = [a for a in audits if a is not None]
+        if not audits:
+            return cls()
+        return cls(
+            np.concatenate([a.sheets for a in audits]),
+            np.concatenate([a.rows for a in audits]),
+            np.concatenate([a.codes for a in audits]),
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    def counts(self):
+        """按规则统计剔除条数
+
+        Returns:
+            dict: {规则名称: 条数}，按规则顺序，只含命中的规则
+        """
+        tally = np.bincount(self.codes, minlength=len(REASON_LABELS) + 1)
+        return {REASON_LABELS[code]: int(tally[code]) for code in REASON_LABELS if tally[code]}
+
+    def summary_text(self):
+        """剔除统计的单行描述"""
+        return "，".join(f"{label} {count}" for label, count in self.counts().items())
+
+    def to_frame(self):
+        """导出用明细表（工作表 / 源行号 / 剔除原因）"""
+        labels = np.array([''] + [REASON_LABELS[i] for i in range(1, len(REASON_LABELS) + 1)], dtype=object)
+        return pd.DataFrame({
+            '工作表': self.sheets,
+            SOURCE_ROW_COL: self.rows,
+            '剔除原因': labels[self.codes],
+        })
+
+    def log_summary(self, tag="CLEAN"):
+        """输出剔除统计日志"""
+        if len(self):
+            print_log(f"🧹 自动清除了 {len(self)} 条无效/未结算记录（{self.summary_text()}）", tag)
+        else:
+            print_log("✨ 数据质量完美，无未结算记录", tag)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+行指纹索引 - 用 64 位哈希识别重复运输记录
+
+指纹 = 关键列（车牌号 / 发往地 / 类别）+ 含年份的完整日期。
+本次加载的指纹与缓存目录中保存的历史指纹比对，可发现同一批数据内、
+跨月份工作表以及跨工作簿版本的重复记录；比对基于哈希表，整体 O(n)。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_float_dtype
+
+from config import FINGERPRINT_KEY_COLS, FINGERPRINT_MAX_AGE_DAYS
+from core.cache import data_cache
+from core.filelock import FileLock
+from core.logger import print_log
+from .workbook import open_workbook
+
+# 行哈希组合用的乘数（64 位无符号整数按位溢出回绕）
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+# 日期为空时的占位天数
+_NAT_DAYS = np.int64(-(1 << 62))
+
+
+def column_hash(series):
+    """单列哈希（uint64），与 duplicated 的相等语义一致（-0.0 与 0.0 视为相同）
+
+    文本列无论是 object、str 还是 category 类型，相同取值的哈希都相同。
+    """
+    if is_float_dtype(series):
+        series = series + 0.0
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+def combine_hash(acc, col_hash):
+    """把一列哈希并入行哈希"""
+    return (acc ^ col_hash) * _HASH_MULTIPLIER
+
+
+def _date_hash(dates):
+    """日期列按天哈希（与 datetime64 的精度单位无关，保留年份）"""
+    days = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    days = np.where(pd.isna(dates).to_numpy(), _NAT_DAYS, days)
+    return pd.util.hash_array(days)
+
+
+def row_fingerprints(df, date_col='Date'):
+    """计算每行的指纹（关键列 + 完整日期）
+
+    Args:
+        df: 清洗后的 DataFrame（需含 Date 列与关键列）
+        date_col: 含年份的日期列
+
+    Returns:
+        np.ndarray: uint64 指纹数组；缺少 Date 列时返回 None
+    """
+    if date_col not in df.columns:
+        return None
+    acc = combine_hash(np.zeros(len(df), dtype=np.uint64), _date_hash(df[date_col]))
+    for col in FINGERPRINT_KEY_COLS:
+        if col in df.columns:
+            acc = combine_hash(acc, column_hash(df[col]))
+    return acc
+
+
+def cross_sheet_mask(fingerprints, sheets):
+    """同一指纹出现在不同工作表中的行
+
+    Args:
+        fingerprints: 行指纹数组
+        sheets: 与指纹等长的工作表标签
+    """
+    pairs = pd.DataFrame({'fp': fingerprints, 'sheet': pd.factorize(sheets)[0]})
+    distinct = pairs.drop_duplicates()
+    shared = distinct['fp'][distinct['fp'].duplicated(keep=False)]
+    return pd.Series(fingerprints).isin(shared.unique()).to_numpy()
+
+
+class FingerprintIndex:
+    """历史指纹索引 - 每个（工作簿, 工作表）一份 .npy，索引保存在缓存目录下"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_index()
+        return cls._instance
+
+    def _init_index(self):
+        """初始化索引目录（索引文件在首次使用时才读取）"""
+        self.index_dir = os.path.join(data_cache.cache_dir, 'fingerprints')
+        self.index_file = os.path.join(self.index_dir, 'index.json')
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _entries_locked(self):
+        if self._entries is None:
+            entries = {}
+            if os.path.exists(self.index_file):
+                try:
+                    with open(self.index_file, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+                except Exception:
+                    entries = {}
+            self._entries = entries
+            self._cleanup_locked()
+        return self._entries
+
+    def _cleanup_locked(self):
+        """清理超过保留天数的历史指纹"""
+        max_age = FINGERPRINT_MAX_AGE_DAYS * 24 * 3600
+        now = time.time()
+        expired = [key for key, info in self._entries.items() if now - info.get('updated', 0) > max_age]
+        for key in expired:
+            self._remove_file(key)
+            del self._entries[key]
+        if expired:
+            self._save_locked()
+            print_log(f"已清理 {len(expired)} 份过期行指纹", "CACHE")
+
+    def _entry_key(self, file_path, sheet):
+        return hashlib.md5(f"{os.path.abspath(file_path)}|{sheet}".encode('utf-8')).hexdigest()
+
+    def _sheet_signatures(self, file_path, sheets):
+        """各工作表的内容签名 {工作表: 签名}；文件无法打开时返回空字典"""
+        try:
+            session = open_workbook(file_path)
+            return {str(sheet): session.sheet_signature(sheet) for sheet in sheets}
+        except Exception:
+            return {}
+
+    def _entry_file(self, key):
+        return os.path.join(self.index_dir, f"{key}.npy")
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._entry_file(key))
+        except OSError:
+            pass
+
+    def _save_locked(self):
+        """保存索引（先写临时文件再替换）"""
+        tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.index_file)
+
+    def find_matches(self, fingerprints, file_path, sheets):
+        """在历史指纹中查找本次数据的重复行
+
+        同一工作簿中本次已加载的工作表视为同一份数据的新版本，不参与比对；
+        内容签名与本次某个工作表相同的历史记录（工作簿被复制、改名或移动）同样跳过。
+
+        Args:
+            fingerprints: 本次数据的行指纹
+            file_path: 本次加载的工作簿路径
+            sheets: 本次加载的工作表名称列表
+
+        Returns:
+            tuple: (命中掩码, 命中行的来源标签数组「文件名 工作表」；未命中为 None)
+        """
+        with self._lock:
+            entries = dict(self._entries_locked())
+        skip = {self._entry_key(file_path, sheet) for sheet in sheets}
+        signatures = set(self._sheet_signatures(file_path, sheets).values())
+
+        arrays, labels, owners = [], [], []
+        for key, info in entries.items():
+            if key in skip or info.get('signature') in signatures:
+                continue
+            try:
+                stored = np.load(self._entry_file(key), mmap_mode='r')
+            except (OSError, ValueError):
+                continue
+            arrays.append(np.asarray(stored))
+            owners.append(np.full(len(stored), len(labels), dtype=np.int32))
+            labels.append(f"{os.path.basename(info['file'])} {info['sheet']}")
+
+        mask = np.zeros(len(fingerprints), dtype=bool)
+        if not arrays:
+            return mask, np.full(len(fingerprints), None, dtype=object)
+
+        # 历史指纹去重后建哈希索引，get_indexer 为 O(n) 查找（不排序）
+        history = pd.Index(np.concatenate(arrays))
+        first = ~history.duplicated()
+        history = history[first]
+        owner = np.concatenate(owners)[first]
+        pos = history.get_indexer(fingerprints)
+        mask = pos >= 0
+        sources = np.full(len(fingerprints), None, dtype=object)
+        sources[mask] = np.asarray(labels, dtype=object)[owner[pos[mask]]]
+        return mask, sources
+
+    def record(self, file_path, df, fingerprints):
+        """保存本次各工作表的指纹（覆盖同一工作表的旧版本）
+
+        Args:
+            file_path: 工作簿路径
+            df: 清洗后的 DataFrame（按 月份标签 区分工作表）
+            fingerprints: 与 df 等长的行指纹
+        """
+        if fingerprints is None or '月份标签' not in df.columns:
+            return
+        sheets = df['月份标签'].to_numpy()
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            mtime = 0
+        signatures = self._sheet_signatures(file_path, pd.unique(sheets))
+        with self._lock, FileLock(f"{self.index_file}.lock"):
+            # 其他进程可能已更新索引：加锁后重新读取再修改
+            self._entries = None
+            entries = self._entries_locked()
+            try:
+                os.makedirs(self.index_dir, exist_ok=True)
+                for sheet in pd.unique(sheets):
+                    key = self._entry_key(file_path, sheet)
+                    # 同一工作表内的重复指纹只需保存一份
+                    values = pd.unique(fingerprints[sheets == sheet])
+                    tmp_file = f"{self._entry_file(key)}.{os.getpid()}.tmp.npy"
+                    np.save(tmp_file, values)
+                    os.replace(tmp_file, self._entry_file(key))
+                    entries[key] = {
+                        'file': os.path.abspath(file_path),
+                        'sheet': str(sheet),
+                        'file_mtime': mtime,
+                        'signature': signatures.get(str(sheet)),
+                        'rows': int(len(values)),
+                        'updated': time.time()
+                    }
+                self._save_locked()
+            except Exception as e:
+                print_log(f"无法保存行指纹: {e}", "WARN")
+
+
+# 初始化全局行指纹索引
+fingerprint_index = FingerprintIndex()
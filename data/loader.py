@@ -2,36 +2,80 @@
 """
 多线程数据加载器
 """
+import multiprocessing
+import os
 import threading
 import traceback
-from queue import Queue
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from queue import Queue, Empty, Full
 import warnings
 
+import numpy as np
 import pandas as pd
 
-from config import STAGE_INIT, STAGE_READ, STAGE_CLEAN, STAGE_ANALYZE, STAGE_VISUALIZE, STAGE_SAVE
+from config import (
+    STAGE_INIT, STAGE_READ, STAGE_CLEAN, STAGE_ANALYZE, STAGE_VISUALIZE, STAGE_SAVE,
+    LOADER_MAX_WORKERS, LOADER_ENGINE, SCHEMA_PROFILE_ENABLED, SOURCE_ROW_COL
+)
 from core.logger import print_log, error_logger
+from core.memo import stage_memo
+from .workbook import open_workbook
+from .audit import RejectionAudit
+from .cleaner import clean_sheet_frame
+from .schema import schema_store, detect_schema, DTYPE_CODE, DTYPE_FLOAT
+from .validator import SheetChecks
+from .xlsx_stream import read_sheet_stream, UnsupportedLayoutError, ReadCancelled
 
 
 class ThreadedDataLoader:
     """多线程数据加载器 - 避免 UI 阻塞，支持精确进度追踪"""
     
-    def __init__(self, gui_app):
+    def __init__(self, gui_app, use_processes=False, max_workers=None):
+        """
+        Args:
+            gui_app: AppGUI 实例
+            use_processes: 是否使用多进程并行解析工作表（多月对比模式推荐）
+            max_workers: 最大进程数，默认取 LOADER_MAX_WORKERS 与 CPU 核数的较小值
+        """
         self.gui = gui_app
+        self.use_processes = use_processes
+        self.max_workers = max_workers
         self.result_queue = Queue()
         self.progress_queue = Queue()
+        self.record_queue = Queue()  # 行级进度 (已读行数, 总行数)
         self.error_queue = Queue()
         self.cancel_event = threading.Event()
         self.worker_thread = None
         self._load_func = None
+        self._clean_func = None
+        self._finalize_func = None
         self._current_stage = 'init'
         self._sheet_count = 0
         self._loaded_count = 0
+        self._sheet_order = []
+        self._cached_results = {}
     
     def set_load_function(self, func):
-        """设置数据加载函数"""
+        """设置数据加载函数
+        
+        函数签名为 func(file_path, sheet_name, progress_callback=None, cancel_event=None)，
+        读取过程中通过 progress_callback(已读行数, 总行数) 上报进度，
+        并在分块之间检查 cancel_event，取消时抛出 ReadCancelled。
+        """
         self._load_func = func
     
+    def set_clean_function(self, clean_func, finalize_func=None):
+        """设置流水线清洗函数（读取与清洗重叠执行）
+        
+        Args:
+            clean_func: 单表清洗 clean_func(df) -> (df, col_info)，
+                在读取下一个工作表的同时对已读出的工作表执行
+            finalize_func: 合并收尾 finalize_func([df, ...], [col_info, ...]) -> (df, col_info)，
+                默认直接 concat
+        """
+        self._clean_func = clean_func
+        self._finalize_func = finalize_func
+    
     def _calc_progress(self, stage_name, sub_progress=0):
         """计算精确进度百分比
         
@@ -55,75 +99,302 @@ class ThreadedDataLoader:
         start, end = stages[stage_name]
         return start + int((end - start) * sub_progress / 100)
     
-    def load_sheets_async(self, file_path, sheet_names, callback):
-        """异步加载多个工作表（非阻塞）"""
+    def load_sheets_async(self, file_path, sheet_names, callback, use_processes=None,
+                          cached_results=None):
+        """异步加载多个工作表（非阻塞）
+        
+        Args:
+            file_path: Excel 文件路径
+            sheet_names: 要加载的工作表列表
+            callback: 完成回调 callback(status, data, extra)
+            use_processes: 是否使用多进程并行解析（默认沿用构造参数）
+            cached_results: 已命中缓存的清洗结果 {工作表名: (df, col_info)}，
+                这些工作表不再读取，合并时按 sheet_names 的顺序与新读取的结果拼装
+        """
         self.cancel_event.clear()
+        self._sheet_order = list(sheet_names)
+        self._cached_results = dict(cached_results or {}) if self._clean_func else {}
+        sheet_names = [s for s in sheet_names if s not in self._cached_results]
         self._sheet_count = len(sheet_names)
         self._loaded_count = 0
         
-        def worker():
-            all_dfs = []
-            total_records = 0
+        if use_processes is None:
+            use_processes = self.use_processes
+        
+        if use_processes and len(sheet_names) > 1:
+            target = self._parallel_worker
+        else:
+            target = self._sequential_worker
+        
+        self.worker_thread = threading.Thread(
+            target=target, args=(file_path, sheet_names), daemon=True
+        )
+        self.worker_thread.start()
+        
+        # 启动 GUI 轮询
+        self._poll_progress(callback)
+    
+    def _read_one_sheet(self, file_path, sheet, progress_callback=None):
+        """在当前线程中读取单个工作表"""
+        load_func = self._load_func or _default_read_sheet
+        return load_func(file_path, sheet, progress_callback=progress_callback,
+                         cancel_event=self.cancel_event)
+    
+    def _report_rows(self, sheet_label, sheet_pos, n_sheets, rows, total, records_before):
+        """上报行级读取进度（读取阶段内按行数细分进度条）"""
+        frac = min(rows / total, 1.0) if total else 0.0
+        sub_pct = int(((sheet_pos + frac) / n_sheets) * 100)
+        pct = self._calc_progress('read', sub_pct)
+        current = records_before + rows
+        self.progress_queue.put((pct, f"正在读取: {sheet_label} · {rows} 行", current))
+        self.record_queue.put((current, records_before + total if total else 0))
+    
+    def _sequential_worker(self, file_path, sheet_names):
+        """单线程顺序读取各工作表（设置了清洗函数时，由清洗线程流水线处理已读出的表）"""
+        all_dfs = []
+        submitted = []  # 已提交清洗的工作表（与流水线结果一一对应）
+        total_records = 0
+        
+        pipeline = _CleanPipeline(self._clean_func) if self._clean_func else None
+        
+        for i, sheet in enumerate(sheet_names):
+            if self.cancel_event.is_set() or (pipeline and pipeline.error):
+                break
+            
+            # 计算精确进度：读取阶段内的子进度
+            sub_pct = int((i / len(sheet_names)) * 100)
+            pct = self._calc_progress('read', sub_pct)
+            self.progress_queue.put((pct, f"正在读取: {sheet} ({i+1}/{len(sheet_names)})", total_records))
+            
+            label = f"{sheet} ({i+1}/{len(sheet_names)})"
+            records_before = total_records
+            
+            def on_rows(rows, total, label=label, pos=i, before=records_before):
+                self._report_rows(label, pos, len(sheet_names), rows, total, before)
             
+            try:
+                df = self._read_one_sheet(file_path, sheet, progress_callback=on_rows)
+                
+                if df is not None and not df.empty:
+                    total_records += len(df)
+                    self._loaded_count += 1
+                    if pipeline:
+                        if not pipeline.submit(df, self.cancel_event):
+                            break
+                    else:
+                        all_dfs.append(df)
+                    submitted.append(sheet)
+                    
+            except ReadCancelled:
+                break
+            except Exception as e:
+                if pipeline:
+                    pipeline.abort()
+                self._put_sheet_error(sheet, e)
+                return
+        
+        if self.cancel_event.is_set():
+            # 丢弃尚未清洗的工作表，不等清洗线程收尾
+            if pipeline:
+                pipeline.abort()
+            self.result_queue.put(('cancelled', None, None))
+            return
+        
+        if pipeline:
+            self.progress_queue.put((self._calc_progress('clean', 0), "正在完成剩余清洗...", total_records))
+            cleaned = pipeline.close(self.cancel_event)
+            if pipeline.error is not None:
+                self._put_clean_error(pipeline.error, pipeline.error_traceback)
+                return
+            results = [(sheet, df, info) for sheet, (df, info) in zip(submitted, cleaned)]
+        else:
+            results = [(sheet, df, None) for sheet, df in zip(submitted, all_dfs)]
+        
+        if self.cancel_event.is_set():
+            self.result_queue.put(('cancelled', None, None))
+            return
+        
+        self._merge_and_finish(results, total_records)
+    
+    def _parallel_worker(self, file_path, sheet_names):
+        """多进程并行读取：每个工作表在独立进程中解析，结果按工作表顺序重组"""
+        n_sheets = len(sheet_names)
+        max_workers = self.max_workers or LOADER_MAX_WORKERS
+        max_workers = max(1, min(n_sheets, os.cpu_count() or 1, max_workers))
+        
+        results = [None] * n_sheets
+        total_records = 0
+        done_count = 0
+        
+        self.progress_queue.put((
+            self._calc_progress('read', 0),
+            f"正在并行读取 {n_sheets} 个工作表 ({max_workers} 进程)...",
+            total_records
+        ))
+        
+        # 子进程通过进程间队列回传行级进度，通过进程间事件感知取消
+        mp_progress = multiprocessing.Queue()
+        mp_cancel = multiprocessing.Event()
+        sheet_rows = {}
+        sheet_totals = {}
+        
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_process_worker,
+                initargs=(mp_progress, mp_cancel)
+            )
+        except Exception as e:
+            # 进程池不可用（如受限环境），退回单线程顺序读取
+            print_log(f"进程池启动失败，改用单线程读取: {e}", "WARN")
+            self._sequential_worker(file_path, sheet_names)
+            return
+        
+        futures = {}
+        try:
             for i, sheet in enumerate(sheet_names):
+                future = executor.submit(
+                    _read_sheet_in_process, self._load_func, file_path, sheet, i, self._clean_func
+                )
+                futures[future] = i
+            
+            pending = set(futures)
+            while pending:
                 if self.cancel_event.is_set():
+                    mp_cancel.set()
+                    for future in pending:
+                        future.cancel()
                     self.result_queue.put(('cancelled', None, None))
                     return
                 
-                # 计算精确进度：读取阶段内的子进度
-                sub_pct = int((i / len(sheet_names)) * 100)
-                pct = self._calc_progress('read', sub_pct)
-                self.progress_queue.put((pct, f"正在读取: {sheet} ({i+1}/{len(sheet_names)})", total_records))
+                # 汇总各子进程的行级进度
+                got_rows = False
+                while True:
+                    try:
+                        i, rows, total = mp_progress.get_nowait()
+                    except Empty:
+                        break
+                    sheet_rows[i] = rows
+                    if total:
+                        sheet_totals[i] = total
+                    got_rows = True
+                if got_rows:
+                    rows_now = sum(sheet_rows.values())
+                    known_total = sum(sheet_totals.values())
+                    frac_sum = sum(min(sheet_rows.get(j, 0) / t, 1.0) for j, t in sheet_totals.items())
+                    pct = self._calc_progress('read', int(frac_sum / n_sheets * 100))
+                    self.progress_queue.put((pct, f"正在并行读取: 已解析 {rows_now} 行", rows_now))
+                    # 仍有工作表未知总行数时不显示总数
+                    all_known = len(sheet_totals) == len(sheet_rows)
+                    self.record_queue.put((rows_now, known_total if all_known else 0))
                 
-                try:
-                    if self._load_func:
-                        df = self._load_func(file_path, sheet)
-                    else:
-                        warnings.filterwarnings("ignore", category=UserWarning)
-                        df = pd.read_excel(file_path, sheet_name=sheet, header=1)
-                        df.columns = df.columns.str.strip()
-                        df['月份标签'] = sheet
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = futures[future]
+                    sheet = sheet_names[i]
+                    try:
+                        # 设置了清洗函数时子进程返回 (清洗后 df, col_info, 原始行数)
+                        result = future.result()
+                    except ReadCancelled:
+                        continue
+                    except Exception as e:
+                        mp_cancel.set()
+                        for other in pending:
+                            other.cancel()
+                        self._put_sheet_error(sheet, e)
+                        return
                     
-                    if df is not None and not df.empty:
-                        all_dfs.append(df)
-                        total_records += len(df)
-                        self._loaded_count += 1
-                        
-                except Exception as e:
-                    # 详细错误信息
-                    error_info = {
-                        'type': '工作表读取失败',
-                        'sheet': sheet,
-                        'message': str(e),
-                        'traceback': traceback.format_exc()
-                    }
-                    self.error_queue.put(error_info)
-                    self.result_queue.put(('error', f"读取工作表 [{sheet}] 失败: {e}", error_info))
-                    return
-            
-            # 合并数据
-            if all_dfs:
-                try:
-                    self.progress_queue.put((30, "正在合并数据...", total_records))
-                    merged_df = pd.concat(all_dfs, ignore_index=True)
-                    self.result_queue.put(('success', merged_df, {'total_records': total_records}))
-                except Exception as e:
-                    error_info = {
-                        'type': '数据合并失败',
-                        'message': str(e),
-                        'traceback': traceback.format_exc()
-                    }
-                    self.error_queue.put(error_info)
-                    self.result_queue.put(('error', f"数据合并失败: {e}", error_info))
-            else:
-                error_info = {'type': '无数据', 'message': '未能加载任何有效数据'}
-                self.result_queue.put(('error', '未能加载任何数据', error_info))
+                    done_count += 1
+                    if result is not None:
+                        if self._clean_func:
+                            df, col_info, raw_count = result
+                        else:
+                            df, col_info, raw_count = result, None, len(result)
+                        if raw_count > 0:
+                            results[i] = (sheet, df, col_info)
+                            total_records += raw_count
+                            self._loaded_count += 1
+                    
+                    sub_pct = int((done_count / n_sheets) * 100)
+                    pct = self._calc_progress('read', sub_pct)
+                    self.progress_queue.put((pct, f"已读取: {sheet} ({done_count}/{n_sheets})", total_records))
+        finally:
+            # 取消时丢弃尚未开始的任务；已在运行的子进程通过 mp_cancel 在下一个分块处退出
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        self.worker_thread = threading.Thread(target=worker, daemon=True)
-        self.worker_thread.start()
+        self._merge_and_finish([r for r in results if r is not None], total_records)
+    
+    def _put_sheet_error(self, sheet, exc):
+        """上报单个工作表的读取失败"""
+        # 详细错误信息
+        error_info = {
+            'type': '工作表读取失败',
+            'sheet': sheet,
+            'message': str(exc),
+            'traceback': traceback.format_exc()
+        }
+        self.error_queue.put(error_info)
+        self.result_queue.put(('error', f"读取工作表 [{sheet}] 失败: {exc}", error_info))
+    
+    def _put_clean_error(self, exc, tb=None):
+        """上报清洗失败"""
+        error_info = {
+            'type': '数据清洗失败',
+            'message': str(exc),
+            'traceback': tb or traceback.format_exc()
+        }
+        self.error_queue.put(error_info)
+        self.result_queue.put(('error', f"数据清洗失败: {exc}", error_info))
+    
+    def _merge_and_finish(self, results, total_records):
+        """合并各工作表数据并投递最终结果
         
-        # 启动 GUI 轮询
-        self._poll_progress(callback)
+        Args:
+            results: [(sheet, df, col_info), ...]，col_info 为 None 表示未经流水线清洗
+            total_records: 读取的原始记录数
+        """
+        loaded = {sheet: (df, info) for sheet, df, info in results}
+        if self._cached_results:
+            # 与命中缓存的工作表按原始顺序拼装
+            results = [
+                (sheet,) + (loaded.get(sheet) or self._cached_results[sheet])
+                for sheet in self._sheet_order
+                if sheet in loaded or sheet in self._cached_results
+            ]
+        if results:
+            try:
+                frames = [df for _, df, _ in results]
+                if self._clean_func:
+                    self.progress_queue.put((self._calc_progress('clean', 50), "正在合并清洗结果...", total_records))
+                    col_infos = [info for _, _, info in results]
+                    if self._finalize_func:
+                        merged_df, col_info = self._finalize_func(frames, col_infos)
+                    else:
+                        merged_df, col_info = pd.concat(frames, ignore_index=True), col_infos[0]
+                    # sheet_results: 本次新读取的单表清洗结果（供按工作表写入缓存）
+                    extra = {
+                        'total_records': total_records, 'col_info': col_info, 'cleaned': True,
+                        'sheet_results': loaded
+                    }
+                else:
+                    self.progress_queue.put((30, "正在合并数据...", total_records))
+                    non_numeric = _merge_non_numeric(frames)
+                    merged_df = pd.concat(frames, ignore_index=True)
+                    if non_numeric:
+                        merged_df.attrs['non_numeric'] = non_numeric
+                    extra = {'total_records': total_records}
+                self.result_queue.put(('success', merged_df, extra))
+            except Exception as e:
+                error_info = {
+                    'type': '数据合并失败',
+                    'message': str(e),
+                    'traceback': traceback.format_exc()
+                }
+                self.error_queue.put(error_info)
+                self.result_queue.put(('error', f"数据合并失败: {e}", error_info))
+        else:
+            error_info = {'type': '无数据', 'message': '未能加载任何有效数据'}
+            self.result_queue.put(('error', '未能加载任何数据', error_info))
     
     def _poll_progress(self, callback):
         """轮询进度队列，更新 GUI（带错误处理）"""
@@ -136,6 +407,14 @@ class ThreadedDataLoader:
                 except Exception as e:
                     print_log(f"进度更新失败: {e}", "WARN")
             
+            # 行级进度（记录数 当前/总数）
+            while not self.record_queue.empty():
+                try:
+                    current, total = self.record_queue.get_nowait()
+                    self.gui.update_record_progress(current, total)
+                except Exception as e:
+                    print_log(f"记录进度更新失败: {e}", "WARN")
+            
             # 检查结果
             if not self.result_queue.empty():
                 try:
@@ -167,14 +446,234 @@ class ThreadedDataLoader:
         print_log("用户取消了加载操作", "CANCEL")
 
 
-def load_and_clean_sheet(file_path, sheet_name, progress_callback=None):
+def read_raw_sheet(file_path, sheet_name, engine=None, progress_callback=None, cancel_event=None,
+                   use_schema=None):
+    """按指定引擎读取单个工作表的原始数据（表头位于第 2 行）
+    
+    Args:
+        file_path: Excel 文件路径
+        sheet_name: 工作表名称
+        engine: 'stream' 或 'pandas'，默认取 LOADER_ENGINE
+        progress_callback: 行级进度回调 progress_callback(已读行数, 总行数)
+        cancel_event: 取消事件；流式引擎在分块之间检查，pandas 引擎在读取前后检查
+        use_schema: 是否按表头模板配置裁剪列并声明类型，默认取 SCHEMA_PROFILE_ENABLED；
+            生效时模板配置记录在 df.attrs['schema']
+    """
+    if use_schema is None:
+        use_schema = SCHEMA_PROFILE_ENABLED
+    session = open_workbook(file_path)
+    if (engine or LOADER_ENGINE) == 'stream':
+        try:
+            return read_sheet_stream(
+                session, sheet_name, header_index=1,
+                progress_callback=progress_callback, cancel_event=cancel_event,
+                schema_resolver=schema_store.resolve if use_schema else None
+            )
+        except UnsupportedLayoutError as e:
+            print_log(f"工作表 [{sheet_name}] 不符合固定布局，回退 pandas 引擎: {e}", "WARN")
+    
+    if cancel_event is not None and cancel_event.is_set():
+        raise ReadCancelled(sheet_name)
+    if use_schema:
+        df = _read_sheet_with_schema(session, sheet_name)
+    else:
+        df = session.read_sheet(sheet_name, header=1)
+    if cancel_event is not None and cancel_event.is_set():
+        raise ReadCancelled(sheet_name)
+    if progress_callback:
+        progress_callback(len(df), len(df))
+    return df
+
+
+class _FloatConverter:
+    """read_excel 数值列转换器：逐行转为 float，非空文本记为 NaN 并记录行位置（与流式引擎的数值列一致）"""
+
+    def __init__(self):
+        self.rows = 0
+        self.non_numeric = []
+
+    def __call__(self, value):
+        pos = self.rows
+        self.rows += 1
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            # 空单元格读作空字符串，与错误值（#N/A 等）一样视为缺失
+            if isinstance(value, str) and value:
+                self.non_numeric.append(pos)
+            return np.nan
+
+
+def _read_sheet_with_schema(session, sheet_name):
+    """pandas 引擎按模板配置读取：先只读表头，再用 usecols 裁剪列（模板配置要求裁剪时），
+    读取时即按声明类型转换（数值列用转换器，低基数文本列读为分类类型）"""
+    header = session.read_sheet(sheet_name, header=1, nrows=0)
+    schema = schema_store.resolve(list(header.columns))
+    keep = set(schema['usecols'])
+    prune = schema.get('prune', True)
+    columns = [col for col in header.columns if not prune or str(col).strip() in keep]
+    converters, dtype = {}, {}
+    for col in columns:
+        kind = schema['dtypes'].get(str(col).strip())
+        if kind == DTYPE_FLOAT:
+            converters[col] = _FloatConverter()
+        elif kind == DTYPE_CODE:
+            dtype[col] = 'category'
+    df = session.read_sheet(sheet_name, header=1, converters=converters or None, dtype=dtype or None,
+                            usecols=(lambda c: str(c).strip() in keep) if prune else None)
+    non_numeric = {}
+    for col, converter in converters.items():
+        if converter.non_numeric:
+            non_numeric[str(col).strip()] = np.asarray(converter.non_numeric, dtype=np.int32)
+        if col in df.columns and not pd.api.types.is_float_dtype(df[col]):
+            # 全部为空时转换结果可能不是 float 类型
+            df[col] = df[col].astype(np.float64)
+    df.attrs['schema'] = schema
+    if non_numeric:
+        df.attrs['non_numeric'] = non_numeric
+    return df
+
+
+def _default_read_sheet(file_path, sheet_name, progress_callback=None, cancel_event=None):
+    """未设置加载函数时的默认读取方式"""
+    df = read_raw_sheet(file_path, sheet_name,
+                        progress_callback=progress_callback, cancel_event=cancel_event)
+    return _tag_sheet_rows(df, sheet_name)
+
+
+def _merge_non_numeric(frames):
+    """取出各表 attrs 中的非数值位置并换算为合并后的行位置（数组不能留给 concat 比较）"""
+    merged = {}
+    offset = 0
+    for df in frames:
+        for col, positions in df.attrs.pop('non_numeric', {}).items():
+            merged.setdefault(col, []).append(positions + offset)
+        offset += len(df)
+    return {col: np.concatenate(parts) for col, parts in merged.items()}
+
+
+def _tag_sheet_rows(df, sheet_name, header_index=1):
+    """去除表头空格，并标记月份与 Excel 源行号（两种引擎都保留中间空行，行号可直接推算）"""
+    df.columns = df.columns.str.strip()
+    df['月份标签'] = sheet_name  # 添加月份标识
+    df[SOURCE_ROW_COL] = np.arange(header_index + 2, header_index + 2 + len(df), dtype=np.int32)
+    return df
+
+
+# 子进程内的进度队列与取消事件（由进程池 initializer 注入）
+_worker_progress_queue = None
+_worker_cancel_event = None
+
+
+def _init_process_worker(progress_queue, cancel_event):
+    """进程池 initializer：保存进程间通信对象"""
+    global _worker_progress_queue, _worker_cancel_event
+    _worker_progress_queue = progress_queue
+    _worker_cancel_event = cancel_event
+
+
+def _read_sheet_in_process(load_func, file_path, sheet_name, sheet_index=0, clean_func=None):
+    """子进程入口：解析单个工作表并返回 DataFrame（需为模块级函数以便 pickle）
+    
+    设置 clean_func 时在子进程内直接完成单表清洗，返回 (df, col_info, 原始行数)。
+    """
+    warnings.filterwarnings("ignore", category=UserWarning)
+    
+    def on_rows(rows, total):
+        if _worker_progress_queue is not None:
+            _worker_progress_queue.put((sheet_index, rows, total))
+    
+    def check_cancelled():
+        if _worker_cancel_event is not None and _worker_cancel_event.is_set():
+            raise ReadCancelled(sheet_name)
+    
+    check_cancelled()
+    load_func = load_func or _default_read_sheet
+    df = load_func(file_path, sheet_name, progress_callback=on_rows,
+                   cancel_event=_worker_cancel_event)
+    if clean_func is None:
+        return df
+    if df is None or df.empty:
+        return None
+    check_cancelled()
+    raw_count = len(df)
+    df, col_info = clean_func(df)
+    return df, col_info, raw_count
+
+
+class _CleanPipeline:
+    """读取-清洗流水线：后台线程按提交顺序清洗已读出的工作表"""
+    
+    def __init__(self, clean_func, max_pending=2):
+        self.clean_func = clean_func
+        self.queue = Queue(maxsize=max_pending)
+        self.results = []
+        self.error = None
+        self.error_traceback = None
+        self.aborted = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        while True:
+            df = self.queue.get()
+            if df is None or self.aborted:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.results.append(self.clean_func(df))
+            except Exception as e:
+                self.error = e
+                self.error_traceback = traceback.format_exc()
+    
+    def submit(self, df, cancel_event=None):
+        """提交一个已读出的工作表（队列满时等待，限制内存中待清洗的表数）
+        
+        Returns:
+            bool: 是否已提交；等待期间 cancel_event 被设置时返回 False
+        """
+        while True:
+            try:
+                self.queue.put(df, timeout=0.1)
+                return True
+            except Full:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+    
+    def abort(self):
+        """放弃剩余工作表：清空队列并通知清洗线程退出（正在清洗的工作表结果直接丢弃，不等待）"""
+        self.aborted = True
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                break
+        self.queue.put(None)
+    
+    def close(self, cancel_event=None):
+        """等待剩余工作表清洗完成，返回 [(df, col_info), ...]
+        
+        等待期间 cancel_event 被设置时放弃剩余工作表并立即返回（结果不完整，由调用方按取消处理）
+        """
+        self.queue.put(None)
+        while self.thread.is_alive():
+            self.thread.join(timeout=0.1)
+            if cancel_event is not None and cancel_event.is_set():
+                self.aborted = True
+                break
+        return self.results
+
+
+def load_and_clean_sheet(file_path, sheet_name, progress_callback=None, cancel_event=None, engine=None):
     """加载并清洗单个工作表数据"""
     try:
-        warnings.filterwarnings("ignore", category=UserWarning)
-        df = pd.read_excel(file_path, sheet_name=sheet_name, header=1)
-        df.columns = df.columns.str.strip()
-        df['月份标签'] = sheet_name  # 添加月份标识
-        return df
+        # 复用共享会话，避免每个工作表重新打开文件并解析 sharedStrings
+        df = read_raw_sheet(file_path, sheet_name, engine=engine,
+                            progress_callback=progress_callback, cancel_event=cancel_event)
+        return _tag_sheet_rows(df, sheet_name)
+    except ReadCancelled:
+        raise
     except Exception as e:
         error_logger.log_error(
             "工作表读取失败",
@@ -183,3 +682,14 @@ def load_and_clean_sheet(file_path, sheet_name, progress_callback=None):
             suggestion="检查工作表名称是否正确，或尝试用Excel打开查看"
         )
         return None
+
+
+def cleaned_cache_variant():
+    """单表清洗结果（缓存类型 'cleaned'）的代码版本
+
+    条目内容由读取、表头模板、清洗规则与清洗前检查共同决定，其中任一模块或配置的源码变化后旧条目失效。
+    """
+    return stage_memo.code_variant(
+        load_and_clean_sheet, read_sheet_stream, detect_schema,
+        clean_sheet_frame, SheetChecks, RejectionAudit
+    )
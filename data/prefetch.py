@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+工作表预取 - 用户在选择框中挑选工作表期间，后台提前把数据放进缓存
+
+文件路径确定后即启动：先把已有磁盘缓存的工作表读入内存层（最近使用的优先），
+再解析最近使用过但尚未缓存的工作表，清洗结果写入缓存。
+用户确认后，正在解析的工作表若未被选中则立即取消，不再开始新的预取。
+"""
+import threading
+import time
+
+from config import PREFETCH_ENABLED, PREFETCH_MAX_SHEETS
+from core.cache import data_cache
+from core.logger import print_log
+from .cleaner import clean_sheet_frame
+from .loader import load_and_clean_sheet, cleaned_cache_variant
+from .xlsx_stream import ReadCancelled
+
+
+class SheetPrefetcher:
+    """选择工作表期间的后台预取"""
+
+    def __init__(self, file_path, sheet_names, max_parse=None):
+        """
+        Args:
+            file_path: Excel 文件路径
+            sheet_names: 工作簿中的全部工作表
+            max_parse: 最多预先解析几个未缓存的工作表，默认取 PREFETCH_MAX_SHEETS
+        """
+        self.file_path = file_path
+        self.sheet_names = list(sheet_names)
+        self.max_parse = PREFETCH_MAX_SHEETS if max_parse is None else max_parse
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._active = None  # 正在解析的工作表
+        self._thread = None
+
+    def start(self):
+        """启动后台预取（未启用时不做任何事）"""
+        if not PREFETCH_ENABLED or not self.sheet_names:
+            return
+        self._thread = threading.Thread(target=self._run, name='sheet-prefetch', daemon=True)
+        self._thread.start()
+
+    def _order(self):
+        """最近使用的工作表在前，其余保持工作簿中的顺序"""
+        recent = [s for s in data_cache.recent_sheets(self.file_path) if s in self.sheet_names]
+        return recent, recent + [s for s in self.sheet_names if s not in recent]
+
+    def _run(self):
+        try:
+            recent, ordered = self._order()
+            variant = cleaned_cache_variant()
+            missing = []
+            for sheet in ordered:
+                if self._stopping:
+                    return
+                if data_cache.get(self.file_path, [sheet], 'cleaned', variant) is None:
+                    missing.append(sheet)
+
+            for sheet in [s for s in recent if s in missing][:self.max_parse]:
+                with self._lock:
+                    if self._stopping:
+                        return
+                    self._active = sheet
+                # 与正式加载共用单表计算锁：其他实例正在解析同一工作表时跳过，不重复解析
+                lock = data_cache.compute_lock(self.file_path, [sheet], 'cleaned', variant, per_sheet=True)
+                if not lock.acquire(timeout=0):
+                    continue
+                try:
+                    if data_cache.get(self.file_path, [sheet], 'cleaned', variant, count_miss=False) is not None:
+                        continue
+                    print_log(f"后台预取工作表: {sheet}", "CACHE")
+                    started = time.perf_counter()
+                    df = load_and_clean_sheet(self.file_path, sheet, cancel_event=self.cancel_event)
+                    if df is None or df.empty:
+                        continue
+                    result = clean_sheet_frame(df)
+                    data_cache.set(self.file_path, [sheet], 'cleaned', result, variant,
+                                   compute_seconds=time.perf_counter() - started)
+                finally:
+                    lock.release()
+        except ReadCancelled:
+            print_log("已取消未选中工作表的预取", "CACHE")
+        except Exception as e:
+            # 预取只是加速手段，失败时由正式加载流程处理
+            print_log(f"后台预取中止: {e}", "WARN")
+        finally:
+            with self._lock:
+                self._active = None
+
+    def finish(self, selected_sheets, root=None):
+        """用户确认选择后调用：停止预取，正在解析的工作表未被选中时立即取消
+
+        已选中的工作表会等它解析完成，随后的正式加载直接命中内存层。
+
+        Args:
+            selected_sheets: 用户选中的工作表
+            root: Tk 根窗口；提供时等待期间持续处理界面事件，窗口不会失去响应
+        """
+        if self._thread is None:
+            return
+        with self._lock:
+            self._stopping = True
+            if self._active is not None and self._active not in selected_sheets:
+                self.cancel_event.set()
+        while self._thread.is_alive():
+            if root is not None:
+                root.update()
+            self._thread.join(0.05)
+        self._thread = None
+
+    def cancel(self):
+        """放弃全部预取"""
+        self.finish([])
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+工作表概况预览 - 只读元数据，不完整解析任何工作表
+
+行数取自 <dimension>，日期范围取自表头后的少量行与 XML 末尾的少量字节，
+最后修改信息取自 docProps/core.xml。
+末尾扫描按解压字节数与总耗时设上限，超出时该工作表只显示起始日期。
+"""
+import html
+import re
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from config import (
+    DATE_COL, PREVIEW_HEAD_ROWS, PREVIEW_TAIL_BYTES, PREVIEW_TAIL_MAX_SCAN_BYTES, PREVIEW_TAIL_BUDGET_SECONDS
+)
+from core.logger import print_log
+from .cleaner import convert_to_chinese_date
+from .workbook import open_workbook
+from .xlsx_stream import (
+    UnsupportedLayoutError, read_context, iter_rows, parse_header, estimate_data_rows
+)
+
+NS_CORE_PROPS = '{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}'
+NS_DCTERMS = '{http://purl.org/dc/terms/}'
+
+_RE_CELL = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_RE_ATTR = re.compile(r'(\w+)="([^"]*)"')
+_RE_VALUE = re.compile(r'<v>(.*?)</v>', re.S)
+_RE_INLINE_TEXT = re.compile(r'<t[^>]*>(.*?)</t>', re.S)
+_RE_ROW_NUM = re.compile(r'<row\b[^>]*?\br="(\d+)"')
+
+
+def read_workbook_properties(session):
+    """读取工作簿的最后修改时间与修改人
+
+    Returns:
+        dict: {'modified': datetime, 'modified_by': str 或 None}
+    """
+    info = {'modified': datetime.fromtimestamp(session.mtime), 'modified_by': None}
+    try:
+        root = ET.fromstring(session.archive.read('docProps/core.xml'))
+    except (KeyError, ET.ParseError, UnsupportedLayoutError):
+        return info
+    by = root.find(NS_CORE_PROPS + 'lastModifiedBy')
+    if by is not None and by.text:
+        info['modified_by'] = by.text
+    modified = root.find(NS_DCTERMS + 'modified')
+    if modified is not None and modified.text:
+        try:
+            # core.xml 中是 UTC 时间，转为本地时间显示
+            utc = datetime.fromisoformat(modified.text.replace('Z', '+00:00'))
+            info['modified'] = utc.astimezone().replace(tzinfo=None)
+        except ValueError:
+            pass
+    return info
+
+
+def _to_date(value):
+    """单元格值转日期（规则与清洗阶段一致），无效返回 None"""
+    if value is None:
+        return None
+    dt, _ = convert_to_chinese_date(value)
+    return None if dt is None or dt != dt else dt
+
+
+def preview_sheet_head(session, sheet_name, header_index=1, head_rows=None):
+    """读取表头与前几行：得到行数（<dimension>）与起始日期
+
+    Returns:
+        dict: {'rows', 'start', 'end', 'date_letters'}，rows 为 None 表示无 <dimension>
+    """
+    head_rows = head_rows or PREVIEW_HEAD_ROWS
+    ctx = read_context(session)
+    header_row = header_index + 1
+    meta = {}
+    date_idx = None
+    dates = []
+
+    with session.open_part(session.sheet_part(sheet_name)) as fh:
+        for row_num, cells in iter_rows(fh, meta):
+            if row_num < header_row:
+                continue
+            if row_num == header_row:
+                header = parse_header(cells, ctx)
+                date_idx = next(i for i, name in header.items() if name.strip() == DATE_COL)
+                continue
+            if row_num > header_row + head_rows:
+                break
+            dt = _to_date(ctx.convert(cells[date_idx])) if date_idx in cells else None
+            if dt is not None:
+                dates.append(dt)
+
+    if date_idx is None:
+        raise UnsupportedLayoutError(f"工作表 [{sheet_name}] 未找到表头行")
+    return {
+        'rows': estimate_data_rows(meta, header_row),
+        'start': min(dates) if dates else None,
+        'end': max(dates) if dates else None,
+        'date_letters': _column_letters(date_idx),
+    }
+
+
+def _column_letters(idx):
+    """0 基列下标转列字母（0 -> A）"""
+    letters = ''
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def scan_sheet_tail(session, sheet_name, date_letters, tail_bytes=None, max_scan_bytes=None):
+    """只取工作表 XML 末尾的少量字节，从中取出最后几行的日期
+
+    zip 内的 deflate 数据无法随机定位，需顺序解压（不做 XML 解析）；
+    解压后超过 max_scan_bytes（默认 PREVIEW_TAIL_MAX_SCAN_BYTES）的工作表不扫描。
+
+    Returns:
+        tuple: (末尾日期列表, 最后一行行号或 None)；未扫描时返回 None
+    """
+    tail_bytes = tail_bytes or PREVIEW_TAIL_BYTES
+    if max_scan_bytes is None:
+        max_scan_bytes = PREVIEW_TAIL_MAX_SCAN_BYTES
+    tail = session.read_part_tail(session.sheet_part(sheet_name), tail_bytes, max_scan_bytes)
+    if tail is None:
+        return None
+
+    text = tail.decode('utf-8', errors='ignore')
+    ctx = read_context(session)
+    prefix_len = len(date_letters)
+    dates = []
+    for match in _RE_CELL.finditer(text):
+        attrs = dict(_RE_ATTR.findall(match.group(1)))
+        ref = attrs.get('r', '')
+        if ref[:prefix_len] != date_letters or not ref[prefix_len:].isdigit():
+            continue
+        body = match.group(2) or ''
+        t = attrs.get('t')
+        if t == 'inlineStr':
+            value = ''.join(_RE_INLINE_TEXT.findall(body))
+        else:
+            found = _RE_VALUE.search(body)
+            value = found.group(1) if found else None
+        if value is None:
+            continue
+        cell = (t, html.unescape(value), int(attrs.get('s', 0) or 0))
+        try:
+            dt = _to_date(ctx.convert(cell))
+        except (ValueError, IndexError):
+            continue
+        if dt is not None:
+            dates.append(dt)
+
+    rows = _RE_ROW_NUM.findall(text)
+    return dates, (int(rows[-1]) if rows else None)
+
+
+def collect_sheet_previews(file_path, sheet_names, on_result, cancel_event=None, header_index=1):
+    """依次产出工作簿与各工作表的概况（在后台线程中调用）
+
+    第一轮只读表头附近的少量行，很快给出行数与起始日期；
+    第二轮扫描各表末尾补全截止日期（单表解压量与总耗时有上限，超出的工作表保留第一轮结果）。
+
+    Args:
+        file_path: Excel 文件路径
+        sheet_names: 工作表名称列表
+        on_result: 回调 on_result(key, info)；key 为 None 时 info 是工作簿属性，
+            否则为工作表下标，info 含 rows/start/end/partial/error
+        cancel_event: 取消事件（对话框关闭后停止）
+        header_index: 表头所在行（0 基）
+    """
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    try:
+        session = open_workbook(file_path)
+        session.archive
+    except (OSError, UnsupportedLayoutError) as e:
+        print_log(f"无法预览工作表概况: {e}", "WARN")
+        return
+    on_result(None, read_workbook_properties(session))
+
+    heads = {}
+    for i, name in enumerate(sheet_names):
+        if cancelled():
+            return
+        try:
+            head = preview_sheet_head(session, name, header_index)
+        except Exception as e:
+            on_result(i, {'error': str(e)})
+            continue
+        heads[i] = head
+        on_result(i, dict(head, partial=True))
+
+    header_row = header_index + 1
+    deadline = time.monotonic() + PREVIEW_TAIL_BUDGET_SECONDS
+    for i, head in heads.items():
+        if cancelled() or time.monotonic() > deadline:
+            return
+        try:
+            scanned = scan_sheet_tail(session, sheet_names[i], head['date_letters'])
+        except Exception:
+            continue
+        if scanned is None:
+            continue
+        dates, last_row = scanned
+        dates += [d for d in (head['start'], head['end']) if d is not None]
+        rows = head['rows']
+        if rows is None and last_row:
+            rows = max(last_row - header_row, 0)
+        on_result(i, {
+            'rows': rows,
+            'start': min(dates) if dates else None,
+            'end': max(dates) if dates else None,
+            'partial': False,
+        })
+
+
+def format_sheet_preview(info):
+    """把概况格式化为列表项后缀"""
+    if info is None:
+        return "读取概况中..."
+    if info.get('error'):
+        return "无法预览"
+    parts = []
+    if info.get('rows') is not None:
+        parts.append(f"约 {info['rows']} 行")
+    start, end = info.get('start'), info.get('end')
+    if start is not None:
+        _, start_label = convert_to_chinese_date(start)
+        if info.get('partial'):
+            parts.append(f"{start_label} 起")
+        else:
+            _, end_label = convert_to_chinese_date(end)
+            parts.append(start_label if start_label == end_label else f"{start_label} ~ {end_label}")
+    return "  ·  ".join(parts) if parts else "无日期数据"
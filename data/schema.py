@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+表头模板配置 - 按工作簿模板保存列映射，读取时裁剪列并声明类型
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from config import (
+    DATE_COL, REQUIRED_BASE_COLS, SETTINGS_FILE, SCHEMA_OPTIONAL_COLS, SCHEMA_PRUNE_COLUMNS
+)
+from core.logger import print_log
+from .cleaner import find_col_name
+
+# 列类型声明：与流式引擎的列缓冲区一一对应
+DTYPE_FLOAT = 'float'
+DTYPE_CODE = 'code'
+DTYPE_DATE = 'date'
+
+
+def _clean_header(header_names):
+    """去空格并去掉空表头（pandas 命名为 Unnamed，流式引擎直接跳过）"""
+    names = [str(name).strip() for name in header_names]
+    return [name for name in names if name and not name.startswith('Unnamed:')]
+
+
+def header_fingerprint(header_names):
+    """表头指纹：去空格后的列名序列（顺序相关）的摘要"""
+    names = _clean_header(header_names)
+    return hashlib.md5('\x1f'.join(names).encode('utf-8')).hexdigest()[:16]
+
+
+def detect_schema(header_names, prune=None):
+    """首次遇到某个表头模板时识别关键列，生成模板配置
+
+    Args:
+        header_names: 原始表头列名列表
+        prune: 是否只读取分析需要的列，默认取 SCHEMA_PRUNE_COLUMNS；
+            不裁剪时其余列原样读取（不声明类型），随清洗后明细一起导出
+
+    Returns:
+        dict: {'fingerprint', 'columns', 'usecols', 'dtypes', 'prune', 'created'}
+    """
+    if prune is None:
+        prune = SCHEMA_PRUNE_COLUMNS
+    names = _clean_header(header_names)
+    col_deduction = find_col_name(names, ['扣点'])
+    col_price = find_col_name(names, ['卖出价', '单价'])
+    col_weight = find_col_name(names, ['重量']) or '重量（吨）'
+
+    dtypes = {DATE_COL: DTYPE_DATE}
+    for col in REQUIRED_BASE_COLS:
+        dtypes[col] = DTYPE_CODE
+    for col in [col_deduction, col_price, col_weight, '运费', '预估利润']:
+        if col:
+            dtypes[col] = DTYPE_FLOAT
+
+    wanted = set(dtypes) | set(SCHEMA_OPTIONAL_COLS)
+    return {
+        'fingerprint': header_fingerprint(names),
+        'columns': {
+            'deduction': col_deduction,
+            'price': col_price,
+            'weight': col_weight
+        },
+        # 保持表头原有顺序
+        'usecols': [name for name in names if name in wanted or not prune],
+        'dtypes': {name: kind for name, kind in dtypes.items() if name in names},
+        'prune': prune,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+class SchemaStore:
+    """模板配置存储 - 保存在设置文件的 schema_profiles 键下，按表头指纹索引"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_store()
+        return cls._instance
+
+    def _init_store(self):
+        """初始化（设置文件在首次使用时才读取）"""
+        self.settings_file = SETTINGS_FILE
+        self._lock = threading.Lock()
+        self._profiles = None
+
+    def _load_settings(self):
+        """读取完整设置（保留 template_path / geometry 等其他键）"""
+        if os.path.exists(self.settings_file):
+            try:
+                with open(self.settings_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception:
+                return {}
+        return {}
+
+    def _profiles_locked(self):
+        if self._profiles is None:
+            self._profiles = self._load_settings().get('schema_profiles', {})
+        return self._profiles
+
+    def get(self, fingerprint):
+        """按表头指纹获取模板配置，不存在返回 None"""
+        with self._lock:
+            return self._profiles_locked().get(fingerprint)
+
+    def save(self, profile):
+        """保存模板配置（先写临时文件再替换，避免多进程同时写入时损坏设置文件）"""
+        with self._lock:
+            self._profiles_locked()[profile['fingerprint']] = profile
+            settings = self._load_settings()
+            settings.setdefault('schema_profiles', {})[profile['fingerprint']] = profile
+            tmp_file = f"{self.settings_file}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(settings, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.settings_file)
+            except Exception as e:
+                print_log(f"无法保存表头模板配置: {e}", "WARN")
+
+    def resolve(self, header_names):
+        """获取表头对应的模板配置，未保存过则识别后保存
+
+        Args:
+            header_names: 原始表头列名列表
+
+        Returns:
+            dict: 模板配置
+        """
+        fingerprint = header_fingerprint(header_names)
+        profile = self.get(fingerprint)
+        # 旧版本的模板配置没有 prune 键（当时总是裁剪列），与当前设置不一致时重新识别
+        if profile is not None and profile.get('prune', True) != SCHEMA_PRUNE_COLUMNS:
+            profile = None
+        if profile is None:
+            profile = detect_schema(header_names)
+            self.save(profile)
+            cols = profile['columns']
+            print_log(
+                f"已保存表头模板 [{fingerprint}]: 扣点->[{cols['deduction']}], "
+                f"卖出价->[{cols['price']}], 读取 {len(profile['usecols'])}/{len(header_names)} 列",
+                "SCHEMA"
+            )
+        return profile
+
+
+# 初始化全局模板配置存储
+schema_store = SchemaStore()
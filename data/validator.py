@@ -1,29 +1,251 @@
 # -*- coding: utf-8 -*-
 """
 数据验证模块 - 数据质量检测与报告
+
+所有统计在一次扫描中完成：每列只做一次缺失 / 数值转换 / 分位数计算，
+重复检测基于 64 位行哈希（疑似重复使用含年份的行指纹，并与历史指纹比对）。
+每个问题附带命中行的位图，可回查原工作表与 Excel 行号并导出明细。
+
+数据量超过阈值时自动改为分层抽样校验（按 月份标签 × 类别 分层），
+逐行检查的问题数为估计值并附置信区间；重复检测始终是全量的。
 """
+from html import escape
+from statistics import NormalDist
+
 import numpy as np
-from datetime import datetime
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from config import (
+    SOURCE_ROW_COL, VALIDATION_PREVIEW_ROWS, VALIDATION_DETAIL_MAX_ROWS, VALIDATION_MODE, VALIDATION_SAMPLE_THRESHOLD,
+    VALIDATION_SAMPLE_SIZE, VALIDATION_SAMPLE_MIN_STRATUM, VALIDATION_CONFIDENCE,
+    VALIDATION_SAMPLE_SEED
+)
 from core.logger import print_log
+from .fingerprint import (
+    column_hash, combine_hash, row_fingerprints, cross_sheet_mask, fingerprint_index
+)
+
+# 关键列（缺失即报问题）
+CRITICAL_COLS = ['类别', '发往地', '重量（吨）', '卖出价', '扣点']
+# IQR 异常值检测列
+OUTLIER_COLS = ['重量（吨）', '卖出价', '运费', '预估利润', '吨利润']
+# 类型一致性检测列
+TYPE_CHECK_COLS = ['重量（吨）', '卖出价', '运费', '扣点']
+# 无 Date 列时疑似重复的关键字段（同一天、同一车、同一目的地、同一品类）
+KEY_DUPLICATE_COLS = ['中文日期', '车牌号', '发往地', '类别']
+# 抽样校验的分层列
+SAMPLE_STRATA_COLS = ['月份标签', '类别']
+
+MODE_EXACT = 'exact'
+MODE_SAMPLE = 'sample'
+MODE_AUTO = 'auto'
+
+
+class RowBitmap:
+    """问题行位图 - 按位保存命中行（100 万行约 122KB），不复制数据"""
+    __slots__ = ('bits', 'length', 'count')
+
+    def __init__(self, mask):
+        """初始化
+
+        Args:
+            mask: 与被检查 DataFrame 等长的布尔数组
+        """
+        mask = np.asarray(mask, dtype=bool)
+        self.bits = np.packbits(mask)
+        self.length = len(mask)
+        self.count = int(mask.sum())
+
+    def __len__(self):
+        return self.count
+
+    def mask(self):
+        """还原为布尔数组"""
+        return np.unpackbits(self.bits, count=self.length).astype(bool)
+
+    def indices(self):
+        """命中行的位置下标"""
+        return np.flatnonzero(self.mask())
+
+
+class SheetChecks:
+    """清洗前的逐行检查结果 - 各检查项在原始行上的命中位图，附工作表与源行号
+
+    关键列缺失、非数值、负/零重量、漏填卖出价这几类问题所在的行会被清洗规则剔除，
+    只能在清洗前的原始数据上检查；命中行不在清洗结果中，只保留其位置。
+    """
+
+    def __init__(self, sheets=None, rows=None, hits=None):
+        """初始化
+
+        Args:
+            sheets: 各原始行所在工作表（array-like）
+            rows: 各原始行的 Excel 源行号（array-like）
+            hits: {(问题类型, 列名): RowBitmap}，位图与 sheets / rows 等长
+        """
+        self.sheets = np.asarray(sheets if sheets is not None else [], dtype=object)
+        self.rows = np.asarray(rows if rows is not None else [], dtype=np.int64)
+        self.hits = hits or {}
+
+    @classmethod
+    def scan(cls, df, col_info=None):
+        """检查单个工作表的原始数据（须在数值列转换与剔除之前调用）
+
+        数值列若在读取时已转为 float，非数值单元格的位置取自 df.attrs['non_numeric']。
+
+        Args:
+            df: 单个工作表的原始 DataFrame（表头已去空格）
+            col_info: clean_sheet_frame 识别出的关键列（重量 / 卖出价 / 扣点的实际列名）
+        """
+        col_info = col_info or {}
+        actual = {
+            '重量（吨）': col_info.get('weight') or '重量（吨）',
+            '卖出价': col_info.get('price') or '卖出价',
+            '扣点': col_info.get('deduction') or '扣点',
+        }
+        n = len(df)
+        if '月份标签' in df.columns:
+            sheets = df['月份标签'].to_numpy()
+        else:
+            sheets = np.full(n, '', dtype=object)
+        rows = df[SOURCE_ROW_COL].to_numpy() if SOURCE_ROW_COL in df.columns else np.arange(n)
+        
+        # 中间的空行不是数据，不参与检查
+        data_cols = [c for c in df.columns if c not in ('月份标签', SOURCE_ROW_COL)]
+        filled = df[data_cols].notna().any(axis=1).to_numpy() if data_cols else np.zeros(n, dtype=bool)
+        
+        hits = {}
+        
+        def hit(key, mask):
+            mask = np.asarray(mask, dtype=bool) & filled
+            if mask.any():
+                hits[key] = RowBitmap(mask)
+        
+        recorded = df.attrs.get('non_numeric', {})
+        values = {}
+        text_cells = {}
+        for col in TYPE_CHECK_COLS:
+            name = actual.get(col, col)
+            if name not in df.columns:
+                continue
+            values[col], non_numeric = _numeric_view(df[name])
+            if non_numeric is None and name in recorded:
+                non_numeric = np.zeros(n, dtype=bool)
+                non_numeric[recorded[name]] = True
+            if non_numeric is not None:
+                text_cells[col] = non_numeric
+                hit(('type_error', col), non_numeric)
+        
+        # 读取时已转为 NaN 的非数值单元格原本有内容，不算缺失
+        for col in CRITICAL_COLS:
+            name = actual.get(col, col)
+            if name in df.columns:
+                missing = df[name].isna().to_numpy()
+                if col in text_cells:
+                    missing = missing & ~text_cells[col]
+                hit(('missing', col), missing)
+        
+        weight = values.get('重量（吨）')
+        if weight is not None:
+            hit(('negative_weight', '重量（吨）'), weight < 0)
+            hit(('zero_weight', '重量（吨）'), weight == 0)
+        price = values.get('卖出价')
+        freight = values.get('运费')
+        if price is not None and freight is not None:
+            hit(('missing_price', None), ((price == 0) | np.isnan(price)) & (freight > 0))
+        return cls(sheets, rows, hits)
+
+    @classmethod
+    def merge(cls, results):
+        """合并多个工作表的检查结果（按工作表顺序拼接位图）
+
+        Returns:
+            SheetChecks: 任一工作表缺少检查结果（如旧版缓存）时返回 None
+        """
+        if not results or any(r is None for r in results):
+            return None
+        if len(results) == 1:
+            return results[0]
+        keys = dict.fromkeys(key for r in results for key in r.hits)
+        hits = {}
+        for key in keys:
+            mask = np.concatenate([
+                r.hits[key].mask() if key in r.hits else np.zeros(len(r), dtype=bool)
+                for r in results
+            ])
+            hits[key] = RowBitmap(mask)
+        return cls(
+            np.concatenate([r.sheets for r in results]),
+            np.concatenate([r.rows for r in results]),
+            hits,
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def _head_bitmap(rows, limit):
+    """位图中前 limit 个命中行组成的新位图"""
+    if rows.count <= limit:
+        return rows
+    mask = np.zeros(rows.length, dtype=bool)
+    mask[rows.indices()[:limit]] = True
+    return RowBitmap(mask)
+
+
+def _numeric_view(series):
+    """列转为 float 数组，同时找出非数值数据
+
+    已是数值类型的列直接取数组；其他列用 to_numeric(errors='coerce') 转换，
+    原值非空而转换后为空的即为非数值数据。
+
+    Returns:
+        tuple: (float64 数组, 非数值掩码；数值类型列为 None)
+    """
+    if is_numeric_dtype(series) and not is_bool_dtype(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan), None
+    coerced = pd.to_numeric(series, errors='coerce')
+    non_numeric = series.notna().to_numpy() & coerced.isna().to_numpy()
+    return coerced.to_numpy(dtype=np.float64, na_value=np.nan), non_numeric
 
 
 class DataValidator:
     """数据验证器 - 检测缺失值、异常值、重复记录"""
     
-    def __init__(self, df):
+    def __init__(self, df, file_path=None, sheets=None, mode=None, raw_checks=None):
         """初始化验证器
         
         Args:
             df: 待验证的 DataFrame
+            file_path: 数据来源工作簿（提供时与历史行指纹比对）
+            sheets: 本次加载的工作表名称列表
+            mode: 'auto' / 'exact' / 'sample'，默认取配置 VALIDATION_MODE
+            raw_checks: 清洗阶段在原始数据上得到的 SheetChecks（清洗后的 df 已不含缺失、
+                非数值、负/零重量等问题行，提供时这几项检查改用其结果）
         """
         self.df = df
+        self.raw_checks = raw_checks
+        self.file_path = file_path
+        self.sheets = list(sheets or [])
+        self.mode = mode or VALIDATION_MODE
+        self.sampled = False      # 是否为抽样校验
+        self.frame = df           # 逐行检查的数据（抽样时为样本）
+        self.fingerprints = None  # 行指纹（关键列 + 完整日期），供保存到历史索引
         self.issues = []  # 存储发现的问题
         self.stats = {}   # 存储统计信息
+        self._missing = None   # 各列缺失数
+        self._profiles = {}    # 数值列扫描结果 {列名: {'values', 'non_numeric', 'q1', 'q3'}}
+        self._sample_idx = None      # 样本行在 df 中的位置
+        self._sample_strata = None   # 样本行所属分层
+        self._strata_totals = None   # 各分层总行数
+        self._strata_sampled = None  # 各分层样本行数
     
     def run_all_checks(self):
         """运行所有检查"""
         print_log("🔍 开始数据质量检查...", "VALID")
         
+        self._prepare_sample()
+        self._scan_columns()
         self._check_missing_values()
         self._check_duplicates()
         self._check_outliers()
@@ -33,54 +255,213 @@ class DataValidator:
         self._generate_summary()
         return self.get_report()
     
-    def _check_missing_values(self):
-        """检查缺失值"""
-        missing = self.df.isnull().sum()
-        missing_pct = (missing / len(self.df) * 100).round(2)
+    def _prepare_sample(self):
+        """确定校验方式；抽样时按 月份标签 × 类别 分层做伯努利抽样（O(n)，不排序）
+
+        各层抽样概率相同（按比例分配），行数很少的层提高概率以保证样本量。
+        """
+        n = len(self.df)
+        if self.mode == MODE_SAMPLE:
+            self.sampled = n > VALIDATION_SAMPLE_SIZE
+        elif self.mode == MODE_AUTO:
+            self.sampled = n > VALIDATION_SAMPLE_THRESHOLD and n > VALIDATION_SAMPLE_SIZE
+        else:
+            self.sampled = False
+        
+        if not self.sampled:
+            self.frame = self.df
+            self.stats['validation_mode'] = MODE_EXACT
+            return
+        
+        keys = [c for c in SAMPLE_STRATA_COLS if c in self.df.columns]
+        if keys:
+            strata = self.df.groupby(keys, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+        else:
+            strata = np.zeros(n, dtype=np.int64)
+        totals = np.bincount(strata)
+        rate = VALIDATION_SAMPLE_SIZE / n
+        probs = np.minimum(1.0, np.maximum(rate, VALIDATION_SAMPLE_MIN_STRATUM / np.maximum(totals, 1)))
         
-        # 关键列缺失检查
-        critical_cols = ['类别', '发往地', '重量（吨）', '卖出价', '扣点']
+        rng = np.random.default_rng(VALIDATION_SAMPLE_SEED)  # 固定种子，同一份数据结果可复现
+        picked = rng.random(n) < probs[strata]
+        self._sample_idx = np.flatnonzero(picked)
+        self._sample_strata = strata[picked]
+        self._strata_totals = totals
+        self._strata_sampled = np.bincount(self._sample_strata, minlength=len(totals))
+        self.frame = self.df.take(self._sample_idx)
         
-        for col in critical_cols:
-            if col in self.df.columns:
-                missing_count = missing.get(col, 0)
-                if missing_count > 0:
+        self.stats['validation_mode'] = MODE_SAMPLE
+        self.stats['sample_size'] = len(self._sample_idx)
+        self.stats['sample_strata'] = len(totals)
+        print_log(
+            f"📐 数据量 {n} 行，分层抽样校验 {len(self._sample_idx)} 行（{len(totals)} 层）", "VALID"
+        )
+    
+    def _estimate(self, mask):
+        """由样本掩码估计全量命中数（分层估计量）
+
+        Returns:
+            tuple: (估计值, 置信区间下限, 上限)，均为整数
+        """
+        hits = np.bincount(self._sample_strata, weights=mask, minlength=len(self._strata_totals))
+        totals = self._strata_totals.astype(np.float64)
+        sampled = self._strata_sampled.astype(np.float64)
+        seen = sampled > 0
+        p = np.zeros_like(totals)
+        p[seen] = hits[seen] / sampled[seen]
+        estimate = float((totals * p).sum())
+        
+        # 有限总体校正的分层方差
+        varied = sampled > 1
+        variance = float((
+            totals[varied] ** 2 * (1 - sampled[varied] / totals[varied])
+            * p[varied] * (1 - p[varied]) / (sampled[varied] - 1)
+        ).sum())
+        z = NormalDist().inv_cdf((1 + VALIDATION_CONFIDENCE) / 2)
+        margin = z * variance ** 0.5
+        # 样本中的命中行一定存在，下限不低于样本命中数
+        lower = max(float(hits.sum()), estimate - margin)
+        upper = min(float(len(self.df)), estimate + margin)
+        return int(round(estimate)), int(np.floor(lower)), int(np.ceil(upper))
+    
+    def _tally(self, mask):
+        """统计逐行检查的命中数
+
+        Args:
+            mask: 与 self.frame 等长的布尔数组
+
+        Returns:
+            tuple: (条数, 条数显示文本, 问题附加字段 {'rows'[, 'ci']})
+        """
+        if not self.sampled:
+            count = int(mask.sum())
+            return count, str(count), {'rows': RowBitmap(mask)}
+        estimate, lower, upper = self._estimate(mask)
+        full_mask = np.zeros(len(self.df), dtype=bool)
+        full_mask[self._sample_idx[mask]] = True
+        text = f"约 {estimate}（{VALIDATION_CONFIDENCE:.0%} 置信区间 {lower}~{upper}）"
+        return estimate, text, {'ci': (lower, upper), 'rows': RowBitmap(full_mask)}
+    
+    def _scan_columns(self):
+        """单次扫描：各列缺失数，以及数值列的 float 数组、非数值个数、四分位数"""
+        self._missing = self.frame.isna().sum()
+        self._profiles = {}
+        
+        for col in dict.fromkeys(OUTLIER_COLS + TYPE_CHECK_COLS):
+            if col not in self.frame.columns:
+                continue
+            values, non_numeric = _numeric_view(self.frame[col])
+            valid = values[~np.isnan(values)]
+            q1 = q3 = None
+            if len(valid) >= 10:  # 数据太少不检测异常值
+                q1, q3 = np.quantile(valid, [0.25, 0.75])
+            self._profiles[col] = {
+                'values': values,
+                'valid_count': len(valid),
+                'non_numeric': non_numeric,
+                'q1': q1,
+                'q3': q3
+            }
+    
+    def _raw_issue(self, key):
+        """清洗前检查的命中结果（全量、精确）
+
+        Returns:
+            tuple: (条数, 问题附加字段 {'rows', 'scope'})；未命中时为 (0, None)
+        """
+        rows = self.raw_checks.hits.get(key)
+        if rows is None:
+            return 0, None
+        return rows.count, {'rows': rows, 'scope': 'raw'}
+    
+    def _check_missing_values(self):
+        """检查缺失值（关键列有清洗前的检查结果时以原始行计）"""
+        missing = self._missing
+        missing_pct = (missing / len(self.frame) * 100).round(2)
+        total_missing = 0
+        
+        for col in CRITICAL_COLS:
+            if self.raw_checks is not None:
+                missing_count, extra = self._raw_issue(('missing', col))
+                if not missing_count:
+                    continue
+                total_missing += missing_count
+                pct = missing_count / max(len(self.raw_checks), 1) * 100
+                self.issues.append({
+                    'type': 'missing',
+                    'severity': 'high' if pct > 10 else 'medium',
+                    'column': col,
+                    'count': missing_count,
+                    'percentage': round(pct, 2),
+                    'message': f"关键列「{col}」有 {missing_count} 条缺失 ({pct:.1f}%)",
+                    **extra
+                })
+            elif col in self.frame.columns:
+                if missing.get(col, 0) > 0:
+                    missing_count, count_text, extra = self._tally(self.frame[col].isna().to_numpy())
+                    total_missing += missing_count
                     self.issues.append({
                         'type': 'missing',
                         'severity': 'high' if missing_pct[col] > 10 else 'medium',
                         'column': col,
-                        'count': int(missing_count),
+                        'count': missing_count,
                         'percentage': float(missing_pct[col]),
-                        'message': f"关键列「{col}」有 {missing_count} 条缺失 ({missing_pct[col]:.1f}%)"
+                        'message': f"关键列「{col}」有 {count_text} 条缺失 ({missing_pct[col]:.1f}%)",
+                        **extra
                     })
         
         # 非关键列缺失统计
-        for col in self.df.columns:
-            if col not in critical_cols and missing.get(col, 0) > 0:
+        for col in self.frame.columns:
+            if col not in CRITICAL_COLS and missing.get(col, 0) > 0:
+                if self.sampled:
+                    missing_count = self._estimate(self.frame[col].isna().to_numpy())[0]
+                else:
+                    missing_count = int(missing[col])
+                total_missing += missing_count
                 self.stats[f'missing_{col}'] = {
-                    'count': int(missing[col]),
+                    'count': missing_count,
                     'percentage': float(missing_pct[col])
                 }
         
-        total_missing = missing.sum()
         if total_missing == 0:
             print_log("✅ 缺失值检查通过：无缺失数据", "VALID")
         else:
             print_log(f"⚠️ 发现 {total_missing} 处缺失值", "WARN")
     
     def _check_duplicates(self):
-        """检查重复记录"""
-        # 完全重复
-        full_duplicates = self.df.duplicated().sum()
-        
-        # 关键字段重复（同一天、同一车、同一目的地）
-        key_cols = ['中文日期', '车牌号', '发往地', '类别']
-        available_keys = [c for c in key_cols if c in self.df.columns]
+        """检查重复记录（行哈希 + 哈希表去重，不排序）"""
+        # 源行号每行不同，不参与比较
+        compare_cols = [c for c in self.df.columns if c != SOURCE_ROW_COL]
         
-        if len(available_keys) >= 3:
-            key_duplicates = self.df.duplicated(subset=available_keys, keep=False).sum()
+        # 关键字段重复（同一天、同一车、同一目的地）：优先用含年份的行指纹
+        self.fingerprints = row_fingerprints(self.df)
+        if self.fingerprints is not None:
+            key_mask = pd.Series(self.fingerprints).duplicated(keep=False).to_numpy()
         else:
-            key_duplicates = 0
+            available_keys = [c for c in KEY_DUPLICATE_COLS if c in compare_cols]
+            if len(available_keys) >= 3:
+                key_acc = np.zeros(len(self.df), dtype=np.uint64)
+                for col in available_keys:
+                    key_acc = combine_hash(key_acc, column_hash(self.df[col]))
+                key_mask = pd.Series(key_acc).duplicated(keep=False).to_numpy()
+            else:
+                key_mask = np.zeros(len(self.df), dtype=bool)
+        key_duplicates = key_mask.sum()
+        
+        # 完全重复：整行相同的记录指纹必然相同，有指纹时只对疑似重复行计算整行哈希
+        full_mask = np.zeros(len(self.df), dtype=bool)
+        if compare_cols:
+            if self.fingerprints is not None:
+                candidates = np.flatnonzero(key_mask)
+                frame = self.df.take(candidates)
+            else:
+                candidates = slice(None)
+                frame = self.df
+            acc = np.zeros(len(frame), dtype=np.uint64)
+            for col in compare_cols:
+                acc = combine_hash(acc, column_hash(frame[col]))
+            full_mask[candidates] = pd.Series(acc).duplicated().to_numpy()
+        full_duplicates = full_mask.sum()
         
         self.stats['full_duplicates'] = int(full_duplicates)
         self.stats['key_duplicates'] = int(key_duplicates)
@@ -90,7 +471,8 @@ class DataValidator:
                 'type': 'duplicate',
                 'severity': 'medium',
                 'count': int(full_duplicates),
-                'message': f"发现 {full_duplicates} 条完全重复记录"
+                'message': f"发现 {full_duplicates} 条完全重复记录",
+                'rows': RowBitmap(full_mask)
             })
             print_log(f"⚠️ 发现 {full_duplicates} 条重复记录", "WARN")
         else:
@@ -101,32 +483,76 @@ class DataValidator:
                 'type': 'duplicate',
                 'severity': 'low',
                 'count': int(key_duplicates),
-                'message': f"发现 {key_duplicates} 条疑似重复（同日期、车牌、目的地、品类）"
+                'message': f"发现 {key_duplicates} 条疑似重复（同日期、车牌、目的地、品类）",
+                'rows': RowBitmap(key_mask)
             })
+        
+        if self.fingerprints is not None:
+            self._check_cross_duplicates(key_mask)
     
-    def _check_outliers(self):
-        """检查异常值（使用 IQR 方法）"""
-        numeric_cols = ['重量（吨）', '卖出价', '运费', '预估利润', '吨利润']
+    def _check_cross_duplicates(self, key_mask):
+        """跨月份工作表、跨工作簿版本的重复记录（基于行指纹）
+
+        Args:
+            key_mask: 本次数据内指纹重复的行（跨月份重复只可能出现在这些行中）
+        """
+        if '月份标签' in self.df.columns:
+            candidates = np.flatnonzero(key_mask)
+            sheet_labels = self.df['月份标签'].to_numpy()[candidates]
+            cross_mask = np.zeros(len(self.df), dtype=bool)
+            cross_mask[candidates] = cross_sheet_mask(self.fingerprints[candidates], sheet_labels)
+            cross_count = int(cross_mask.sum())
+            self.stats['cross_sheet_duplicates'] = cross_count
+            if cross_count > 0:
+                self.issues.append({
+                    'type': 'duplicate',
+                    'severity': 'medium',
+                    'count': cross_count,
+                    'message': f"发现 {cross_count} 条跨月份重复记录（同日期、车牌、目的地、品类出现在多个工作表）",
+                    'rows': RowBitmap(cross_mask)
+                })
         
-        for col in numeric_cols:
-            if col not in self.df.columns:
-                continue
-            
-            data = self.df[col].dropna()
-            if len(data) < 10:  # 数据太少不检测
+        if not self.file_path:
+            return
+        history_mask, sources = fingerprint_index.find_matches(
+            self.fingerprints, self.file_path, self.sheets
+        )
+        history_count = int(history_mask.sum())
+        self.stats['history_duplicates'] = history_count
+        if history_count > 0:
+            top_sources = pd.Series(sources[history_mask]).value_counts().head(3)
+            source_text = "、".join(f"{name} {count} 条" for name, count in top_sources.items())
+            self.issues.append({
+                'type': 'duplicate',
+                'severity': 'medium',
+                'count': history_count,
+                'message': f"发现 {history_count} 条记录与此前加载的其他工作表/工作簿重复（{source_text}）",
+                'rows': RowBitmap(history_mask)
+            })
+            print_log(f"⚠️ 发现 {history_count} 条与历史数据重复的记录", "WARN")
+    
+    def _check_outliers(self):
+        """检查异常值（使用 IQR 方法，分位数取自扫描结果）"""
+        for col in OUTLIER_COLS:
+            profile = self._profiles.get(col)
+            if profile is None or profile['q1'] is None:
                 continue
             
-            Q1 = data.quantile(0.25)
-            Q3 = data.quantile(0.75)
+            values = profile['values']
+            valid_count = profile['valid_count']
+            Q1, Q3 = profile['q1'], profile['q3']
             IQR = Q3 - Q1
             
             lower_bound = Q1 - 1.5 * IQR
             upper_bound = Q3 + 1.5 * IQR
             
-            outliers = data[(data < lower_bound) | (data > upper_bound)]
-            outlier_count = len(outliers)
+            # NaN 与任何值比较都为 False，不会计入
+            outlier_mask = (values < lower_bound) | (values > upper_bound)
+            outliers = values[outlier_mask]
+            sample_outliers = len(outliers)
             
-            if outlier_count > 0:
+            if sample_outliers > 0:
+                outlier_count, outlier_text, outlier_extra = self._tally(outlier_mask)
                 self.stats[f'outliers_{col}'] = {
                     'count': outlier_count,
                     'min': float(outliers.min()),
@@ -135,84 +561,128 @@ class DataValidator:
                 }
                 
                 # 严重异常：超出正常范围3倍
-                extreme_outliers = data[(data < Q1 - 3 * IQR) | (data > Q3 + 3 * IQR)]
+                extreme_mask = (values < Q1 - 3 * IQR) | (values > Q3 + 3 * IQR)
                 
-                if len(extreme_outliers) > 0:
+                if extreme_mask.any():
+                    extreme_count, extreme_text, extreme_extra = self._tally(extreme_mask)
                     self.issues.append({
                         'type': 'outlier',
                         'severity': 'high',
                         'column': col,
-                        'count': len(extreme_outliers),
-                        'message': f"「{col}」有 {len(extreme_outliers)} 个极端异常值"
+                        'count': extreme_count,
+                        'message': f"「{col}」有 {extreme_text} 个极端异常值",
+                        **extreme_extra
                     })
-                elif outlier_count > len(data) * 0.05:  # 超过5%
+                elif sample_outliers > valid_count * 0.05:  # 超过5%
                     self.issues.append({
                         'type': 'outlier',
                         'severity': 'medium',
                         'column': col,
                         'count': outlier_count,
-                        'message': f"「{col}」有 {outlier_count} 个异常值 ({outlier_count/len(data)*100:.1f}%)"
+                        'message': f"「{col}」有 {outlier_text} 个异常值 ({sample_outliers/valid_count*100:.1f}%)",
+                        **outlier_extra
                     })
         
         print_log("✅ 异常值检查完成", "VALID")
     
     def _check_data_types(self):
-        """检查数据类型一致性"""
-        # 检查数值列是否包含非数值
-        numeric_cols = ['重量（吨）', '卖出价', '运费', '扣点']
-        
-        for col in numeric_cols:
-            if col in self.df.columns:
-                non_numeric = self.df[col].apply(lambda x: not isinstance(x, (int, float, np.number)) and x == x)
-                non_numeric_count = non_numeric.sum()
-                
-                if non_numeric_count > 0:
+        """检查数据类型一致性（非数值个数取自扫描结果或清洗前的检查结果）"""
+        for col in TYPE_CHECK_COLS:
+            if self.raw_checks is not None:
+                non_numeric_count, extra = self._raw_issue(('type_error', col))
+                if non_numeric_count:
                     self.issues.append({
                         'type': 'type_error',
                         'severity': 'medium',
                         'column': col,
-                        'count': int(non_numeric_count),
-                        'message': f"「{col}」有 {non_numeric_count} 个非数值数据"
+                        'count': non_numeric_count,
+                        'message': f"「{col}」有 {non_numeric_count} 个非数值数据",
+                        **extra
                     })
+                continue
+            profile = self._profiles.get(col)
+            if profile is None or profile['non_numeric'] is None:
+                continue
+            non_numeric = profile['non_numeric']
+            
+            if non_numeric.any():
+                non_numeric_count, count_text, extra = self._tally(non_numeric)
+                self.issues.append({
+                    'type': 'type_error',
+                    'severity': 'medium',
+                    'column': col,
+                    'count': non_numeric_count,
+                    'message': f"「{col}」有 {count_text} 个非数值数据",
+                    **extra
+                })
     
     def _check_logical_errors(self):
-        """检查逻辑错误"""
+        """检查逻辑错误（复用扫描得到的数值数组，或清洗前的检查结果）"""
+        if self.raw_checks is not None:
+            self._check_raw_logical_errors()
+            return
+        weight = self._profiles.get('重量（吨）', {}).get('values')
+        
         # 1. 负重量
-        if '重量（吨）' in self.df.columns:
-            negative_weight = (self.df['重量（吨）'] < 0).sum()
-            if negative_weight > 0:
+        if weight is not None:
+            negative_mask = weight < 0
+            if negative_mask.any():
+                negative_weight, count_text, extra = self._tally(negative_mask)
                 self.issues.append({
                     'type': 'logical',
                     'severity': 'high',
                     'column': '重量（吨）',
-                    'count': int(negative_weight),
-                    'message': f"发现 {negative_weight} 条负重量记录"
+                    'count': negative_weight,
+                    'message': f"发现 {count_text} 条负重量记录",
+                    **extra
                 })
         
         # 2. 零重量
-        if '重量（吨）' in self.df.columns:
-            zero_weight = (self.df['重量（吨）'] == 0).sum()
-            if zero_weight > 0:
+        if weight is not None:
+            zero_mask = weight == 0
+            if zero_mask.any():
+                zero_weight, count_text, extra = self._tally(zero_mask)
                 self.issues.append({
                     'type': 'logical',
                     'severity': 'low',
                     'column': '重量（吨）',
-                    'count': int(zero_weight),
-                    'message': f"发现 {zero_weight} 条零重量记录"
+                    'count': zero_weight,
+                    'message': f"发现 {count_text} 条零重量记录",
+                    **extra
                 })
         
         # 3. 卖出价为0但有运费（可能漏填）
-        if '卖出价' in self.df.columns and '运费' in self.df.columns:
-            suspicious = ((self.df['卖出价'] == 0) | self.df['卖出价'].isna()) & (self.df['运费'] > 0)
-            suspicious_count = suspicious.sum()
-            if suspicious_count > 0:
+        price = self._profiles.get('卖出价', {}).get('values')
+        freight = self._profiles.get('运费', {}).get('values')
+        if price is not None and freight is not None:
+            suspicious = ((price == 0) | np.isnan(price)) & (freight > 0)
+            if suspicious.any():
+                suspicious_count, count_text, extra = self._tally(suspicious)
                 self.issues.append({
                     'type': 'logical',
                     'severity': 'medium',
-                    'count': int(suspicious_count),
-                    'message': f"发现 {suspicious_count} 条可能漏填卖出价（有运费但无卖出价）"
+                    'count': suspicious_count,
+                    'message': f"发现 {count_text} 条可能漏填卖出价（有运费但无卖出价）",
+                    **extra
                 })
     
+    def _check_raw_logical_errors(self):
+        """逻辑错误：取自清洗前的检查结果（这些行已被清洗规则剔除）"""
+        checks = [
+            (('negative_weight', '重量（吨）'), 'high', "发现 {} 条负重量记录"),
+            (('zero_weight', '重量（吨）'), 'low', "发现 {} 条零重量记录"),
+            (('missing_price', None), 'medium', "发现 {} 条可能漏填卖出价（有运费但无卖出价）"),
+        ]
+        for key, severity, template in checks:
+            count, extra = self._raw_issue(key)
+            if not count:
+                continue
+            issue = {'type': 'logical', 'severity': severity}
+            if key[1]:
+                issue['column'] = key[1]
+            issue.update(count=count, message=template.format(count), **extra)
+            self.issues.append(issue)
+    
     def _generate_summary(self):
         """生成摘要统计"""
         self.stats['total_records'] = len(self.df)
@@ -234,6 +704,99 @@ class DataValidator:
             'is_healthy': self.stats.get('high_severity', 0) == 0
         }
     
+    def locate(self, issue):
+        """问题命中行回查原工作表与 Excel 行号
+
+        Returns:
+            DataFrame: 工作表 / 源行号（列名与剔除记录一致）
+        """
+        rows = issue.get('rows')
+        idx = rows.indices() if rows is not None else np.array([], dtype=np.int64)
+        if issue.get('scope') == 'raw':
+            return pd.DataFrame({'工作表': self.raw_checks.sheets[idx], SOURCE_ROW_COL: self.raw_checks.rows[idx]})
+        if '月份标签' in self.df.columns:
+            sheets = self.df['月份标签'].to_numpy()[idx]
+        else:
+            sheets = np.full(len(idx), '', dtype=object)
+        if SOURCE_ROW_COL in self.df.columns:
+            source_rows = self.df[SOURCE_ROW_COL].to_numpy()[idx]
+        else:
+            source_rows = idx
+        return pd.DataFrame({'工作表': sheets, SOURCE_ROW_COL: source_rows})
+
+    def issue_rows(self, issue):
+        """取出问题命中的明细行（按需从位图还原，不预先保存副本）
+
+        清洗前检查出的问题行已被剔除，只返回其工作表与源行号。
+        """
+        rows = issue.get('rows')
+        if rows is None:
+            return self.df.iloc[0:0]
+        if issue.get('scope') == 'raw':
+            return self.locate(issue)
+        return self.df.take(rows.indices())
+
+    def issue_detail_frame(self, issues=None, limit=None):
+        """问题明细导出表：各问题命中的前 limit 行，首列为问题描述，次列为命中总行数
+
+        问题行数不设上限时可能超出 Excel 单表 1,048,576 行，因此每个问题只导出样本；
+        完整的命中行仍保存在问题的位图中，可用 issue_rows / locate 按需取出。
+
+        Args:
+            issues: 要导出的问题列表（默认全部），例如只导出「运费」的极端异常值
+            limit: 每个问题最多导出的行数，默认取 VALIDATION_DETAIL_MAX_ROWS
+
+        Returns:
+            DataFrame: 一行命中多个问题时会在各问题下分别出现；
+                清洗前检查出的问题行只有 月份标签 / 源行号
+        """
+        limit = limit or VALIDATION_DETAIL_MAX_ROWS
+        frames = []
+        for issue in (self.issues if issues is None else issues):
+            rows = issue.get('rows')
+            if not len(rows or ()):
+                continue
+            sample = {**issue, 'rows': _head_bitmap(rows, limit)}
+            part = self.issue_rows(sample)
+            if issue.get('scope') == 'raw':
+                part = part.rename(columns={'工作表': '月份标签'})
+            message = issue['message']
+            if rows.count > limit:
+                message += f"（仅列出前 {limit} 行）"
+            part.insert(0, '命中行数', rows.count)
+            part.insert(0, '问题', message)
+            frames.append(part)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def _format_locations(self, issue, limit=None):
+        """问题行位置摘要：按工作表列出前几个 Excel 行号"""
+        limit = limit or VALIDATION_PREVIEW_ROWS
+        located = self.locate(issue)
+        total = len(located)
+        by_sheet = {}
+        for sheet, row in zip(located['工作表'].head(limit), located[SOURCE_ROW_COL].head(limit)):
+            by_sheet.setdefault(str(sheet), []).append(str(row))
+        text = "；".join(
+            f"{escape(sheet)} 第 {'、'.join(rows)} 行" if sheet else f"第 {'、'.join(rows)} 行"
+            for sheet, rows in by_sheet.items()
+        )
+        if total > limit:
+            text += f" 等共 {total} 行"
+        return text
+
+    def _mode_text(self):
+        """质量报告中的校验方式说明"""
+        total = len(self.df)
+        if not self.sampled:
+            return f"全量校验（{total} 行）"
+        return (
+            f"分层抽样（按 月份×品类 分 {self.stats.get('sample_strata', 0)} 层，"
+            f"抽取 {self.stats.get('sample_size', 0)} / {total} 行；"
+            f"逐行检查的问题数为估计值，附 {VALIDATION_CONFIDENCE:.0%} 置信区间；重复检测为全量）"
+        )
+
     def get_quality_score(self):
         """计算数据质量评分 (0-100)"""
         base_score = 100
@@ -274,16 +837,27 @@ class DataValidator:
                     <div style="color:#888; font-size:12px;">一般问题</div>
                 </div>
             </div>
+            <div style="color:#888; font-size:12px; margin-bottom:10px;">校验方式：{self._mode_text()}</div>
         '''
         
         if self.issues:
             html += '<div style="margin-top:15px;"><h4 style="color:#FF00CC; margin:0 0 10px 0;">⚠️ 发现的问题</h4><ul style="margin:0; padding-left:20px; color:#ddd; line-height:1.8;">'
             for issue in self.issues[:10]:  # 最多显示10条
                 severity_icon = "🔴" if issue['severity'] == 'high' else "🟡" if issue['severity'] == 'medium' else "🟢"
-                html += f'<li>{severity_icon} {issue["message"]}</li>'
+                if len(issue.get('rows') or ()):
+                    # 点击展开问题所在的工作表与行号
+                    html += (
+                        f'<li><details><summary style="cursor:pointer;">{severity_icon} {escape(issue["message"])}</summary>'
+                        f'<div style="color:#888; font-size:12px; padding-left:20px;">{self._format_locations(issue)}</div>'
+                        f'</details></li>'
+                    )
+                else:
+                    html += f'<li>{severity_icon} {escape(issue["message"])}</li>'
             if len(self.issues) > 10:
                 html += f'<li style="color:#888;">... 还有 {len(self.issues) - 10} 个问题</li>'
-            html += '</ul></div>'
+            html += '</ul>'
+            detail_scope = "（抽样校验时只含样本中的问题行）" if self.sampled else ""
+            html += f'<div style="margin-top:10px; color:#888; font-size:12px;">问题行明细（每个问题最多 {VALIDATION_DETAIL_MAX_ROWS} 行）见「清洗后数据」表格中的「质量问题明细」工作表{detail_scope}</div></div>'
         else:
             html += '<div style="margin-top:15px; padding:15px; background:rgba(0,255,153,0.1); border-radius:8px; color:#00FF99;">✅ 数据质量良好，未发现问题！</div>'
         
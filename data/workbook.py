@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+工作簿会话 - 一次打开，多次读取
+"""
+import hashlib
+import os
+import re
+import threading
+import warnings
+import zipfile
+
+import pandas as pd
+
+from core.logger import print_log
+from .xlsx_stream import (
+    UnsupportedLayoutError, WINDOWS_EPOCH, MAC_EPOCH,
+    parse_workbook_parts, parse_shared_strings, parse_date_styles
+)
+
+# 引用 sharedStrings 的单元格：<c ... t="s" ...><v>下标</v>
+_RE_SHARED_REF = re.compile(rb'<c\b[^>]*\bt="s"[^>]*>\s*<v>(\d+)</v>')
+
+
+class WorkbookSession:
+    """工作簿会话 - 文件只打开一次，sharedStrings 与样式只解析一次
+
+    工作表列表与所有工作表读取都复用同一个句柄，避免每次 read_excel
+    重新解压 zip 并重复解析 sharedStrings.xml / styles.xml。
+    """
+
+    def __init__(self, file_path):
+        """初始化会话
+
+        Args:
+            file_path: Excel 文件路径
+        """
+        self.file_path = file_path
+        self.mtime = os.path.getmtime(file_path)
+        self._excel_file = None
+        self._lock = threading.RLock()
+        # 流式引擎使用的原始 zip 句柄与解析结果（惰性加载）
+        self._archive = None
+        self._sheet_parts = None
+        self._date1904 = False
+        self._shared_strings = None
+        self._date_style_ids = None
+        self._file_digest = None
+        self._part_digests = {}  # zip 内部件 -> 内容摘要（会话内只算一次）
+
+    @property
+    def excel_file(self):
+        """底层 pd.ExcelFile 句柄（首次访问时打开）"""
+        with self._lock:
+            if self._excel_file is None:
+                warnings.filterwarnings("ignore", category=UserWarning)
+                self._excel_file = pd.ExcelFile(self.file_path, engine='openpyxl')
+            return self._excel_file
+
+    @property
+    def sheet_names(self):
+        """工作表名称列表（xlsx 直接读 workbook.xml，无需加载 openpyxl 工作簿）"""
+        try:
+            return list(self._get_sheet_parts())
+        except UnsupportedLayoutError:
+            return self.excel_file.sheet_names
+
+    @property
+    def archive(self):
+        """底层 zip 句柄（仅 xlsx/xlsm）"""
+        with self._lock:
+            if self._archive is None:
+                try:
+                    self._archive = zipfile.ZipFile(self.file_path)
+                except zipfile.BadZipFile as e:
+                    raise UnsupportedLayoutError(f"不是 xlsx 格式: {e}")
+            return self._archive
+
+    def _get_sheet_parts(self):
+        with self._lock:
+            if self._sheet_parts is None:
+                try:
+                    sheets, self._date1904 = parse_workbook_parts(self.archive)
+                except (KeyError, SyntaxError) as e:
+                    raise UnsupportedLayoutError(f"无法解析工作簿结构: {e}")
+                self._sheet_parts = dict(sheets)
+            return self._sheet_parts
+
+    @property
+    def epoch(self):
+        """日期序列号的纪元（1900 / 1904 日期系统）"""
+        self._get_sheet_parts()
+        return MAC_EPOCH if self._date1904 else WINDOWS_EPOCH
+
+    @property
+    def shared_strings(self):
+        """sharedStrings 表（整个会话只解析一次）"""
+        with self._lock:
+            if self._shared_strings is None:
+                try:
+                    with self.archive.open('xl/sharedStrings.xml') as fh:
+                        self._shared_strings = parse_shared_strings(fh)
+                except KeyError:
+                    self._shared_strings = []
+            return self._shared_strings
+
+    @property
+    def date_style_ids(self):
+        """日期格式的样式下标集合（整个会话只解析一次）"""
+        with self._lock:
+            if self._date_style_ids is None:
+                try:
+                    with self.archive.open('xl/styles.xml') as fh:
+                        self._date_style_ids = parse_date_styles(fh)
+                except KeyError:
+                    self._date_style_ids = set()
+            return self._date_style_ids
+
+    def sheet_part(self, sheet_name):
+        """工作表对应的 zip 内 XML 路径"""
+        part = self._get_sheet_parts().get(sheet_name)
+        if not part or part not in self.archive.NameToInfo:
+            raise UnsupportedLayoutError(f"工作表 [{sheet_name}] 不是普通工作表")
+        return part
+
+    def open_part(self, part):
+        """打开 zip 内的 XML 部件（流式读取）"""
+        return self.archive.open(part)
+
+    def read_part_tail(self, part, n_bytes, max_scan_bytes=None):
+        """读取部件末尾的 n_bytes 字节
+        
+        未压缩存储的部件直接定位到末尾；deflate 压缩的部件无法随机定位，只能从头解压，
+        解压后大小超过 max_scan_bytes 时不读取（返回 None）。
+        """
+        info = self.archive.getinfo(part)
+        if info.compress_type != zipfile.ZIP_STORED and max_scan_bytes is not None \
+                and info.file_size > max_scan_bytes:
+            return None
+        with self.open_part(part) as fh:
+            if info.compress_type == zipfile.ZIP_STORED:
+                fh.seek(max(info.file_size - n_bytes, 0))
+                return fh.read()
+            tail = b''
+            while True:
+                chunk = fh.read(1 << 20)
+                if not chunk:
+                    return tail
+                tail = (tail + chunk)[-n_bytes:]
+
+    def sheet_signature(self, sheet_name):
+        """工作表内容签名（缓存键）
+        
+        取自工作表 XML 与 styles.xml 解压后内容的摘要，加上日期系统与工作表名（各部件会话内只摘要一次）。
+        复制到其他目录或原样另存不会改变签名；修改其他工作表也不影响本表。
+        不用 zip 目录中的 CRC32：32 位校验和在多次编辑之间可能碰撞，碰撞时会命中过期的清洗结果。
+        工作表引用的 sharedStrings 由缓存按实际引用范围另行校验。
+        非 xlsx 文件退化为整个文件内容的摘要。
+        """
+        try:
+            part = self.sheet_part(sheet_name)
+        except UnsupportedLayoutError:
+            return hashlib.md5(f"{self._whole_file_digest()}|{sheet_name}".encode('utf-8')).hexdigest()
+        parts = [
+            sheet_name,
+            self._part_digest(part),
+            self._part_digest('xl/styles.xml') if 'xl/styles.xml' in self.archive.NameToInfo else '-',
+            '1904' if self._date1904 else '1900',
+        ]
+        return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    
+    def _part_digest(self, part):
+        """zip 内部件解压后内容的摘要（分块读取，会话内只算一次）"""
+        with self._lock:
+            digest = self._part_digests.get(part)
+        if digest is not None:
+            return digest
+        hasher = hashlib.blake2b(digest_size=16)
+        with self.open_part(part) as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                hasher.update(chunk)
+        digest = f"{hasher.hexdigest()}:{self.archive.getinfo(part).file_size}"
+        with self._lock:
+            self._part_digests[part] = digest
+        return digest
+    
+    def _whole_file_digest(self):
+        """整个文件的内容摘要（分块读取，会话内只算一次）"""
+        with self._lock:
+            if self._file_digest is None:
+                digest = hashlib.md5()
+                with open(self.file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+                self._file_digest = digest.hexdigest()
+            return self._file_digest
+
+    def shared_string_usage(self, sheet_name):
+        """工作表引用到的 sharedStrings 条数（最大下标 + 1）
+
+        顺序解压并用正则扫描 XML 字节，不做 XML 解析；非 xlsx 返回 0。
+        """
+        try:
+            part = self.sheet_part(sheet_name)
+        except UnsupportedLayoutError:
+            return 0
+        top = -1
+        tail = b''
+        with self.open_part(part) as fh:
+            while True:
+                chunk = fh.read(1 << 20)
+                data = tail + chunk
+                # 末尾可能是被截断的单元格，留到下一块一起扫描
+                cut = data.rfind(b'<c') if chunk else len(data)
+                if cut <= 0:
+                    tail = data
+                    if not chunk:
+                        break
+                    continue
+                refs = _RE_SHARED_REF.findall(data, 0, cut)
+                if refs:
+                    top = max(top, max(map(int, refs)))
+                tail = data[cut:]
+                if not chunk:
+                    break
+        return top + 1
+
+    def shared_strings_digest(self, count):
+        """前 count 条 sharedStrings 的摘要"""
+        strings = self.shared_strings[:count] if count else []
+        return hashlib.md5('\x1f'.join(map(str, strings)).encode('utf-8')).hexdigest()
+
+    def is_stale(self):
+        """文件在会话打开后是否被修改过"""
+        try:
+            return os.path.getmtime(self.file_path) != self.mtime
+        except OSError:
+            return True
+
+    def read_sheet(self, sheet_name, **kwargs):
+        """读取单个工作表（参数同 pd.read_excel）"""
+        with self._lock:
+            warnings.filterwarnings("ignore", category=UserWarning)
+            return self.excel_file.parse(sheet_name, **kwargs)
+
+    def close(self):
+        """关闭底层文件句柄"""
+        with self._lock:
+            if self._excel_file is not None:
+                try:
+                    self._excel_file.close()
+                except Exception:
+                    pass
+                self._excel_file = None
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+# 进程内会话注册表：同一文件在同一进程中只打开一次
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _reset_sessions_after_fork():
+    """fork 出的子进程不能复用父进程的文件句柄（共享读写偏移），直接丢弃"""
+    global _sessions_lock
+    _sessions.clear()
+    _sessions_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_sessions_after_fork)
+
+
+def open_workbook(file_path):
+    """获取文件对应的共享会话（文件被修改后自动重新打开）
+
+    Args:
+        file_path: Excel 文件路径
+
+    Returns:
+        WorkbookSession: 当前进程内该文件的共享会话
+    """
+    key = os.path.abspath(file_path)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is not None and session.is_stale():
+            session.close()
+            session = None
+        if session is None:
+            session = WorkbookSession(file_path)
+            _sessions[key] = session
+            print_log(f"已打开工作簿会话: {os.path.basename(file_path)}", "LOAD")
+        return session
+
+
+def close_workbook(file_path=None):
+    """关闭共享会话
+
+    Args:
+        file_path: 要关闭的文件路径，为 None 时关闭全部会话
+    """
+    with _sessions_lock:
+        if file_path is None:
+            keys = list(_sessions)
+        else:
+            keys = [os.path.abspath(file_path)]
+        for key in keys:
+            session = _sessions.pop(key, None)
+            if session is not None:
+                session.close()
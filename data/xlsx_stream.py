@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+流式 XLSX 读取引擎 - 针对发货详单的固定表头布局
+
+直接 iterparse 工作表 XML，把单元格值写入按列类型划分的缓冲区：
+数值列写入 float 数组，类别/发往地/车牌号做字典编码，
+不经过 openpyxl 的通用单元格对象路径。
+"""
+import math
+import posixpath
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+from config import (
+    DATE_COL, REQUIRED_BASE_COLS, STREAM_FLOAT_KEYWORDS, STREAM_CODE_COLS, READ_CHUNK_ROWS
+)
+
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+TAG_ROW = NS_MAIN + 'row'
+TAG_C = NS_MAIN + 'c'
+TAG_V = NS_MAIN + 'v'
+TAG_IS = NS_MAIN + 'is'
+TAG_T = NS_MAIN + 't'
+TAG_R = NS_MAIN + 'r'
+TAG_SI = NS_MAIN + 'si'
+TAG_DIMENSION = NS_MAIN + 'dimension'
+
+WINDOWS_EPOCH = datetime(1899, 12, 30)
+MAC_EPOCH = datetime(1904, 1, 1)
+
+class UnsupportedLayoutError(Exception):
+    """工作表不符合流式引擎的布局假设，需要回退到 pandas 引擎"""
+
+
+class ReadCancelled(Exception):
+    """读取过程中收到取消请求"""
+
+
+# ==========================================
+# 工作簿级元数据解析（由 WorkbookSession 缓存）
+# ==========================================
+
+def parse_workbook_parts(archive):
+    """解析工作簿结构
+
+    Returns:
+        tuple: ([(sheet_name, part_path), ...], date1904)
+    """
+    workbook_path = 'xl/workbook.xml'
+    try:
+        root_rels = ET.fromstring(archive.read('_rels/.rels'))
+        for rel in root_rels.iter(NS_PKG_REL + 'Relationship'):
+            if rel.get('Type', '').endswith('/officeDocument'):
+                workbook_path = rel.get('Target').lstrip('/')
+                break
+    except KeyError:
+        pass
+
+    base_dir = posixpath.dirname(workbook_path)
+    rels_path = posixpath.join(base_dir, '_rels', posixpath.basename(workbook_path) + '.rels')
+    targets = {}
+    for rel in ET.fromstring(archive.read(rels_path)).iter(NS_PKG_REL + 'Relationship'):
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            target = target.lstrip('/')
+        else:
+            target = posixpath.normpath(posixpath.join(base_dir, target))
+        targets[rel.get('Id')] = target
+
+    workbook = ET.fromstring(archive.read(workbook_path))
+    pr = workbook.find(NS_MAIN + 'workbookPr')
+    date1904 = pr is not None and pr.get('date1904') in ('1', 'true')
+
+    sheets = []
+    for sheet in workbook.iter(NS_MAIN + 'sheet'):
+        sheets.append((sheet.get('name'), targets.get(sheet.get(NS_REL + 'id'))))
+    return sheets, date1904
+
+
+def parse_shared_strings(fh):
+    """解析 sharedStrings.xml（忽略拼音注音 rPh）"""
+    strings = []
+    for _, elem in ET.iterparse(fh, events=('end',)):
+        if elem.tag != TAG_SI:
+            continue
+        parts = []
+        for child in elem:
+            if child.tag == TAG_T:
+                parts.append(child.text or '')
+            elif child.tag == TAG_R:
+                for t in child.iter(TAG_T):
+                    parts.append(t.text or '')
+        strings.append(''.join(parts))
+        elem.clear()
+    return strings
+
+
+def parse_date_styles(fh):
+    """解析 styles.xml，返回日期格式的 cellXfs 下标集合（判定规则与 openpyxl 一致）"""
+    root = ET.parse(fh).getroot()
+    custom = {}
+    num_fmts = root.find(NS_MAIN + 'numFmts')
+    if num_fmts is not None:
+        for fmt in num_fmts.iter(NS_MAIN + 'numFmt'):
+            custom[int(fmt.get('numFmtId'))] = fmt.get('formatCode', '')
+
+    date_ids = set()
+    cell_xfs = root.find(NS_MAIN + 'cellXfs')
+    if cell_xfs is not None:
+        for i, xf in enumerate(cell_xfs.iter(NS_MAIN + 'xf')):
+            fmt_id = int(xf.get('numFmtId', 0))
+            code = custom.get(fmt_id, BUILTIN_FORMATS.get(fmt_id, 'General'))
+            if is_date_format(code):
+                date_ids.add(i)
+    return date_ids
+
+
+# ==========================================
+# 列缓冲区
+# ==========================================
+
+def _column_index(letters):
+    """列字母转 0 基下标（A -> 0）"""
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx - 1
+
+
+class _FloatColumn:
+    """数值列：直接写入 float64 数组，非数值记为 NaN（其行位置另行记录，供质量检查）"""
+
+    def __init__(self):
+        self.values = array('d')
+        self.non_numeric = array('i')
+
+    def append(self, cell, ctx):
+        if cell is None:
+            self.values.append(math.nan)
+            return
+        t, text, _ = cell
+        if t == 'e':
+            # 错误值（#N/A 等）与 read_excel 一样视为缺失
+            self.values.append(math.nan)
+            return
+        if t == 's':
+            text = ctx.shared_strings[int(text)]
+        try:
+            self.values.append(float(text))
+        except (TypeError, ValueError):
+            # 非空文本算非数值，空字符串与 read_excel 一样视为缺失
+            if text:
+                self.non_numeric.append(len(self.values))
+            self.values.append(math.nan)
+
+    def pad(self, n):
+        self.values.extend([math.nan] * n)
+
+    def to_series(self):
+        return pd.Series(np.frombuffer(self.values, dtype=np.float64).copy())
+
+
+class _CodeColumn:
+    """低基数文本列：字典编码，缓冲区只存整数编码，读出为分类类型（类别按首次出现顺序）"""
+
+    def __init__(self):
+        self.codes = array('i')
+        self.lookup = {}
+        self.dictionary = []
+
+    def append(self, cell, ctx):
+        value = ctx.convert(cell) if cell is not None else None
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.dictionary)
+            self.lookup[value] = code
+            self.dictionary.append(value)
+        self.codes.append(code)
+
+    def pad(self, n):
+        self.codes.extend([-1] * n)
+
+    def to_series(self):
+        # 编码直接作为分类类型的编码（-1 即缺失值），不解码为逐行的文本对象
+        codes = np.frombuffer(self.codes, dtype=np.int32)
+        return pd.Series(pd.Categorical.from_codes(codes, categories=self.dictionary))
+
+
+class _DateColumn:
+    """日期列：日期序列号写入 float 数组，少量文本日期单独记录"""
+
+    def __init__(self, epoch):
+        self.serials = array('d')
+        self.extras = {}
+        self.epoch = epoch
+
+    def append(self, cell, ctx):
+        pos = len(self.serials)
+        if cell is None:
+            self.serials.append(math.nan)
+            return
+        t, text, style = cell
+        if t in (None, 'n') and style in ctx.date_styles:
+            self.serials.append(float(text))
+            return
+        self.serials.append(math.nan)
+        value = ctx.convert(cell)
+        if value is not None:
+            self.extras[pos] = value
+
+    def pad(self, n):
+        self.serials.extend([math.nan] * n)
+
+    def to_series(self):
+        serials = np.frombuffer(self.serials, dtype=np.float64)
+        # 与 openpyxl.from_excel 一致：整日 + 毫秒级精度的日内时间
+        days = np.floor(serials)
+        millis = np.round((serials - days) * 86400000)
+        dates = (pd.to_datetime(days, unit='D', origin=self.epoch)
+                 + pd.to_timedelta(millis, unit='ms'))
+        if not self.extras:
+            return pd.Series(dates)
+        series = pd.Series(dates, dtype=object)
+        series[series.isna()] = np.nan
+        for pos, value in self.extras.items():
+            series.iat[pos] = value
+        return series
+
+
+class _GenericColumn:
+    """其他列：保留 Python 值，最后交给 pandas 推断类型"""
+
+    def __init__(self):
+        self.values = []
+
+    def append(self, cell, ctx):
+        self.values.append(ctx.convert(cell) if cell is not None else None)
+
+    def pad(self, n):
+        self.values.extend([None] * n)
+
+    def to_series(self):
+        series = pd.Series(self.values, dtype=object)
+        series[series.isna()] = np.nan
+        return series.infer_objects()
+
+
+class ReadContext:
+    """单次读取共享的查找表与单元格转换逻辑（预览等只读少量行的场景也可直接使用）"""
+
+    def __init__(self, shared_strings, date_styles, epoch):
+        self.shared_strings = shared_strings
+        self.date_styles = date_styles
+        self.epoch = epoch
+
+    def convert(self, cell):
+        """把原始单元格转换为与 pandas + openpyxl 路径一致的 Python 值"""
+        t, text, style = cell
+        if t == 's':
+            value = self.shared_strings[int(text)]
+            return value if value != '' else None
+        if t in ('str', 'inlineStr'):
+            return text if text != '' else None
+        if t == 'b':
+            return text == '1'
+        if t == 'e':
+            return None
+        if t == 'd':
+            return from_ISO8601(text)
+        if text is None or text == '':
+            return None
+        number = float(text)
+        if style in self.date_styles:
+            return from_excel(number, self.epoch)
+        as_int = int(number)
+        return as_int if as_int == number else number
+
+
+# ==========================================
+# 工作表读取
+# ==========================================
+
+# 模板配置中的列类型 -> 缓冲区类型
+_DTYPE_COLUMNS = {
+    'float': _FloatColumn,
+    'code': _CodeColumn,
+}
+
+
+def _make_column(name, epoch, dtypes=None):
+    """按列名选择缓冲区类型（模板配置声明了类型时优先使用）"""
+    if dtypes:
+        kind = dtypes.get(name.strip())
+        if kind == 'date':
+            return _DateColumn(epoch)
+        if kind in _DTYPE_COLUMNS:
+            return _DTYPE_COLUMNS[kind]()
+    if name.strip() == DATE_COL:
+        return _DateColumn(epoch)
+    if name.strip() in STREAM_CODE_COLS:
+        return _CodeColumn()
+    if any(kw in name for kw in STREAM_FLOAT_KEYWORDS):
+        return _FloatColumn()
+    return _GenericColumn()
+
+
+def _dedupe_names(names):
+    """重复列名按 pandas 规则追加 .1/.2 后缀"""
+    seen = {}
+    result = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            new_name = f"{name}.{seen[name]}"
+            while new_name in seen:
+                seen[name] += 1
+                new_name = f"{name}.{seen[name]}"
+            seen[new_name] = 0
+            result.append(new_name)
+        else:
+            seen[name] = 0
+            result.append(name)
+    return result
+
+
+def read_context(session):
+    """按工作簿会话的 sharedStrings、日期样式与日期系统创建 ReadContext"""
+    return ReadContext(session.shared_strings, session.date_style_ids, session.epoch)
+
+
+def iter_rows(fh, meta=None):
+    """逐行产出 (行号, {列下标: (类型, 文本, 样式)})
+
+    Args:
+        fh: 工作表 XML 文件对象
+        meta: 可选 dict，解析到 <dimension> 时写入 'last_row'（用于估算总行数）
+    """
+    col_cache = {}
+    next_row = 1
+    for _, elem in ET.iterparse(fh, events=('end',)):
+        if elem.tag != TAG_ROW:
+            if elem.tag == TAG_DIMENSION and meta is not None:
+                ref = elem.get('ref', '')
+                last = ref.split(':')[-1].lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+                if last.isdigit():
+                    meta['last_row'] = int(last)
+            continue
+        row_attr = elem.get('r')
+        row_num = int(row_attr) if row_attr else next_row
+        next_row = row_num + 1
+
+        cells = {}
+        next_col = 0
+        for c in elem:
+            ref = c.get('r')
+            if ref:
+                letters = ref.rstrip('0123456789')
+                col = col_cache.get(letters)
+                if col is None:
+                    col = col_cache[letters] = _column_index(letters)
+            else:
+                col = next_col
+            next_col = col + 1
+
+            t = c.get('t')
+            if t == 'inlineStr':
+                is_elem = c.find(TAG_IS)
+                text = ''.join(x.text or '' for x in is_elem.iter(TAG_T)) if is_elem is not None else None
+            else:
+                v = c.find(TAG_V)
+                text = v.text if v is not None else None
+            if text is None:
+                continue
+            style = c.get('s')
+            cells[col] = (t, text, int(style) if style else 0)
+
+        elem.clear()
+        yield row_num, cells
+
+
+def read_sheet_stream(session, sheet_name, header_index=1, progress_callback=None,
+                      cancel_event=None, chunk_rows=None, schema_resolver=None):
+    """流式读取单个工作表
+
+    Args:
+        session: WorkbookSession（提供 zip 句柄、sharedStrings 与日期样式）
+        sheet_name: 工作表名称
+        header_index: 表头所在行（0 基，与 read_excel 的 header 参数一致）
+        progress_callback: 每读完一个分块调用 progress_callback(已读行数, 预估总行数或 None)
+        cancel_event: 取消事件，分块之间检查
+        chunk_rows: 分块行数，默认取 READ_CHUNK_ROWS
+        schema_resolver: 可选，解析到表头后调用 schema_resolver(表头列名列表)，
+            返回模板配置时只读取其 usecols 并按 dtypes 建立列缓冲区
+
+    Returns:
+        DataFrame: 列名未去空格的原始数据（与 read_excel 一样保留中间空行）
+
+    Raises:
+        UnsupportedLayoutError: 非 xlsx 结构或表头不含必需列
+        ReadCancelled: 读取中途收到取消请求
+    """
+    part = session.sheet_part(sheet_name)
+    ctx = read_context(session)
+    header_row = header_index + 1
+    chunk_rows = chunk_rows or READ_CHUNK_ROWS
+
+    header = None
+    columns = {}
+    # 模板配置裁剪掉的列下标（数据行中这些位置直接忽略）
+    skipped = set()
+    schema = None
+    n_rows = 0
+    last_row = header_row
+    next_report = chunk_rows
+    meta = {}
+
+    with session.open_part(part) as fh:
+        for row_num, cells in iter_rows(fh, meta):
+            if row_num < header_row:
+                continue
+            if row_num == header_row:
+                header = parse_header(cells, ctx)
+                dtypes = None
+                if schema_resolver is not None:
+                    schema = schema_resolver(list(header.values()))
+                if schema:
+                    keep = set(schema['usecols'])
+                    dtypes = schema['dtypes']
+                    for idx, name in list(header.items()):
+                        if name.strip() not in keep:
+                            skipped.add(idx)
+                            del header[idx]
+                for idx, name in header.items():
+                    columns[idx] = _make_column(name, ctx.epoch, dtypes)
+                continue
+            if header is None:
+                break
+            if not cells:
+                continue
+
+            if n_rows >= next_report:
+                next_report = n_rows + chunk_rows
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ReadCancelled(sheet_name)
+                if progress_callback:
+                    progress_callback(n_rows, estimate_data_rows(meta, header_row))
+
+            # 中间的空行（含 XML 中省略的行）与 read_excel 一样保留为缺失值行
+            gap = row_num - last_row - 1
+            if gap > 0:
+                for column in columns.values():
+                    column.pad(gap)
+                n_rows += gap
+            last_row = row_num
+
+            for idx in cells:
+                if idx not in columns:
+                    if idx in skipped or (schema and schema.get('prune', True)):
+                        continue
+                    # 表头外的数据列：与 pandas 一样命名为 Unnamed
+                    header[idx] = f"Unnamed: {idx}"
+                    column = _GenericColumn()
+                    column.pad(n_rows)
+                    columns[idx] = column
+            for idx, column in columns.items():
+                column.append(cells.get(idx), ctx)
+            n_rows += 1
+
+    if header is None:
+        raise UnsupportedLayoutError(f"工作表 [{sheet_name}] 未找到表头行")
+    if progress_callback:
+        progress_callback(n_rows, n_rows)
+
+    order = sorted(columns)
+    names = _dedupe_names([header[i] for i in order])
+    df = pd.DataFrame({name: columns[i].to_series() for name, i in zip(names, order)})
+    if schema:
+        df.attrs['schema'] = schema
+    # 数值列读取时已转为 float，非数值单元格的位置留给清洗阶段的质量检查
+    non_numeric = {
+        name.strip(): np.frombuffer(columns[i].non_numeric, dtype=np.int32).copy()
+        for name, i in zip(names, order)
+        if isinstance(columns[i], _FloatColumn) and len(columns[i].non_numeric)
+    }
+    if non_numeric:
+        df.attrs['non_numeric'] = non_numeric
+    return df
+
+
+def estimate_data_rows(meta, header_row):
+    """根据 iter_rows 记录的 <dimension> 估算表头之后的数据行数，无 <dimension> 时返回 None"""
+    last_row = meta.get('last_row')
+    if last_row and last_row > header_row:
+        return last_row - header_row
+    return None
+
+
+def parse_header(cells, ctx):
+    """解析表头行并校验必需列
+
+    Returns:
+        dict: {列下标: 列名}（列名未去空格）
+
+    Raises:
+        UnsupportedLayoutError: 表头缺少必需列
+    """
+    header = {}
+    for idx in sorted(cells):
+        value = ctx.convert(cells[idx])
+        if value is None or value == '':
+            continue
+        header[idx] = value if isinstance(value, str) else str(value)
+
+    stripped = {name.strip() for name in header.values()}
+    missing = [c for c in [DATE_COL] + REQUIRED_BASE_COLS if c not in stripped]
+    if missing:
+        raise UnsupportedLayoutError(f"表头缺少必需列: {', '.join(missing)}")
+    return header
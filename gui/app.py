@@ -3,10 +3,12 @@
 GUI 主界面类
 """
 import os
+import threading
 import time
 import tkinter as tk
 from tkinter import ttk
 from datetime import datetime
+from queue import Queue, Empty
 
 from core.logger import print_log
 from gui.utils import center_window_on_console
@@ -238,12 +240,15 @@ class AppGUI:
         self.processed_records = 0
 
     def update_record_progress(self, current, total=None):
-        """更新记录处理进度"""
-        if total:
+        """更新记录处理进度（total 为 0 表示总数未知）"""
+        if total is not None:
             self.total_records = total
         self.processed_records = current
         if hasattr(self, "lbl_records"):
-            self.lbl_records.config(text=f"记录数: {current}/{self.total_records}")
+            if self.total_records:
+                self.lbl_records.config(text=f"记录数: {current}/{self.total_records}")
+            else:
+                self.lbl_records.config(text=f"记录数: {current}")
             self.root.update()
 
     def close_progress(self):
@@ -252,14 +257,22 @@ class AppGUI:
             self.win.destroy()
             self.win = None
 
-    def ask_sheet_name(self, sheet_names, file_name):
-        """弹窗让用户选择工作表（支持多选对比）"""
+    def ask_sheet_name(self, sheet_names, file_name, preview_func=None, format_preview=None):
+        """弹窗让用户选择工作表（支持多选对比）
+
+        Args:
+            sheet_names: 工作表名称列表
+            file_name: Excel 文件路径
+            preview_func: 可选，后台线程中调用 preview_func(on_result, cancel_event)
+                逐个回传工作表概况（on_result(None, 工作簿属性) / on_result(下标, 概况)）
+            format_preview: 把单个工作表概况格式化为列表项后缀的函数
+        """
         dialog = tk.Toplevel(self.root)
         dialog.title("请选择工作表")
-        dialog.geometry("450x420")
+        dialog.geometry("560x460")
         dialog.resizable(False, False)
         self._set_app_icon(dialog)
-        center_window_on_console(dialog, 450, 420)
+        center_window_on_console(dialog, 560, 460)
         dialog.attributes("-topmost", True)
         dialog.configure(bg=self.THEME["bg_panel"])
         dialog.grab_set()
@@ -274,6 +287,16 @@ class AppGUI:
         )
         label.pack()
 
+        info_label = tk.Label(
+            dialog,
+            text="",
+            font=("Microsoft YaHei UI", 9),
+            fg=self.THEME["text_sub"],
+            bg=self.THEME["bg_panel"],
+        )
+        if preview_func:
+            info_label.pack()
+
         tip_label = tk.Label(
             dialog,
             text="按住 Ctrl 可多选月份 | 双击或按 Enter 确认",
@@ -306,8 +329,14 @@ class AppGUI:
         listbox.pack(side="left", fill="both", expand=True)
         scrollbar.config(command=listbox.yview)
 
+        def item_text(name, info=None):
+            if not preview_func:
+                return name
+            suffix = format_preview(info) if format_preview else ""
+            return f"{name}    {suffix}" if suffix else name
+
         for name in sheet_names:
-            listbox.insert("end", name)
+            listbox.insert("end", item_text(name))
 
         default_index = 0
         if sheet_names:
@@ -336,7 +365,8 @@ class AppGUI:
                 if active >= 0:
                     indices = (active,)
 
-            self.selected_sheets = [listbox.get(i) for i in indices]
+            # 列表项带有概况后缀，按下标取回工作表名
+            self.selected_sheets = [sheet_names[i] for i in indices]
             if self.selected_sheets:
                 print_log(f"用户选择了: {', '.join(self.selected_sheets)}", "SELECT")
                 dialog.destroy()
@@ -350,6 +380,44 @@ class AppGUI:
             self.selected_sheets = []
             dialog.destroy()
 
+        # === 后台读取工作表概况（对话框先显示，概况陆续填入） ===
+        preview_cancel = threading.Event()
+        preview_queue = Queue()
+
+        def apply_preview(key, info):
+            if key is None:
+                text = f"最后修改：{info['modified'].strftime('%Y-%m-%d %H:%M')}"
+                if info.get('modified_by'):
+                    text += f"  ({info['modified_by']})"
+                info_label.config(text=text)
+                return
+            selected = key in listbox.curselection()
+            listbox.delete(key)
+            listbox.insert(key, item_text(sheet_names[key], info))
+            if selected:
+                listbox.selection_set(key)
+
+        def poll_preview():
+            if preview_cancel.is_set() or not dialog.winfo_exists():
+                return
+            while True:
+                try:
+                    key, info = preview_queue.get_nowait()
+                except Empty:
+                    break
+                apply_preview(key, info)
+            dialog.after(30, poll_preview)
+
+        def run_preview():
+            try:
+                preview_func(lambda key, info: preview_queue.put((key, info)), preview_cancel)
+            except Exception as e:
+                print_log(f"工作表概况预览失败: {e}", "WARN")
+
+        if preview_func:
+            threading.Thread(target=run_preview, daemon=True).start()
+            dialog.after(30, poll_preview)
+
         listbox.bind("<Double-Button-1>", on_double_click)
         listbox.bind("<Return>", on_confirm)
         dialog.bind("<Return>", on_confirm)
@@ -391,4 +459,5 @@ class AppGUI:
 
         listbox.focus_set()
         dialog.wait_window()
+        preview_cancel.set()
         return self.selected_sheets
@@ -103,6 +103,7 @@ def main():
         from config import APP_NAME, APP_AUTHOR, VERSION, OUTPUT_FOLDER_NAME
         from core.logger import print_log, error_logger
         from core.cache import data_cache
+        from core.memo import stage_memo
         
         # 阶段 2: GUI 框架 (中等)
         loader.update(25, "初始化 GUI 界面引擎...")
@@ -113,8 +114,13 @@ def main():
         # 阶段 3: 数据处理核心 (重型 - Pandas)
         loader.update(45, "加载数据科学引擎 (Pandas)...")
         import pandas as pd
-        from data.loader import ThreadedDataLoader, load_and_clean_sheet
-        from data.cleaner import clean_dataframe
+        from data.loader import ThreadedDataLoader, load_and_clean_sheet, cleaned_cache_variant
+        from data.workbook import open_workbook, close_workbook
+        from data.preview import collect_sheet_previews, format_sheet_preview
+        from data.cleaner import clean_dataframe, clean_sheet_frame, finalize_cleaned_frames
+        from data.validator import DataValidator
+        from data.fingerprint import fingerprint_index
+        from data.prefetch import SheetPrefetcher
         
         # 阶段 4: 统计分析 (中等 - Numpy/Scipy)
         loader.update(65, "加载统计分析算法 (Scipy)...")
@@ -200,22 +206,34 @@ def main():
     app.update_progress(5, "正在扫描 Excel 结构...")
 
     try:
-        # 使用 openpyxl 快速读取 sheet 名
-        xl = pd.ExcelFile(file_path, engine='openpyxl')
-        sheet_names = xl.sheet_names
+        # 打开共享工作簿会话：列出 sheet 名与后续读取复用同一句柄
+        workbook = open_workbook(file_path)
+        sheet_names = workbook.sheet_names
     except Exception as e:
         app.close_progress()
         error_logger.log_error("Excel读取失败", "无法识别 Excel 结构", exception=e)
         sys.exit()
 
+    # 用户挑选工作表期间在后台预热缓存（已缓存的读入内存，最近使用的提前解析）
+    prefetcher = SheetPrefetcher(file_path, sheet_names)
+    prefetcher.start()
+
     app.win.withdraw() # 暂时隐藏进度条，显示选择框
-    selected_sheets = app.ask_sheet_name(sheet_names, file_path)
+    selected_sheets = app.ask_sheet_name(
+        sheet_names, file_path,
+        preview_func=lambda on_result, cancel_event: collect_sheet_previews(
+            file_path, sheet_names, on_result, cancel_event),
+        format_preview=format_sheet_preview
+    )
+    prefetcher.finish(selected_sheets or [], root=app.root)
 
     if not selected_sheets:
         app.close_progress()
         print_log("未选择工作表，程序退出。", "STOP")
         sys.exit()
 
+    data_cache.record_selection(file_path, selected_sheets)
+
     # 判断是否为多月对比模式
     is_compare_mode = len(selected_sheets) > 1
     target_sheet = selected_sheets[0] if not is_compare_mode else "多月对比"
@@ -230,61 +248,111 @@ def main():
         print_log(f"开始分析工作表: {target_sheet}", "START")
 
     # --- 数据读取与智能清洗 ---
-    data_loader = ThreadedDataLoader(app)
+    # 多月对比模式下每个工作表在独立进程中并行解析
+    data_loader = ThreadedDataLoader(app, use_processes=is_compare_mode)
     
-    # 检查磁盘缓存
-    cached_df = data_cache.get(file_path, selected_sheets, 'df')
-    if cached_df is not None:
+    # 检查磁盘缓存：先查所选工作表合并后的清洗结果，再查按工作表缓存的清洗结果（命中的工作表不再读取）
+    col_info = None
+    # 单表清洗结果按读取 / 清洗代码版本区分，修改清洗规则后旧条目不再命中
+    cleaned_variant = cleaned_cache_variant()
+    # 各阶段键串联上游阶段键：清洗代码变化时合并结果及其下游的汇总、图表一并失效
+    finalize_key = stage_memo.stage_key('finalize', finalize_cleaned_frames, selected_sheets,
+                                        upstream=[cleaned_variant])
+    memoized = stage_memo.lookup('finalize', finalize_cleaned_frames, file_path, selected_sheets,
+                                 upstream=[cleaned_variant])
+    cached_sheets = {} if memoized is not None else data_cache.get_sheets(
+        file_path, selected_sheets, 'cleaned', cleaned_variant)
+    missing_sheets = [s for s in selected_sheets if s not in cached_sheets]
+    if memoized is not None:
+        print_log("⚡ 命中磁盘缓存！跳过 Excel 读取与合并", "CACHE")
+        df, col_info = memoized
+        app.update_progress(30, "正在从高速缓存加载数据...", records_info=f"{len(df)} 条")
+    elif not missing_sheets:
         print_log("⚡ 命中磁盘缓存！跳过 Excel 读取", "CACHE")
+        cached_records = sum(len(cached_sheets[s][0]) for s in selected_sheets)
         # 模拟加载过程动画
         for i in range(10, 31, 5):
-            app.update_progress(i, "正在从高速缓存加载数据...", records_info=f"{len(cached_df)} 条")
+            app.update_progress(i, "正在从高速缓存加载数据...", records_info=f"{cached_records} 条")
             time.sleep(0.05)
-        df = cached_df
+        df, col_info = finalize_cleaned_frames(
+            [cached_sheets[s][0] for s in selected_sheets],
+            [cached_sheets[s][1] for s in selected_sheets]
+        )
     else:
-        # 启动多线程异步加载
-        print_log("启动多线程异步加载引擎...", "ASYNC")
-        data_loader.set_load_function(load_and_clean_sheet)
-        
-        load_complete_event = threading.Event()
-        load_result = {'status': None, 'data': None, 'extra': None, 'error': None}
-        
-        def on_load_complete(status, data, extra):
-            load_result['status'] = status
-            load_result['data'] = data
-            load_result['extra'] = extra
-            load_complete_event.set()
-        
-        data_loader.load_sheets_async(file_path, selected_sheets, on_load_complete)
-        
-        def wait_for_load():
-            if not load_complete_event.is_set():
-                app.root.update()
-                app.root.after(50, wait_for_load)
-        
-        wait_for_load()
-        
-        _async_load_pending = True
-        while _async_load_pending and not load_complete_event.is_set():
+        # 其他实例 / 批处理任务可能正在解析同样的工作表：等它完成后直接复用其结果
+        sheet_lock = data_cache.compute_lock(file_path, missing_sheets, 'cleaned', cleaned_variant,
+                                             per_sheet=True)
+        while not sheet_lock.acquire(timeout=0.1):
+            app.update_progress(10, "其他任务正在解析同一工作簿，等待其完成...")
             app.root.update()
-            time.sleep(0.01)
-        
-        if load_result['status'] == 'success':
-            df = load_result['data']
-            print_log(f"异步加载完成，共 {len(df)} 条记录", "OK")
-            data_cache.set(file_path, selected_sheets, 'df', df)
-        else:
-            app.close_progress()
-            error_msg = "数据加载失败"
-            if load_result['extra'] and 'message' in load_result['extra']:
-                error_msg = load_result['extra']['message']
-            error_logger.show_error_dialog("加载失败", error_msg)
-            sys.exit()
+        try:
+            cached_sheets.update(data_cache.get_sheets(file_path, missing_sheets, 'cleaned', cleaned_variant,
+                                                       count_miss=False))
+            missing_sheets = [s for s in selected_sheets if s not in cached_sheets]
+            if cached_sheets:
+                print_log(f"⚡ 命中 {len(cached_sheets)} 个工作表的缓存，只读取: {', '.join(missing_sheets)}", "CACHE")
+            # 启动多线程异步加载
+            print_log("启动多线程异步加载引擎...", "ASYNC")
+            data_loader.set_load_function(load_and_clean_sheet)
+            # 读取下一个工作表的同时清洗已读出的工作表
+            data_loader.set_clean_function(clean_sheet_frame, finalize_cleaned_frames)
+            
+            load_complete_event = threading.Event()
+            load_result = {'status': None, 'data': None, 'extra': None, 'error': None}
+            
+            def on_load_complete(status, data, extra):
+                load_result['status'] = status
+                load_result['data'] = data
+                load_result['extra'] = extra
+                load_complete_event.set()
+            
+            load_started = time.time()
+            data_loader.load_sheets_async(file_path, selected_sheets, on_load_complete,
+                                          cached_results=cached_sheets)
+            
+            def wait_for_load():
+                if not load_complete_event.is_set():
+                    app.root.update()
+                    app.root.after(50, wait_for_load)
+            
+            wait_for_load()
+            
+            _async_load_pending = True
+            while _async_load_pending and not load_complete_event.is_set():
+                app.root.update()
+                time.sleep(0.01)
+            
+            if load_result['status'] == 'success':
+                df = load_result['data']
+                extra = load_result['extra'] or {}
+                if extra.get('cleaned'):
+                    col_info = extra['col_info']
+                    print_log(f"异步加载与清洗完成，共 {extra.get('total_records', len(df))} 条记录", "OK")
+                    # 读取与清洗耗时按新读取的工作表平均分摊，用于统计缓存节省的时间
+                    sheet_seconds = (time.time() - load_started) / max(len(missing_sheets), 1)
+                    data_cache.set_sheets(file_path, extra.get('sheet_results', {}), 'cleaned',
+                                          cleaned_variant, compute_seconds=sheet_seconds)
+                else:
+                    print_log(f"异步加载完成，共 {len(df)} 条记录", "OK")
+            else:
+                app.close_progress()
+                # 先释放计算锁，等待中的其他实例不必等到错误对话框关闭
+                sheet_lock.release()
+                error_msg = "数据加载失败"
+                if load_result['extra'] and 'message' in load_result['extra']:
+                    error_msg = load_result['extra']['message']
+                error_logger.show_error_dialog("加载失败", error_msg)
+                sys.exit()
+        finally:
+            sheet_lock.release()
 
     # --- 数据清洗与处理 ---
-    app.update_progress(32, "正在执行智能数据清洗...", records_info=f"{len(df)} 条待处理")
-    
-    df, col_info = clean_dataframe(df)
+    if col_info is None:
+        app.update_progress(32, "正在执行智能数据清洗...", records_info=f"{len(df)} 条待处理")
+        df, col_info = clean_dataframe(df)
+    if memoized is None:
+        stage_memo.store('finalize', finalize_cleaned_frames, file_path, selected_sheets, (df, col_info),
+                         upstream=[cleaned_variant])
 
     if df.empty:
         app.close_progress()
@@ -295,17 +363,31 @@ def main():
     app.update_progress(45, "正在计算关键财务指标...")
     print_log(f"数据准备就绪，有效记录: {len(df)} 条", "DATA")
 
+    # --- 数据质量检查（单次扫描，结果附在深度报告中；需与历史行指纹比对，不做阶段记忆） ---
+    validator = DataValidator(df, file_path=file_path, sheets=selected_sheets,
+                              raw_checks=col_info.get('checks'))
+    validator.run_all_checks()
+    quality_html = validator.generate_html_report()
+    fingerprint_index.record(file_path, df, validator.fingerprints)
+
     # --- 多维度分析汇总表 ---
     app.update_progress(55, "正在构建多维数据模型...")
-    category_summary, destination_summary, weekly_summary, daily_summary = create_summary_table(df)
+    summary_key = stage_memo.stage_key('summary', create_summary_table, selected_sheets,
+                                       upstream=[finalize_key])
+    category_summary, destination_summary, weekly_summary, daily_summary = stage_memo.run(
+        'summary', create_summary_table, file_path, selected_sheets, df, upstream=[finalize_key])
 
     # --- 多月份对比分析 ---
     app.update_progress(62, "正在进行多月份对比分析...")
-    monthly_summary, monthly_category, monthly_dest = create_monthly_comparison(df, is_compare_mode)
+    monthly_summary, monthly_category, monthly_dest = stage_memo.run(
+        'monthly', create_monthly_comparison, file_path, selected_sheets, df, is_compare_mode,
+        params=is_compare_mode, upstream=[finalize_key])
 
     # --- 成本分析 ---
     app.update_progress(70, "正在进行成本与利润分析...")
-    cost_analysis = create_cost_analysis(df)
+    cost_key = stage_memo.stage_key('cost', create_cost_analysis, selected_sheets, upstream=[finalize_key])
+    cost_analysis = stage_memo.run('cost', create_cost_analysis, file_path, selected_sheets, df,
+                                   upstream=[finalize_key])
 
     # --- 创建可视化图表 ---
     app.update_progress(80, "正在渲染动画与可视化图表...")
@@ -314,7 +396,7 @@ def main():
     total_profit = df['预估利润'].sum()
     avg_profit_per_ton = total_profit / total_weight if total_weight > 0 else 0
     total_shipments = len(df)
-    avg_daily_weight = df.groupby('中文日期')['重量（吨）'].sum().mean() if not df.empty else 0
+    avg_daily_weight = df.groupby('中文日期', observed=True)['重量（吨）'].sum().mean() if not df.empty else 0
     total_profit_wan = total_profit / 10000
     
     kpi_title_prefix = f"[{', '.join(selected_sheets)}]" if is_compare_mode else f"[{target_sheet}]"
@@ -326,14 +408,16 @@ def main():
         {"value": avg_daily_weight, "title": "日均发货量", "suffix": " 吨", "color": '#CC00FF', "valueformat": ".1f"}
     ]
     
-    fig = create_dashboard_figure(df, kpi_data, cost_analysis, weekly_summary)
+    fig = stage_memo.run('dashboard', create_dashboard_figure, file_path, selected_sheets,
+                         df, kpi_data, cost_analysis, weekly_summary, params=kpi_data,
+                         upstream=[finalize_key, summary_key, cost_key])
 
-    # --- 生成深度分析报告 ---
+    # --- 生成深度分析报告（含生成时间，每次运行都重新排版） ---
     app.update_progress(88, "正在生成深度分析报告...")
     generate_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     # 车辆统计 (移到此处保持逻辑闭环)
-    vehicle_stats = df.groupby('车牌号').agg({
+    vehicle_stats = df.groupby('车牌号', observed=True).agg({
         '重量（吨）': 'sum',
         '中文日期': 'count'
     }).rename(columns={'中文日期': '运输次数'})
@@ -349,9 +433,12 @@ def main():
         target_sheet, generate_time, kpi_data, 
         category_summary, destination_summary, weekly_summary,
         top_vehicles, cost_analysis, kpi_title_prefix,
-        daily_summary
+        daily_summary, quality_html
     )
 
+    # 各阶段结果已写入缓存，释放工作簿句柄
+    close_workbook(file_path)
+
     # --- 获取桌面路径并保存文件 ---
     app.update_progress(96, "正在生成最终文件...")
     print_log("正在写入文件到桌面...", "SAVE")
@@ -392,6 +479,12 @@ def main():
             category_summary.to_excel(writer, sheet_name='品类汇总')
             destination_summary.to_excel(writer, sheet_name='目的地汇总')
             cost_analysis['dest_cost'].to_excel(writer, sheet_name='成本分析')
+            audit = col_info.get('audit')
+            if audit is not None and len(audit):
+                audit.to_frame().to_excel(writer, sheet_name='剔除记录', index=False)
+            issue_detail = validator.issue_detail_frame()
+            if not issue_detail.empty:
+                issue_detail.to_excel(writer, sheet_name='质量问题明细', index=False)
         print_log(f"数据已备份: {excel_file}", "SUCCESS")
         
         app.update_progress(100, "🎉 分析完成！准备展示成果...")
@@ -423,5 +516,8 @@ def main():
         sys.exit()
 
 if __name__ == '__main__':
+    # 打包为 exe 后多进程读取需要此调用
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
 
@@ -72,6 +72,7 @@ def build_analysis_report(
     cost_analysis,
     kpi_title_prefix,
     daily_summary=None,
+    quality_html=None,
 ):
     """构建完整 HTML 分析报告。"""
     freight_ratio = cost_analysis["total_freight_ratio"]
@@ -155,6 +156,8 @@ def build_analysis_report(
         {warning_html}
         {suggestion_html}
 
+        {quality_html or ""}
+
         <div class="footer">
             <p>POWERED BY 李小泡智能分析系统 v9.0 | 核心算法支持：Pandas + Plotly + Scipy</p>
         </div>
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共设置：缓存 / 恢复目录与表头模板配置都指向临时目录，不触碰用户数据
+"""
+import datetime as dt
+import os
+import sys
+import tempfile
+
+# 缓存与恢复目录在导入 config 时确定，须在导入项目模块之前指向临时目录；
+# 用户目录（POSIX 读 HOME，Windows 读 USERPROFILE）一并替换，其他按 ~ 取路径的代码也不会写到用户目录
+_TEST_HOME = tempfile.mkdtemp(prefix='packing_station_test_')
+os.environ['PACKING_STATION_CACHE_DIR'] = os.path.join(_TEST_HOME, 'cache')
+os.environ['PACKING_STATION_RECOVERY_DIR'] = os.path.join(_TEST_HOME, 'recovery')
+os.environ['HOME'] = _TEST_HOME
+os.environ['USERPROFILE'] = _TEST_HOME
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from openpyxl import Workbook
+
+from core.cache import data_cache
+from core.recovery import recovery_manager_instance
+from data.fingerprint import fingerprint_index
+from data.schema import schema_store
+from data.workbook import close_workbook
+
+schema_store.settings_file = os.path.join(_TEST_HOME, 'settings.json')
+
+# 测试结束时会清空缓存：任何目录落在临时目录之外都直接中止，绝不触碰用户的真实数据
+for _path in (data_cache.cache_dir, fingerprint_index.index_dir, recovery_manager_instance.recovery_dir):
+    if os.path.commonpath([_TEST_HOME, os.path.abspath(_path)]) != _TEST_HOME:
+        raise RuntimeError(f"测试数据目录不在临时目录中: {_path}")
+
+HEADER = ['卸货日期', '类别', '发往地', '车牌号', '重量（吨）', '扣点', '卖出价', '运费', '预估利润', '备注']
+
+
+def make_row(day, category='黄板纸', dest='东莞', plate='粤A00001', weight=20.0,
+             deduction=1.0, price=2000.0, freight=800.0, profit=300.0, note=None, month=1):
+    """一行发货记录（列顺序同 HEADER）"""
+    return [dt.datetime(2024, month, day), category, dest, plate, weight,
+            deduction, price, freight, profit, note]
+
+
+def write_workbook(path, sheets):
+    """写出与发货详单相同布局的工作簿（第 1 行标题，第 2 行表头）
+
+    Args:
+        path: 输出路径
+        sheets: {工作表名: 行列表}
+    """
+    wb = Workbook(write_only=True)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        ws.append(['2024年发货详单'])
+        ws.append(HEADER)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def sample_rows():
+    """30 行正常数据（足够触发 IQR 等统计检查的最小行数）"""
+    return [make_row(1 + i % 28, plate=f'粤A{i:05d}', weight=10.0 + i % 7) for i in range(30)]
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache():
+    """每个测试结束后关闭工作簿会话并清空缓存（条目按内容寻址，内容相同的工作簿会相互命中）"""
+    yield
+    close_workbook()
+    data_cache.memory.clear()
+    data_cache.prune()
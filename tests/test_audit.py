@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+剔除记录：每行只记最先命中的规则，按规则统计条数并保留工作表与源行号
+"""
+import pytest
+
+from config import SOURCE_ROW_COL
+from data.audit import RejectionAudit
+from data.cleaner import clean_sheet_frame
+from data.loader import load_and_clean_sheet
+
+from conftest import HEADER, make_row, write_workbook
+
+
+def _rows():
+    """第 3 行起的数据：每条规则至少命中一次，(源行号, 剔除原因) 见 EXPECTED"""
+    rows = [make_row(1 + i) for i in range(12)]
+    rows[1][0] = None                   # 缺日期且缺卖出价：只记最先命中的 缺少卸货日期
+    rows[1][6] = None
+    rows[2][5] = None
+    rows[3][5] = None
+    rows[4][6] = None
+    rows[5][6] = 1
+    rows[6][6] = 0.5
+    rows[7][3] = None
+    rows[8][4] = 0
+    rows[9][0] = '无法识别'
+    rows.insert(11, [None] * len(HEADER))  # 中间空行
+    return rows
+
+
+EXPECTED = [
+    (4, '缺少卸货日期'), (5, '扣点未出'), (6, '扣点未出'), (7, '卖出价为空'), (8, '卖出价≤1'), (9, '卖出价≤1'),
+    (10, '基础信息不全'), (11, '重量≤0'), (12, '日期无法识别'), (14, '缺少卸货日期'),
+]
+
+
+@pytest.mark.parametrize('engine', ['stream', 'pandas'])
+def test_counts_per_reason(tmp_path, engine):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': _rows()})
+    df, info = clean_sheet_frame(load_and_clean_sheet(path, '1月', engine=engine))
+    audit = info['audit']
+
+    assert audit.counts() == {
+        '缺少卸货日期': 2, '扣点未出': 2, '卖出价为空': 1, '卖出价≤1': 2,
+        '基础信息不全': 1, '重量≤0': 1, '日期无法识别': 1,
+    }
+    assert len(audit) == len(EXPECTED)
+    assert len(df) == 13 - len(EXPECTED)
+    frame = audit.to_frame()
+    assert list(zip(frame[SOURCE_ROW_COL], frame['剔除原因'])) == EXPECTED
+    assert set(frame['工作表']) == {'1月'}
+    assert audit.summary_text().startswith('缺少卸货日期 2，扣点未出 2，')
+
+
+def test_merge_sums_counts_across_sheets(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': _rows(), '2月': sample_rows, '3月': _rows()[:6]})
+    audits = [clean_sheet_frame(load_and_clean_sheet(path, sheet))[1]['audit'] for sheet in ['1月', '2月', '3月']]
+    merged = RejectionAudit.merge(audits + [None])
+
+    assert len(audits[1]) == 0
+    assert merged.counts() == {
+        '缺少卸货日期': 3, '扣点未出': 4, '卖出价为空': 2, '卖出价≤1': 3,
+        '基础信息不全': 1, '重量≤0': 1, '日期无法识别': 1,
+    }
+    frame = merged.to_frame()
+    assert frame['工作表'].tolist() == ['1月'] * 10 + ['3月'] * 5
+    assert frame[SOURCE_ROW_COL].tolist()[10:] == [4, 5, 6, 7, 8]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+数据缓存：工作簿内容或清洗代码变化后旧条目失效
+"""
+import zipfile
+import zlib
+
+import pandas as pd
+import pytest
+
+from core.cache import data_cache
+from core.memo import stage_memo
+from data.cleaner import clean_sheet_frame
+from data.loader import cleaned_cache_variant, load_and_clean_sheet
+from data.workbook import close_workbook, open_workbook
+
+from conftest import make_row, write_workbook
+
+
+@pytest.fixture
+def workbook(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows, '2月': sample_rows[:10]})
+    return path
+
+
+def _clean(path, sheet):
+    return clean_sheet_frame(load_and_clean_sheet(path, sheet))
+
+
+def test_sheet_entries_survive_unrelated_sheet_edits(tmp_path, workbook, sample_rows):
+    variant = cleaned_cache_variant()
+    data_cache.set_sheets(workbook, {'1月': _clean(workbook, '1月'), '2月': _clean(workbook, '2月')},
+                          'cleaned', variant)
+    assert set(data_cache.get_sheets(workbook, ['1月', '2月'], 'cleaned', variant)) == {'1月', '2月'}
+
+    # 只修改 2 月：1 月的条目仍然命中，2 月的条目失效
+    close_workbook()
+    write_workbook(workbook, {'1月': sample_rows, '2月': sample_rows[:10] + [make_row(28, plate='粤C1')]})
+    data_cache.memory.clear()
+    assert set(data_cache.get_sheets(workbook, ['1月', '2月'], 'cleaned', variant)) == {'1月'}
+
+
+def test_memory_tier_rejects_changed_content(workbook, sample_rows):
+    value = pd.DataFrame({'a': [1]})
+    data_cache.set(workbook, ['1月'], 'probe', value)
+    assert data_cache.get(workbook, ['1月'], 'probe') is not None
+
+    close_workbook()
+    write_workbook(workbook, {'1月': sample_rows[:5], '2月': sample_rows[:10]})
+    assert data_cache.get(workbook, ['1月'], 'probe') is None
+
+
+def test_cleaned_entries_invalidate_on_code_change(workbook, monkeypatch):
+    variant = cleaned_cache_variant()
+    data_cache.set_sheets(workbook, {'1月': _clean(workbook, '1月')}, 'cleaned', variant)
+    assert data_cache.get_sheets(workbook, ['1月'], 'cleaned', variant)
+
+    # 模拟修改 cleaner.py：源码摘要变化后 variant 随之变化，旧条目不再命中
+    original = stage_memo._source_digest
+    monkeypatch.setattr(stage_memo, '_source_digest',
+                        lambda path: original(path) + ('-edited' if path and path.endswith('cleaner.py') else ''))
+    edited = cleaned_cache_variant()
+    assert edited != variant
+    assert not data_cache.get_sheets(workbook, ['1月'], 'cleaned', edited)
+
+
+def test_memory_hits_validate_shared_strings_once_per_session(workbook, sample_rows, monkeypatch):
+    checks = []
+    match = data_cache._strings_match
+    monkeypatch.setattr(data_cache, '_strings_match', lambda *args: checks.append(1) or match(*args))
+    data_cache.set(workbook, ['1月'], 'probe', pd.DataFrame({'a': [1]}))
+    for _ in range(5):
+        assert data_cache.get(workbook, ['1月'], 'probe') is not None
+    assert len(checks) == 1
+
+    # 命中计数延后批量写入，读取索引前先写入
+    key = data_cache._full_key(workbook, ['1月'], 'probe')
+    assert next(info for info in data_cache.list_entries() if info['key'] == key)['hits'] == 5
+
+    # 文件被修改后会话重建，需重新校验
+    close_workbook()
+    write_workbook(workbook, {'1月': sample_rows, '2月': sample_rows[:3]})
+    assert data_cache.get(workbook, ['1月'], 'probe') is not None
+    assert len(checks) == 2
+
+
+def _same_crc_edit(data, old, new, anchor):
+    """把 data 中的 old 改为等长的 new，再翻转 anchor 处 4 个字节中的若干位，使 CRC32 与长度都不变"""
+    edit_at, fix_at = data.index(old), data.index(anchor)
+    base = zlib.crc32(bytes(len(data)))
+
+    def linear(delta):
+        # CRC32 对等长消息是仿射的：crc(a ^ b) = crc(a) ^ crc(b) ^ crc(0…0)
+        return zlib.crc32(bytes(delta)) ^ base
+
+    delta = bytearray(len(data))
+    delta[edit_at:edit_at + len(old)] = bytes(a ^ b for a, b in zip(old, new))
+    pivots = {}
+    for bit in range(32):
+        flip = bytearray(len(data))
+        flip[fix_at + bit // 8] = 1 << (bit % 8)
+        vec, combo = linear(flip), 1 << bit
+        while vec:
+            top = vec.bit_length() - 1
+            if top not in pivots:
+                pivots[top] = (vec, combo)
+                break
+            vec, combo = vec ^ pivots[top][0], combo ^ pivots[top][1]
+    target, combo = linear(delta), 0
+    while target:
+        vec, bits = pivots[target.bit_length() - 1]
+        target, combo = target ^ vec, combo ^ bits
+    edited = bytearray(data)
+    edited[edit_at:edit_at + len(new)] = new
+    for bit in range(32):
+        if combo >> bit & 1:
+            edited[fix_at + bit // 8] ^= 1 << (bit % 8)
+    return bytes(edited)
+
+
+def test_signature_tells_apart_edits_with_the_same_crc(tmp_path, workbook):
+    edited_path = tmp_path / 'edited.xlsx'
+    with zipfile.ZipFile(workbook) as src, zipfile.ZipFile(edited_path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info)
+            if info.filename == 'xl/worksheets/sheet1.xml':
+                data = _same_crc_edit(data, b'<v>10</v>', b'<v>19</v>', b'2024')
+            dst.writestr(info.filename, data)
+    with zipfile.ZipFile(workbook) as a, zipfile.ZipFile(edited_path) as b:
+        part_a, part_b = a.getinfo('xl/worksheets/sheet1.xml'), b.getinfo('xl/worksheets/sheet1.xml')
+        assert (part_a.CRC, part_a.file_size) == (part_b.CRC, part_b.file_size)
+
+    # zip 目录中的 CRC32 / 长度完全相同，内容不同：签名必须不同，否则会命中过期的清洗结果
+    assert open_workbook(workbook).sheet_signature('1月') != open_workbook(str(edited_path)).sheet_signature('1月')
+    # 原样复制仍得到相同签名
+    copy_path = tmp_path / 'copy.xlsx'
+    copy_path.write_bytes(open(workbook, 'rb').read())
+    assert open_workbook(str(copy_path)).sheet_signature('1月') == open_workbook(workbook).sheet_signature('1月')
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+缓存命令行：stats 按查找计数命中与未命中，prune 删除条目及其计数
+"""
+import argparse
+
+import pandas as pd
+
+import cache_cli
+from core.cache import data_cache
+
+from conftest import write_workbook
+
+
+def test_stats_counts_lookups_and_prune_clears_them(tmp_path, sample_rows, capsys):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows, '2月': sample_rows[:10]})
+    value = pd.DataFrame({'a': [1, 2, 3]})
+
+    # 首次查找未命中，计算后写入；之后两次命中（一次内存层、一次磁盘层）
+    assert data_cache.get(path, ['1月'], 'probe') is None
+    data_cache.set(path, ['1月'], 'probe', value, compute_seconds=1.0)
+    assert data_cache.get(path, ['1月'], 'probe') is not None
+    data_cache.memory.clear()
+    assert data_cache.get(path, ['1月'], 'probe') is not None
+    # 另一类数据两次查找都未命中且从未写入（如计算失败）
+    assert data_cache.get(path, ['2月'], 'failing') is None
+    assert data_cache.get(path, ['2月'], 'failing') is None
+    # 重新写入（重算）不计为未命中
+    data_cache.set(path, ['1月'], 'probe', value, compute_seconds=1.0)
+
+    cache_cli.cmd_stats(argparse.Namespace())
+    out = capsys.readouterr().out
+    assert '命中:     2 次，未命中 3 次（命中率 40%）' in out
+    rows = {line.split()[0]: line.split() for line in out.splitlines()[5:] if line.strip()}
+    # 类型 条目 大小 命中 未命中 命中率 节省
+    assert rows['probe'][1] == '1'
+    assert rows['probe'][4:7] == ['2', '1', '67%']
+    assert rows['failing'][1] == '0'
+    assert rows['failing'][4:7] == ['0', '2', '0%']
+
+    cache_cli.cmd_prune(argparse.Namespace(unused_days=None, max_mb=None, all=True, kind=None))
+    assert capsys.readouterr().out.startswith('已删除 1 个条目')
+    cache_cli.cmd_stats(argparse.Namespace())
+    out = capsys.readouterr().out
+    assert '条目:     0 个' in out
+    assert '命中:     0 次，未命中 0 次（命中率 -）' in out
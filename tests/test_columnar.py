@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+列式缓存格式：各类列与嵌套缓存值读写往返后完全一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.columnar import CODECS, dump_value, load_value
+from data.cleaner import clean_sheet_frame, finalize_cleaned_frames
+from data.loader import load_and_clean_sheet
+
+from conftest import write_workbook
+
+
+def _mixed_frame(n=5000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'float': rng.normal(size=n),
+        'int8': (np.arange(n) % 7).astype(np.int8),
+        'bool': np.arange(n) % 3 == 0,
+        'date': pd.date_range('2024-01-01', periods=n, freq='h'),
+        'category': pd.Categorical(rng.choice(['黄板纸', '书本纸', '废报纸'], n)),
+        'text': np.where(np.arange(n) % 11 == 0, None, [f'粤A{i % 37:05d}' for i in range(n)]),
+        'mixed': [i if i % 2 else str(i) for i in range(n)],
+        'nullable': pd.array([None if i % 5 == 0 else i for i in range(n)], dtype='Int64'),
+    }, index=pd.RangeIndex(10, 10 + n))
+
+
+@pytest.mark.parametrize('compression', ['none', 'auto'] + sorted(CODECS))
+def test_frame_roundtrip(tmp_path, compression):
+    df = _mixed_frame()
+    df.attrs['schema'] = {'fingerprint': 'x'}
+    dump_value(df, tmp_path / 'entry', compression=compression)
+
+    loaded = load_value(tmp_path / 'entry')
+    pd.testing.assert_frame_equal(loaded, df)
+    assert loaded.attrs == df.attrs
+
+
+def test_loaded_frame_is_writable_copy_on_write(tmp_path):
+    df = _mixed_frame(100)
+    dump_value(df, tmp_path / 'entry', compression='none')
+    loaded = load_value(tmp_path / 'entry')
+    loaded.loc[loaded.index[0], 'float'] = 123.0
+    # 内存映射以写时复制打开：修改不会写回缓存文件
+    again = load_value(tmp_path / 'entry')
+    assert again['float'].iloc[0] == df['float'].iloc[0]
+
+
+def test_cleaned_sheet_value_roundtrip(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows})
+    sheet_df, sheet_info = clean_sheet_frame(load_and_clean_sheet(path, '1月'))
+    df, col_info = finalize_cleaned_frames([sheet_df], [sheet_info])
+    dump_value((df, col_info), tmp_path / 'entry')
+
+    loaded_df, loaded_info = load_value(tmp_path / 'entry')
+    pd.testing.assert_frame_equal(loaded_df, df)
+    assert loaded_info['price'] == col_info['price']
+    assert len(loaded_info['audit']) == len(col_info['audit'])
+    assert loaded_info['checks'].hits.keys() == col_info['checks'].hits.keys()
+
+
+@pytest.mark.parametrize('compression', ['none', 'auto'])
+def test_object_column_keeps_each_missing_kind(tmp_path, compression):
+    values = ['粤A00001', None, np.nan, '粤A00002', pd.NaT, None, pd.NA, np.nan] * 500
+    df = pd.DataFrame({'text': pd.Series(values, dtype=object)})
+    dump_value(df, tmp_path / 'entry', compression=compression)
+
+    loaded = load_value(tmp_path / 'entry')['text'].tolist()
+    assert [type(v) for v in loaded] == [type(v) for v in values]
+    assert [v for v in loaded if isinstance(v, str)] == [v for v in values if isinstance(v, str)]
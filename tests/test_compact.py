@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+内存压缩：分类 / int8 列经过汇总与月度对比的分组（observed=True）后与原文本列的结果一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.monthly import create_monthly_comparison
+from analysis.summary import create_summary_table
+from data.cleaner import clean_sheet_frame, compact_dataframe, finalize_cleaned_frames
+from data.loader import load_and_clean_sheet
+
+from conftest import make_row, write_workbook
+
+SHEETS = ['1月', '2月', '3月']
+
+
+@pytest.fixture
+def compacted(tmp_path):
+    """三个月的清洗结果：部分品类 / 发往地只在某些月份出现"""
+    categories = ['黄板纸', '书本纸', '废报纸']
+    dests = ['东莞', '清远', '韶关', '惠州']
+    sheets = {}
+    for m, sheet in enumerate(SHEETS, start=1):
+        sheets[sheet] = [
+            make_row(1 + i % 28, month=m, category=categories[(i + m) % min(m + 1, 3)], dest=dests[(i * m) % (m + 1)],
+                     plate=f'粤A{i % 6:05d}', weight=10.0 + i % 7, profit=100.0 + 10 * (i % 5))
+            for i in range(40)
+        ]
+    path = write_workbook(tmp_path / 'book.xlsx', sheets)
+    parts = [clean_sheet_frame(load_and_clean_sheet(path, sheet)) for sheet in SHEETS]
+    df, _ = finalize_cleaned_frames([p[0] for p in parts], [p[1] for p in parts])
+    return df
+
+
+def _plain(df):
+    """还原为压缩前的列类型（分类列 -> 文本，int8 -> int64）"""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+        elif df[col].dtype == np.int8:
+            df[col] = df[col].astype(np.int64)
+    return df
+
+
+def _flat(table):
+    """分组结果的索引展开为列，分类列还原为文本后比较"""
+    return _plain(table.reset_index() if table.index.names != [None] else table)
+
+
+def test_compacted_dtypes(compacted):
+    for col in ['类别', '发往地', '车牌号', '星期', '周标签', '月份标签']:
+        assert isinstance(compacted[col].dtype, pd.CategoricalDtype), col
+        # 类别按取值排序，只含出现过的取值
+        categories = list(compacted[col].cat.categories)
+        assert categories == sorted(compacted[col].dropna().unique())
+    # 不同取值数超过行数的 COMPACT_MAX_UNIQUE_RATIO 时保持文本列
+    assert not isinstance(compacted['中文日期'].dtype, pd.CategoricalDtype)
+    assert compacted['星期数字'].dtype == np.int8
+    assert compacted['周'].dtype == np.int8
+    # 已压缩的结果再次压缩不变
+    pd.testing.assert_frame_equal(compact_dataframe(compacted.copy()), compacted)
+
+
+def test_summary_tables_match_plain_columns(compacted):
+    plain = _plain(compacted)
+    got_tables = create_summary_table(compacted)
+    # 品类 / 目的地 / 周度按分类列分组，日度按文本列分组
+    assert [isinstance(t.index, pd.CategoricalIndex) for t in got_tables] == [True, True, True, False]
+    for got, expected in zip(got_tables, create_summary_table(plain)):
+        pd.testing.assert_frame_equal(_flat(got), _flat(expected), check_dtype=False)
+
+
+def test_monthly_comparison_only_has_observed_combinations(compacted):
+    plain = _plain(compacted)
+    got = create_monthly_comparison(compacted, True)
+    expected = create_monthly_comparison(plain, True)
+    for got_table, expected_table in zip(got, expected):
+        pd.testing.assert_frame_equal(_flat(got_table), _flat(expected_table), check_dtype=False)
+
+    monthly_summary, monthly_category, monthly_dest = got
+    assert list(monthly_summary.index) == SHEETS
+    # 没有出现过的 月份×品类 组合不会以 0 行出现
+    observed = compacted.groupby(['月份标签', '类别'], observed=True).size()
+    assert len(monthly_category) == len(observed) < len(SHEETS) * compacted['类别'].cat.categories.size
+    assert (monthly_category['重量（吨）'] > 0).all()
+    assert len(monthly_dest) == len(compacted.groupby(['月份标签', '发往地'], observed=True).size())
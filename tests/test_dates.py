@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+日期列转换：向量化结果与逐行调用 convert_to_chinese_date 一致（含 1904 日期系统的工作簿）
+"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+from config import DATE_COL
+from data.cleaner import convert_to_chinese_date, normalize_excel_dates
+from data.loader import load_and_clean_sheet
+
+from conftest import HEADER, make_row
+
+
+def _row_wise(values):
+    """旧实现：逐行转换"""
+    pairs = [convert_to_chinese_date(v) for v in values]
+    dates = pd.Series([p[0] for p in pairs], index=values.index, dtype='datetime64[ns]')
+    return dates, [p[1] for p in pairs]
+
+
+def _assert_parity(values):
+    dates, labels = normalize_excel_dates(values)
+    expected_dates, expected_labels = _row_wise(values)
+    assert dates.dtype == 'datetime64[ns]'
+    pd.testing.assert_series_equal(dates, expected_dates, check_names=False)
+    assert labels.tolist() == expected_labels
+
+
+def test_mixed_cells_match_row_wise_converter():
+    values = pd.Series([
+        # Excel 序列号：整数、带日内时间的小数、1900 年 3 月之前、NaN、无穷大
+        45306, 45306.75, 45306.0001, 1, 59.5, np.nan, np.inf,
+        # 文本日期：不同分隔符、带时间、无法识别、空字符串
+        '2024/1/15', '2024-01-15 08:30', '2024年1月15日', 'abc', '', '2024/1/15',
+        # 单元格已是日期
+        dt.datetime(2024, 1, 20, 8, 30), pd.Timestamp('2024-02-29'), dt.datetime(2024, 1, 20, 8, 30),
+        None, pd.NaT,
+    ], index=range(100, 118), dtype=object)
+    _assert_parity(values)
+
+
+def test_datetime_column_matches_row_wise_converter():
+    values = pd.Series([pd.Timestamp('2024-01-15 08:30'), pd.NaT, pd.Timestamp('2024-12-31')], index=[3, 1, 2])
+    _assert_parity(values)
+
+
+@pytest.fixture
+def workbook_1904(tmp_path):
+    """1904 日期系统的工作簿（Mac 版 Excel）：日期单元格的序列号比 1900 系统小 1462 天"""
+    wb = Workbook(write_only=True)
+    wb.epoch = CALENDAR_MAC_1904
+    ws = wb.create_sheet('1月')
+    ws.append(['2024年发货详单'])
+    ws.append(HEADER)
+    for i in range(30):
+        row = make_row(1 + i % 28, plate=f'粤A{i:05d}')
+        row[0] = row[0] + dt.timedelta(hours=i % 24)
+        ws.append(row)
+    path = tmp_path / 'mac.xlsx'
+    wb.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize('engine', ['stream', 'pandas'])
+def test_1904_workbook_dates_match_row_wise_converter(workbook_1904, engine):
+    raw = load_and_clean_sheet(workbook_1904, '1月', engine=engine)
+    expected = [dt.datetime(2024, 1, 1 + i % 28, i % 24) for i in range(30)]
+    assert raw[DATE_COL].tolist() == expected
+
+    _assert_parity(raw[DATE_COL])
+    # 读成逐行的单元格对象时也一致
+    _assert_parity(raw[DATE_COL].astype(object))
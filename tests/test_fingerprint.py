@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+历史行指纹：复制 / 改名 / 移动的工作簿不应被当作与自身重复
+"""
+import shutil
+
+import pytest
+
+from data.cleaner import clean_sheet_frame, finalize_cleaned_frames
+from data.fingerprint import fingerprint_index, row_fingerprints
+from data.loader import load_and_clean_sheet
+
+from conftest import make_row, write_workbook
+
+
+def _load(path, sheets):
+    results = [clean_sheet_frame(load_and_clean_sheet(path, sheet)) for sheet in sheets]
+    df, _ = finalize_cleaned_frames([r[0] for r in results], [r[1] for r in results])
+    return df, row_fingerprints(df)
+
+
+@pytest.fixture
+def recorded(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows})
+    df, fingerprints = _load(path, ['1月'])
+    fingerprint_index.record(path, df, fingerprints)
+    return path
+
+
+def test_copied_workbook_is_not_a_history_duplicate(tmp_path, recorded):
+    copy = str(tmp_path / 'renamed copy.xlsx')
+    shutil.copyfile(recorded, copy)
+    df, fingerprints = _load(copy, ['1月'])
+
+    mask, _ = fingerprint_index.find_matches(fingerprints, copy, ['1月'])
+    assert not mask.any()
+
+
+def test_other_workbook_with_same_rows_is_a_history_duplicate(tmp_path, recorded, sample_rows):
+    # 内容不同的工作簿里出现同样的运输记录，才是跨工作簿重复
+    other = write_workbook(tmp_path / 'other.xlsx',
+                           {'1月': sample_rows[:5] + [make_row(20, plate='粤B99999')]})
+    df, fingerprints = _load(other, ['1月'])
+
+    mask, sources = fingerprint_index.find_matches(fingerprints, other, ['1月'])
+    assert mask.sum() == 5
+    assert set(sources[mask]) == {'book.xlsx 1月'}
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+运费异常：按线路以此前最近若干车为基准的稳健 Z 分数
+"""
+import numpy as np
+import pandas as pd
+
+from config import FREIGHT_ANOMALY_MIN_PERIODS, FREIGHT_ANOMALY_THRESHOLD
+from data.cleaner import score_freight_anomalies
+
+
+def _route_frame(rates):
+    """{发往地: 按时间顺序的运费单价} -> 按日期交错排列的 DataFrame"""
+    rows = []
+    for dest, values in rates.items():
+        for i, value in enumerate(values):
+            rows.append({'Date': pd.Timestamp('2024-01-01') + pd.Timedelta(hours=i), '发往地': dest, '运费单价': value})
+    return pd.DataFrame(rows).sort_values('Date', kind='mergesort').reset_index(drop=True)
+
+
+def test_planted_outlier_crosses_threshold():
+    jitter = [-1.0, 0.5, 0.0, 1.0, -0.5]
+    normal = [40 + jitter[i % 5] for i in range(25)]
+    df = _route_frame({'东莞': normal[:20] + [80.0] + normal[20:], '清远': [120 + 3 * jitter[i % 5] for i in range(25)]})
+    score = score_freight_anomalies(df)
+
+    dongguan = df['发往地'] == '东莞'
+    outlier = np.flatnonzero(dongguan & (df['运费单价'] == 80.0))[0]
+    assert score[outlier] > FREIGHT_ANOMALY_THRESHOLD
+    # 其余车次（含异常之后的车次，异常值只有一车，不会抬高基准）都不标记；长途线路整体偏高也不标记
+    others = np.delete(score, outlier)
+    assert (np.nan_to_num(others) <= FREIGHT_ANOMALY_THRESHOLD).all()
+
+
+def test_short_history_scores_nan():
+    df = _route_frame({'东莞': [40.0 + i % 3 for i in range(12)], '韶关': [60.0, 61.0, 200.0]})
+    score = score_freight_anomalies(df)
+
+    assert np.isnan(score[(df['发往地'] == '韶关').to_numpy()]).all()
+    dongguan = score[(df['发往地'] == '东莞').to_numpy()]
+    assert np.isnan(dongguan[:FREIGHT_ANOMALY_MIN_PERIODS]).all()
+    assert not np.isnan(dongguan[FREIGHT_ANOMALY_MIN_PERIODS:]).any()
+
+
+def test_flat_route_small_change_is_not_flagged():
+    df = _route_frame({'东莞': [40.0] * 10 + [40.2, 48.0]})
+    score = score_freight_anomalies(df)
+    assert score[10] < FREIGHT_ANOMALY_THRESHOLD
+    assert score[11] > FREIGHT_ANOMALY_THRESHOLD
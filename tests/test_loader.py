@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+多进程加载：子进程解析并清洗各工作表，结果与单线程一致；取消后子进程及时退出
+"""
+import threading
+import time
+
+import pandas as pd
+
+from config import SOURCE_ROW_COL
+from core.cache import data_cache
+from data.cleaner import clean_sheet_frame, finalize_cleaned_frames
+from data.loader import ThreadedDataLoader, load_and_clean_sheet
+from data.xlsx_stream import ReadCancelled
+
+from conftest import make_row, write_workbook
+
+SHEETS = ['1月', '2月', '3月']
+
+
+def _workbook(tmp_path):
+    return write_workbook(tmp_path / 'book.xlsx', {
+        sheet: [make_row(1 + i % 28, plate=f'粤B{i:05d}', weight=10.0 + i % 5, month=m) for i in range(40)]
+        for m, sheet in enumerate(SHEETS, start=1)
+    })
+
+
+def _run(loader, path, sheets, parallel, order=None):
+    """在当前线程中运行加载线程的主体，返回投递的结果（order 为含已缓存工作表在内的所选顺序）"""
+    worker = loader._parallel_worker if parallel else loader._sequential_worker
+    loader._sheet_order = list(order or sheets)
+    worker(path, sheets)
+    return loader.result_queue.get(timeout=60)
+
+
+def _checked_load(file_path, sheet_name, progress_callback=None, cancel_event=None):
+    """子进程读取：只解析工作表，不应打开缓存索引（fork 时也不沿用父进程的连接）"""
+    if data_cache._conn is not None:
+        raise RuntimeError("子进程打开了缓存索引")
+    return load_and_clean_sheet(file_path, sheet_name, progress_callback, cancel_event)
+
+
+def _stalled_load(file_path, sheet_name, progress_callback=None, cancel_event=None):
+    """一直读不完的工作表：上报进度后在取消前持续等待"""
+    progress_callback(1, 100)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ReadCancelled(sheet_name)
+        time.sleep(0.01)
+    raise AssertionError("取消请求未传到子进程")
+
+
+def test_process_pool_matches_sequential(tmp_path):
+    path = _workbook(tmp_path)
+    # 父进程已打开索引：fork 出的子进程不应沿用
+    data_cache.list_entries()
+    assert data_cache._conn is not None
+
+    results = {}
+    for parallel in (True, False):
+        loader = ThreadedDataLoader(None, use_processes=parallel, max_workers=2)
+        loader.set_load_function(_checked_load if parallel else load_and_clean_sheet)
+        loader.set_clean_function(clean_sheet_frame, finalize_cleaned_frames)
+        status, df, extra = _run(loader, path, SHEETS, parallel)
+        assert status == 'success', df
+        results[parallel] = (df, extra)
+
+    (parallel_df, parallel_extra), (sequential_df, sequential_extra) = results[True], results[False]
+    pd.testing.assert_frame_equal(parallel_df.reset_index(drop=True), sequential_df.reset_index(drop=True))
+    assert parallel_extra['total_records'] == sequential_extra['total_records'] == 120
+    assert set(parallel_extra['sheet_results']) == set(SHEETS)
+    assert parallel_df.groupby('月份标签', observed=True)[SOURCE_ROW_COL].count().tolist() == [40, 40, 40]
+
+
+def test_process_pool_cancel_stops_children(tmp_path):
+    path = _workbook(tmp_path)
+    loader = ThreadedDataLoader(None, use_processes=True, max_workers=2)
+    loader.set_load_function(_stalled_load)
+    loader._sheet_order = list(SHEETS)
+    worker = threading.Thread(target=loader._parallel_worker, args=(path, SHEETS), daemon=True)
+    worker.start()
+
+    # 等子进程开始读取（行级进度已回传）后取消
+    assert loader.record_queue.get(timeout=30)
+    started = time.perf_counter()
+    loader.cancel()
+    worker.join(timeout=10)
+    assert not worker.is_alive()
+    assert loader.result_queue.get(timeout=1)[0] == 'cancelled'
+    assert time.perf_counter() - started < 5
+
+
+def test_cancel_mid_sheet_stops_reading(tmp_path, monkeypatch):
+    import data.xlsx_stream as xlsx_stream
+    monkeypatch.setattr(xlsx_stream, 'READ_CHUNK_ROWS', 10)
+    path = _workbook(tmp_path)
+    loader = ThreadedDataLoader(None)
+    reported = []
+
+    def load(file_path, sheet_name, progress_callback=None, cancel_event=None):
+        def on_rows(rows, total):
+            reported.append((sheet_name, rows, total))
+            progress_callback(rows, total)
+            # 读完第一个分块后取消：读取应在下一个分块处中止，后续工作表不再读取
+            loader.cancel_event.set()
+        return load_and_clean_sheet(file_path, sheet_name, on_rows, cancel_event, engine='stream')
+
+    loader.set_load_function(load)
+    status, _, _ = _run(loader, path, SHEETS, parallel=False)
+    assert status == 'cancelled'
+    assert reported == [('1月', 10, reported[0][2])]
+    # 行级进度：已读行数与预估总行数
+    assert loader.record_queue.get_nowait()[0] == 10
+
+
+def test_pipeline_matches_clean_after_read(tmp_path):
+    path = _workbook(tmp_path)
+    loader = ThreadedDataLoader(None)
+    loader.set_clean_function(clean_sheet_frame, finalize_cleaned_frames)
+    # 2 月已命中缓存：只读取其余工作表，合并时按所选顺序拼装
+    cached = clean_sheet_frame(load_and_clean_sheet(path, '2月'))
+    loader._cached_results = {'2月': cached}
+    status, df, extra = _run(loader, path, ['1月', '3月'], parallel=False, order=SHEETS)
+    assert status == 'success', df
+    assert set(extra['sheet_results']) == {'1月', '3月'}
+
+    parts = [clean_sheet_frame(load_and_clean_sheet(path, sheet)) for sheet in SHEETS]
+    expected, _ = finalize_cleaned_frames([p[0] for p in parts], [p[1] for p in parts])
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_pipeline_reports_clean_errors(tmp_path):
+    path = _workbook(tmp_path)
+    loader = ThreadedDataLoader(None)
+
+    def failing_clean(df):
+        raise ValueError("清洗出错")
+
+    loader.set_clean_function(failing_clean)
+    status, message, info = _run(loader, path, SHEETS, parallel=False)
+    assert status == 'error'
+    assert info['type'] == '数据清洗失败' and '清洗出错' in message
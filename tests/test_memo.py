@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+阶段结果缓存：键随上游阶段与代码版本串联变化
+"""
+from core.cache import data_cache
+from core.memo import stage_memo
+from data.cleaner import finalize_cleaned_frames
+from data.loader import cleaned_cache_variant
+from data.workbook import close_workbook
+
+from conftest import write_workbook
+
+
+def summarize(df):
+    return {'rows': len(df)}
+
+
+def _keys():
+    sheets = ['1月']
+    cleaned = cleaned_cache_variant()
+    finalize = stage_memo.stage_key('finalize', finalize_cleaned_frames, sheets, upstream=[cleaned])
+    summary = stage_memo.stage_key('summary', summarize, sheets, upstream=[finalize])
+    dashboard = stage_memo.stage_key('dashboard', summarize, sheets, params=[1], upstream=[finalize, summary])
+    return cleaned, finalize, summary, dashboard
+
+
+def _edit_source(monkeypatch, suffix):
+    original = stage_memo._source_digest
+    monkeypatch.setattr(stage_memo, '_source_digest',
+                        lambda path: original(path) + ('-edited' if path and path.endswith(suffix) else ''))
+
+
+def test_cleaner_change_invalidates_downstream_stages(monkeypatch):
+    before = _keys()
+    _edit_source(monkeypatch, 'cleaner.py')
+    after = _keys()
+    # 汇总函数所在模块没有变化，但其输入来自修改后的清洗代码
+    assert all(a != b for a, b in zip(before, after))
+
+
+def test_reader_change_invalidates_finalize(monkeypatch):
+    before = _keys()
+    _edit_source(monkeypatch, 'xlsx_stream.py')
+    after = _keys()
+    assert all(a != b for a, b in zip(before, after))
+
+
+def test_downstream_change_keeps_upstream_keys(monkeypatch):
+    before = _keys()
+    _edit_source(monkeypatch, 'test_memo.py')
+    after = _keys()
+    assert before[:2] == after[:2]
+    assert before[2:] != after[2:]
+
+
+def test_run_recomputes_when_upstream_key_changes(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows})
+    calls = []
+
+    def stage(value):
+        calls.append(value)
+        return {'value': value}
+
+    try:
+        assert stage_memo.run('probe', stage, path, ['1月'], 1, upstream=['a'])['value'] == 1
+        assert stage_memo.run('probe', stage, path, ['1月'], 2, upstream=['a'])['value'] == 1
+        assert stage_memo.run('probe', stage, path, ['1月'], 3, upstream=['b'])['value'] == 3
+        assert calls == [1, 3]
+    finally:
+        close_workbook()
+        data_cache.memory.clear()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+后台预取：等待期间不阻塞界面，与正式加载共用计算锁
+"""
+import threading
+
+import pytest
+
+import data.prefetch as prefetch
+from core.cache import data_cache
+from data.loader import cleaned_cache_variant
+from data.prefetch import SheetPrefetcher
+
+from conftest import write_workbook
+
+
+class FakeRoot:
+    """只记录 update 调用次数的 Tk 根窗口替身"""
+
+    def __init__(self):
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+
+@pytest.fixture
+def workbook(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows, '2月': sample_rows})
+    data_cache.record_selection(path, ['1月'])
+    return path
+
+
+def _entry(path, sheet):
+    key = data_cache._full_key(path, [sheet], 'cleaned', cleaned_cache_variant())
+    return next((info for info in data_cache.list_entries(key_name='cleaned') if info['key'] == key), None)
+
+
+def test_finish_keeps_ui_responsive_and_records_compute_time(workbook, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    load = prefetch.load_and_clean_sheet
+
+    def slow_load(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return load(*args, **kwargs)
+
+    class WaitingRoot(FakeRoot):
+        def update(self):
+            super().update()
+            if self.updates >= 3:
+                release.set()
+
+    monkeypatch.setattr(prefetch, 'load_and_clean_sheet', slow_load)
+    prefetcher = SheetPrefetcher(workbook, ['1月', '2月'])
+    prefetcher.start()
+    assert started.wait(5)
+    root = WaitingRoot()
+    # 选中的工作表正在解析：等待其完成，期间持续处理界面事件
+    prefetcher.finish(['1月'], root=root)
+
+    assert root.updates >= 3
+    info = _entry(workbook, '1月')
+    assert info is not None and info['compute_ms'] > 0
+    assert _entry(workbook, '2月') is None
+
+
+def test_unreadable_sheet_is_skipped(workbook, monkeypatch):
+    monkeypatch.setattr(prefetch, 'load_and_clean_sheet', lambda *args, **kwargs: None)
+    prefetcher = SheetPrefetcher(workbook, ['1月', '2月'])
+    prefetcher.start()
+    prefetcher.finish(['1月'], root=FakeRoot())
+    assert _entry(workbook, '1月') is None
+
+
+def test_sheet_locked_elsewhere_is_not_parsed(workbook, monkeypatch):
+    parsed = []
+    monkeypatch.setattr(prefetch, 'load_and_clean_sheet', lambda *args, **kwargs: parsed.append(args))
+    lock = data_cache.compute_lock(workbook, ['1月'], 'cleaned', cleaned_cache_variant(), per_sheet=True)
+    assert lock.acquire(timeout=1)
+    try:
+        prefetcher = SheetPrefetcher(workbook, ['1月', '2月'])
+        prefetcher.start()
+        prefetcher.finish(['1月'], root=FakeRoot())
+    finally:
+        lock.release()
+    assert parsed == []
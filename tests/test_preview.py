@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+工作表概况预览：从 XML 末尾取截止日期，超过解压上限的工作表只保留起始日期
+"""
+import datetime as dt
+import zipfile
+
+import pytest
+
+import data.preview as preview
+from data.preview import collect_sheet_previews, preview_sheet_head, scan_sheet_tail
+from data.workbook import open_workbook
+
+from conftest import make_row, write_workbook
+
+
+def _rows(n, month=1):
+    """按日期递增的 n 行，最后一行的日期写成文本"""
+    rows = [make_row(1 + i * 28 // n, month=month, plate=f'粤A{i:05d}') for i in range(n)]
+    rows[-1][0] = f'2024/{month}/28'
+    return rows
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    return write_workbook(tmp_path / 'book.xlsx', {'大表': _rows(2000), '小表': _rows(40, month=2)})
+
+
+def _part_size(path, session, sheet):
+    with zipfile.ZipFile(path) as zf:
+        return zf.getinfo(session.sheet_part(sheet)).file_size
+
+
+def test_tail_scan_finds_last_dates(workbook):
+    session = open_workbook(workbook)
+    head = preview_sheet_head(session, '大表')
+    # 测试工作簿以 write_only 模式写出，没有 <dimension>：行数只能由末尾的行号得到
+    assert head['rows'] is None
+    assert head['start'] == dt.datetime(2024, 1, 1)
+    assert head['end'] < dt.datetime(2024, 1, 2)
+
+    # 只解码末尾 4 KB：只含最后几十行
+    dates, last_row = scan_sheet_tail(session, '大表', head['date_letters'], tail_bytes=4096)
+    assert last_row == 2000 + 2
+    assert 0 < len(dates) < 100
+    assert max(dates) == dt.datetime(2024, 1, 28)  # 文本日期
+    assert min(dates) >= dt.datetime(2024, 1, 27)
+
+
+def test_tail_scan_respects_max_scan_bytes(workbook):
+    session = open_workbook(workbook)
+    size = _part_size(workbook, session, '大表')
+    assert scan_sheet_tail(session, '大表', 'A', max_scan_bytes=size - 1) is None
+    assert scan_sheet_tail(session, '大表', 'A', max_scan_bytes=size) is not None
+
+
+def test_collect_previews_keeps_head_result_past_cut_off(workbook, monkeypatch):
+    session = open_workbook(workbook)
+    small, large = _part_size(workbook, session, '小表'), _part_size(workbook, session, '大表')
+    assert small < large
+    monkeypatch.setattr(preview, 'PREVIEW_TAIL_MAX_SCAN_BYTES', (small + large) // 2)
+    monkeypatch.setattr(preview, 'PREVIEW_TAIL_BUDGET_SECONDS', 30)
+
+    results = []
+    collect_sheet_previews(workbook, ['大表', '小表'], lambda key, info: results.append((key, info)))
+    assert results[0][0] is None and 'modified' in results[0][1]
+    by_sheet = {}
+    for key, info in results[1:]:
+        by_sheet.setdefault(key, []).append(info)
+
+    # 大表解压量超出上限：只有第一轮的起始日期
+    assert len(by_sheet[0]) == 1 and by_sheet[0][0]['partial']
+    assert preview.format_sheet_preview(by_sheet[0][0]) == "1月1日 起"
+    # 小表第二轮补全截止日期
+    first, final = by_sheet[1]
+    assert first['partial'] and not final['partial']
+    assert (final['start'], final['end']) == (dt.datetime(2024, 2, 1), dt.datetime(2024, 2, 28))
+    assert final['rows'] == 40
+    assert preview.format_sheet_preview(final) == "约 40 行  ·  2月1日 ~ 2月28日"
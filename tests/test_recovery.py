@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+检查点：后台写入、只写最新的待写检查点、索引原子替换、中途退出留下的临时文件不会被读取
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import core.recovery as recovery
+from core.recovery import RecoveryManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """独立的恢复管理器（不共用全局单例的目录与写入线程）"""
+    monkeypatch.setattr(recovery, 'RECOVERY_DIR', str(tmp_path / 'recovery'))
+    manager = object.__new__(RecoveryManager)
+    manager._init_manager()
+    yield manager
+    manager.flush(5)
+
+
+def _frame(n=100):
+    return pd.DataFrame({'重量（吨）': [float(i) for i in range(n)], '类别': ['黄板纸'] * n})
+
+
+def _stall_writer(manager, monkeypatch):
+    """让写入线程卡在下一次写入上，返回（已写入的阶段列表, 放行事件）"""
+    written, release = [], threading.Event()
+    write = manager._write_checkpoint
+
+    def slow_write(job):
+        release.wait(10)
+        written.append(job['info']['stage'])
+        write(job)
+
+    monkeypatch.setattr(manager, '_write_checkpoint', slow_write)
+    return written, release
+
+
+def test_checkpoint_flush_and_restore(manager):
+    df = _frame()
+    assert manager.save_checkpoint('data_loaded', df, {'file': 'book.xlsx'})
+    # 快照后修改原数据不影响检查点
+    df.loc[0, '重量（吨）'] = -1.0
+    assert manager.flush(5)
+
+    assert manager.has_recovery_data()
+    stage, data, metadata = manager.load_recovery_data()
+    assert stage == 'data_loaded'
+    assert metadata == {'file': 'book.xlsx'}
+    pd.testing.assert_frame_equal(data, _frame())
+
+    assert manager.clear_recovery_data()
+    assert not manager.has_recovery_data()
+
+
+def test_pending_checkpoints_coalesce_to_latest(manager, monkeypatch):
+    written, release = _stall_writer(manager, monkeypatch)
+    manager.save_checkpoint('first', _frame(10))
+    deadline = time.time() + 5
+    while not manager._writing and time.time() < deadline:
+        time.sleep(0.01)
+    # 写入线程忙于 first 期间到达的检查点只保留最新的一个；不带数据的检查点沿用之前的数据
+    manager.save_checkpoint('second', _frame(20))
+    manager.save_checkpoint('third', _frame(30))
+    manager.save_checkpoint('fourth')
+    release.set()
+    assert manager.flush(5)
+
+    assert written == ['first', 'fourth']
+    stage, data, _ = manager.load_recovery_data()
+    assert stage == 'third'
+    assert len(data) == 30
+    assert manager.get_recovery_info()['stage'] == 'fourth'
+
+
+def test_startup_check_does_not_wait_for_stuck_writer(manager, monkeypatch):
+    manager.save_checkpoint('done', _frame())
+    assert manager.flush(5)
+    written, release = _stall_writer(manager, monkeypatch)
+    monkeypatch.setattr(recovery, 'RECOVERY_FLUSH_TIMEOUT_SECONDS', 0.2)
+    manager.save_checkpoint('stuck', _frame(5))
+
+    started = time.perf_counter()
+    # 写入未完成：按磁盘上已写完的检查点判断
+    assert manager.has_recovery_data()
+    assert manager.get_recovery_info()['stage'] == 'done'
+    assert time.perf_counter() - started < 2
+    release.set()
+    assert manager.flush(5)
+    assert manager.get_recovery_info()['stage'] == 'stuck'
+
+
+def test_stale_tmp_files_from_a_crash_are_ignored(manager):
+    manager.save_checkpoint('data_loaded', _frame())
+    assert manager.flush(5)
+
+    # 模拟写入中途退出：半个索引临时文件与未改名的数据目录
+    with open(f"{manager.checkpoint_file}.tmp", 'w', encoding='utf-8') as f:
+        f.write('{"latest_checkpoint": {"stage": "half')
+    stale_dir = os.path.join(manager.recovery_dir, 'checkpoint_data-deadbeef.tmp')
+    os.makedirs(stale_dir)
+    with open(os.path.join(stale_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        f.write('{')
+
+    stage, data, _ = manager.load_recovery_data()
+    assert stage == 'data_loaded'
+    pd.testing.assert_frame_equal(data, _frame())
+
+    # 下一个检查点覆盖临时索引并清理残留的数据目录
+    manager.save_checkpoint('analysis_complete', _frame(5))
+    assert manager.flush(5)
+    assert not os.path.exists(stale_dir)
+    assert manager.load_recovery_data()[0] == 'analysis_complete'
+
+
+def test_crash_before_first_index_write_has_no_recovery(manager):
+    with open(f"{manager.checkpoint_file}.tmp", 'w', encoding='utf-8') as f:
+        f.write('{"latest_checkpoint": ')
+    assert not manager.has_recovery_data()
+    assert manager.load_recovery_data() is None
+
+
+def test_exit_flush_writes_pending_checkpoint(manager, monkeypatch):
+    written, release = _stall_writer(manager, monkeypatch)
+    manager.save_checkpoint('last', _frame())
+    threading.Timer(0.2, release.set).start()
+    manager._flush_at_exit()
+    assert written == ['last']
+    assert manager.get_recovery_info()['stage'] == 'last'
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+数据质量检查：清洗前检查的各项问题都能命中并定位到原工作表行号
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import SOURCE_ROW_COL
+from data.cleaner import clean_sheet_frame, finalize_cleaned_frames
+from data.loader import load_and_clean_sheet
+from data.validator import DataValidator, SheetChecks
+
+from conftest import make_row, write_workbook
+
+
+def _issues_by_kind(validator):
+    return {(issue['type'], issue.get('column')): issue for issue in validator.issues}
+
+
+def _bad_rows(rows):
+    """在正常数据后追加各类问题行（返回追加后的列表与各问题行的 Excel 行号）"""
+    rows = list(rows)
+    first = len(rows) + 3  # 第 1 行标题、第 2 行表头
+    rows += [
+        make_row(5, category=None),           # 关键列缺失：类别
+        make_row(6, deduction=None),          # 关键列缺失：扣点（未结算）
+        make_row(7, weight='十二吨'),          # 非数值：重量
+        make_row(8, freight='待定'),           # 非数值：运费
+        make_row(9, weight=-3.0),             # 负重量
+        make_row(10, weight=0.0),             # 零重量
+        make_row(11, price=None),             # 有运费但无卖出价
+    ]
+    names = ['missing_category', 'missing_deduction', 'text_weight', 'text_freight',
+             'negative_weight', 'zero_weight', 'missing_price']
+    return rows, {name: first + i for i, name in enumerate(names)}
+
+
+@pytest.mark.parametrize('engine', ['stream', 'pandas'])
+def test_raw_checks_fire_on_rows_removed_by_cleaning(tmp_path, sample_rows, engine):
+    rows, at = _bad_rows(sample_rows)
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': rows})
+
+    sheet_df, sheet_info = clean_sheet_frame(load_and_clean_sheet(path, '1月', engine=engine))
+    df, col_info = finalize_cleaned_frames([sheet_df], [sheet_info])
+    # 除运费写成文本的行（运费按 0 保留）外，问题行都已被清洗规则剔除，只能靠清洗前的检查发现
+    removed = set(at.values()) - {at['text_freight']}
+    assert not removed & set(df[SOURCE_ROW_COL])
+
+    validator = DataValidator(df, raw_checks=col_info['checks'])
+    validator.run_all_checks()
+    issues = _issues_by_kind(validator)
+
+    expected = {
+        ('missing', '类别'): [at['missing_category']],
+        ('missing', '扣点'): [at['missing_deduction']],
+        ('type_error', '重量（吨）'): [at['text_weight']],
+        ('type_error', '运费'): [at['text_freight']],
+        ('logical', '重量（吨）'): [at['negative_weight'], at['zero_weight']],
+        ('logical', None): [at['missing_price']],
+    }
+    for key, source_rows in expected.items():
+        assert key in issues, key
+    for key in [('missing', '类别'), ('missing', '扣点'), ('type_error', '重量（吨）'),
+                ('type_error', '运费'), ('logical', None)]:
+        located = validator.locate(issues[key])
+        assert located[SOURCE_ROW_COL].tolist() == expected[key]
+        assert located['工作表'].tolist() == ['1月']
+    # 写成文本的重量不算缺失
+    assert ('missing', '重量（吨）') not in issues
+    logical_weight = [i for i in validator.issues if i['type'] == 'logical' and i.get('column') == '重量（吨）']
+    assert sorted(validator.locate(i)[SOURCE_ROW_COL].item() for i in logical_weight) == expected[('logical', '重量（吨）')]
+
+
+def test_raw_checks_merge_keeps_sheet_positions(tmp_path, sample_rows):
+    rows, at = _bad_rows(sample_rows)
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows, '2月': rows})
+
+    results = [clean_sheet_frame(load_and_clean_sheet(path, sheet)) for sheet in ['1月', '2月']]
+    df, col_info = finalize_cleaned_frames([r[0] for r in results], [r[1] for r in results])
+    checks = col_info['checks']
+    assert len(checks) == len(sample_rows) + len(rows)
+
+    validator = DataValidator(df, raw_checks=checks)
+    validator.run_all_checks()
+    missing = _issues_by_kind(validator)[('missing', '类别')]
+    located = validator.locate(missing)
+    assert located['工作表'].tolist() == ['2月']
+    assert located[SOURCE_ROW_COL].tolist() == [at['missing_category']]
+
+
+def test_raw_checks_ignore_blank_rows():
+    df = pd.DataFrame({
+        '卸货日期': [pd.Timestamp('2024-01-01'), None],
+        '类别': ['黄板纸', None],
+        '重量（吨）': [10.0, np.nan],
+    })
+    checks = SheetChecks.scan(df)
+    assert not checks.hits
+
+
+def test_missing_cached_checks_fall_back_to_cleaned_frame(sample_rows):
+    # 旧版缓存的 col_info 没有检查结果：合并后为 None，验证器退回在清洗结果上检查
+    assert SheetChecks.merge([SheetChecks(), None]) is None
+    df = pd.DataFrame(sample_rows, columns=['卸货日期', '类别', '发往地', '车牌号', '重量（吨）',
+                                            '扣点', '卖出价', '运费', '预估利润', '备注'])
+    df.loc[0, '重量（吨）'] = -1.0
+    validator = DataValidator(df)
+    validator.run_all_checks()
+    assert ('logical', '重量（吨）') in _issues_by_kind(validator)
+
+
+def test_issue_detail_frame_caps_rows_per_issue(sample_rows):
+    df = pd.DataFrame(sample_rows * 100, columns=['卸货日期', '类别', '发往地', '车牌号', '重量（吨）',
+                                                  '扣点', '卖出价', '运费', '预估利润', '备注'])
+    validator = DataValidator(df)
+    validator.run_all_checks()
+    duplicate = next(i for i in validator.issues if i['type'] == 'duplicate' and i['severity'] == 'medium')
+    assert duplicate['count'] > 50
+
+    detail = validator.issue_detail_frame([duplicate], limit=50)
+    assert len(detail) == 50
+    assert (detail['命中行数'] == duplicate['count']).all()
+    assert '仅列出前 50 行' in detail['问题'].iloc[0]
+    # 位图仍保留全部命中行，可按需完整取出
+    assert len(validator.issue_rows(duplicate)) == duplicate['count']
+
+
+def test_html_report_escapes_issue_messages(sample_rows):
+    df = pd.DataFrame(sample_rows, columns=['卸货日期', '类别', '发往地', '车牌号', '重量（吨）',
+                                            '扣点', '卖出价', '运费', '预估利润', '备注'])
+    validator = DataValidator(df)
+    validator.run_all_checks()
+    # 历史重复的来源标签取自工作簿文件名与工作表名，可能含 < 或 &
+    validator.issues.append({'type': 'duplicate', 'severity': 'low', 'count': 1,
+                             'message': '与历史数据重复：<b>A&B</b>.xlsx'})
+    html = validator.generate_html_report()
+    assert '&lt;b&gt;A&amp;B&lt;/b&gt;.xlsx' in html
+    assert '<b>A&B</b>' not in html
+
+
+def _population(n_large=19900, n_small=100):
+    """已知总体：大层命中率 10%，小层命中率 50%（小层按比例只能抽到几行）"""
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        '月份标签': ['1月'] * (n_large // 2) + ['2月'] * (n_large - n_large // 2) + ['2月'] * n_small,
+        '类别': ['黄板纸'] * n_large + ['书本纸'] * n_small,
+    })
+    truth = np.r_[rng.random(n_large) < 0.1, rng.random(n_small) < 0.5]
+    return df, truth
+
+
+def test_sample_estimate_covers_known_count(monkeypatch):
+    import data.validator as validator_module
+    monkeypatch.setattr(validator_module, 'VALIDATION_SAMPLE_SIZE', 2000)
+    monkeypatch.setattr(validator_module, 'VALIDATION_SAMPLE_MIN_STRATUM', 100)
+    df, truth = _population()
+    expected = int(truth.sum())
+
+    covered = []
+    for seed in range(200):
+        monkeypatch.setattr(validator_module, 'VALIDATION_SAMPLE_SEED', seed)
+        validator = DataValidator(df, mode='sample')
+        validator._prepare_sample()
+        assert validator.sampled
+        # 按比例分配约 10%，小层整体抽取
+        assert 1700 < validator.stats['sample_size'] < 2400
+        assert validator._strata_sampled[validator._strata_totals == 100].tolist() == [100]
+
+        mask = truth[validator._sample_idx]
+        estimate, lower, upper = validator._estimate(mask)
+        assert mask.sum() <= lower <= estimate <= upper <= len(df)
+        covered.append(lower <= expected <= upper)
+    # 95% 置信区间：200 次抽样中覆盖真值的比例接近 95%
+    assert 0.9 <= np.mean(covered) <= 0.99
+
+
+def test_sample_tally_reports_interval(monkeypatch):
+    import data.validator as validator_module
+    monkeypatch.setattr(validator_module, 'VALIDATION_SAMPLE_SIZE', 2000)
+    df, truth = _population()
+    validator = DataValidator(df, mode='sample')
+    validator._prepare_sample()
+
+    count, text, extra = validator._tally(truth[validator._sample_idx])
+    lower, upper = extra['ci']
+    assert text == f"约 {count}（95% 置信区间 {lower}~{upper}）"
+    # 命中行只能定位到样本中的行
+    assert len(extra['rows']) == int(truth[validator._sample_idx].sum())
+    assert truth[extra['rows'].indices()].all()
+
+    exact = DataValidator(df, mode='exact')
+    exact._prepare_sample()
+    count, text, extra = exact._tally(truth)
+    assert count == int(truth.sum()) and text == str(count) and 'ci' not in extra
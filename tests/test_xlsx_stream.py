@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+流式读取引擎：与 pandas(openpyxl) 引擎的读取与清洗结果一致
+"""
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from config import SOURCE_ROW_COL, STREAM_CODE_COLS
+from data.cleaner import clean_sheet_frame, finalize_cleaned_frames
+from data.loader import load_and_clean_sheet
+
+from conftest import HEADER, make_row, write_workbook
+
+
+def _tricky_rows(sample_rows):
+    """固定布局下容易读偏的单元格：文本日期 / 文本数值 / 空行 / 表头外的列 / 错误值"""
+    rows = [list(row) for row in sample_rows]
+    rows[3][0] = '2024/1/15'
+    rows[4][4] = '12.5'
+    rows[5][7] = '#N/A'
+    rows[8][6] = '待定'
+    rows[6][9] = '备注'
+    rows[7] = rows[7] + ['表头外']
+    rows.insert(10, [None] * len(HEADER))
+    rows.append(make_row(3, weight=None))
+    rows.append([dt.datetime(2024, 1, 20, 8, 30), '统货', '理文', '粤A12345', 7, 2, 1800, 0, -50.5, None])
+    return rows
+
+
+def _decoded(df):
+    """分类列还原为普通列后比较取值（流式引擎的字典编码列读出即为分类类型）"""
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+
+@pytest.mark.parametrize('use_schema', [True, False])
+def test_stream_matches_pandas_engine(tmp_path, sample_rows, use_schema, monkeypatch):
+    import data.loader as loader
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': _tricky_rows(sample_rows)})
+    monkeypatch.setattr(loader, 'SCHEMA_PROFILE_ENABLED', use_schema)
+
+    results = {}
+    for engine in ['stream', 'pandas']:
+        raw = load_and_clean_sheet(path, '1月', engine=engine)
+        assert raw is not None
+        results[engine] = (raw, *clean_sheet_frame(raw.copy()))
+
+    stream_raw, stream_df, stream_info = results['stream']
+    pandas_raw, pandas_df, pandas_info = results['pandas']
+    assert list(stream_raw.columns) == list(pandas_raw.columns)
+    assert len(stream_raw) == len(pandas_raw)
+    assert stream_raw[SOURCE_ROW_COL].tolist() == pandas_raw[SOURCE_ROW_COL].tolist()
+
+    for col in STREAM_CODE_COLS:
+        assert isinstance(stream_raw[col].dtype, pd.CategoricalDtype)
+        if use_schema:
+            # 按模板读取时 pandas 引擎也在读取时转换类型
+            assert isinstance(pandas_raw[col].dtype, pd.CategoricalDtype)
+    if use_schema:
+        assert pandas_raw['卖出价'].dtype == 'float64'
+        assert pandas_raw.attrs['non_numeric']['卖出价'].tolist() == stream_raw.attrs['non_numeric']['卖出价'].tolist()
+    pd.testing.assert_frame_equal(_decoded(stream_df), _decoded(pandas_df), check_dtype=False)
+    assert stream_info['audit'].counts() == pandas_info['audit'].counts()
+    assert stream_info['checks'].hits.keys() == pandas_info['checks'].hits.keys()
+    for key, rows in stream_info['checks'].hits.items():
+        assert rows.indices().tolist() == pandas_info['checks'].hits[key].indices().tolist()
+
+
+def test_multi_sheet_finalize_matches(tmp_path, sample_rows):
+    path = write_workbook(tmp_path / 'book.xlsx', {'1月': sample_rows, '2月': _tricky_rows(sample_rows)})
+    merged = {}
+    for engine in ['stream', 'pandas']:
+        parts = [clean_sheet_frame(load_and_clean_sheet(path, sheet, engine=engine)) for sheet in ['1月', '2月']]
+        merged[engine], _ = finalize_cleaned_frames([p[0] for p in parts], [p[1] for p in parts])
+    pd.testing.assert_frame_equal(_decoded(merged['stream']), _decoded(merged['pandas']), check_dtype=False)
+    # 各工作表的分类列合并后仍为分类类型，类别已排序
+    plates = merged['stream']['车牌号']
+    assert isinstance(plates.dtype, pd.CategoricalDtype)
+    assert list(plates.cat.categories) == sorted(plates.dropna().unique())
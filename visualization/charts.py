@@ -96,7 +96,7 @@ def add_sankey_diagram(fig, df):
         dests = df['发往地'].unique()
         labels = list(cats) + list(dests)
         label_map = {label: i for i, label in enumerate(labels)}
-        sankey_data = df.groupby(['类别', '发往地'])['重量（吨）'].sum().reset_index()
+        sankey_data = df.groupby(['类别', '发往地'], observed=True)['重量（吨）'].sum().reset_index()
         
         current_colors = (NEON_COLORS * (len(labels) // len(NEON_COLORS) + 1))[:len(labels)]
         
@@ -140,12 +140,12 @@ def add_sankey_diagram(fig, df):
 
 def add_daily_trend_chart(fig, df):
     """添加每日发货趋势 & AI预测"""
-    daily_trend = df.groupby(['Date', '中文日期'])['重量（吨）'].sum().reset_index().sort_values('Date')
+    daily_trend = df.groupby(['Date', '中文日期'], observed=True)['重量（吨）'].sum().reset_index().sort_values('Date')
     
     if daily_trend.empty:
         return
 
-    daily_trend['运输次数'] = df.groupby(['Date', '中文日期']).size().values
+    daily_trend['运输次数'] = df.groupby(['Date', '中文日期'], observed=True).size().values
     
     # 实际趋势线
     fig.add_trace(go.Scatter(
@@ -185,7 +185,7 @@ def add_sunburst_chart(fig, df):
         fig.add_trace(sb_trace, row=3, col=1)
     except Exception:
         # 降级为饼图
-        cat_sum = df.groupby('类别')['重量（吨）'].sum().reset_index()
+        cat_sum = df.groupby('类别', observed=True)['重量（吨）'].sum().reset_index()
         fig.add_trace(go.Pie(
             labels=cat_sum['类别'], values=cat_sum['重量（吨）'], hole=0.5,
             marker=dict(colors=NEON_COLORS, line=dict(color='white', width=2)),
@@ -196,7 +196,7 @@ def add_sunburst_chart(fig, df):
 
 def add_vehicle_ranking(fig, df):
     """添加运输车辆 Top 8"""
-    vehicle_stats = df.groupby('车牌号').agg({
+    vehicle_stats = df.groupby('车牌号', observed=True).agg({
         '重量（吨）': 'sum',
         '中文日期': 'count'
     }).rename(columns={'中文日期': '运输次数'})
@@ -223,7 +223,7 @@ def add_vehicle_ranking(fig, df):
 
 def add_category_profit_chart(fig, df):
     """添加各品种吨利润"""
-    profit_rank = df.groupby('类别')['吨利润'].agg(['mean', 'std']).reset_index().sort_values('mean')
+    profit_rank = df.groupby('类别', observed=True)['吨利润'].agg(['mean', 'std']).reset_index().sort_values('mean')
     fig.add_trace(go.Bar(
         y=profit_rank['类别'], x=profit_rank['mean'], orientation='h',
         error_x=dict(type='data', array=profit_rank['std'], visible=True),
@@ -248,7 +248,7 @@ def add_bubble_chart(fig, df):
             color=df['利润率'], colorscale='Portland', showscale=True,
             colorbar=dict(title="利润率%", x=1.02, y=0.5, len=0.4), line=dict(width=1, color='White')
         ),
-        text=df['车牌号'] + "<br>" + df['中文日期'] + "<br>品类:" + df['类别'],
+        text=df['车牌号'].astype(str) + "<br>" + df['中文日期'].astype(str) + "<br>品类:" + df['类别'].astype(str),
         hovertemplate='<b>%{text}</b><br>运费单价: %{x:.1f}元<br>吨利润: %{y:.1f}元<extra></extra>',
         name='运输批次'
     ), row=4, col=2)
@@ -257,7 +257,7 @@ def add_bubble_chart(fig, df):
 def add_heatmap(fig, df):
     """添加品类-目的地矩阵图 (颜色与桑基图保持一致)"""
     # 准备聚合数据
-    grouped = df.groupby(['类别', '发往地'])['重量（吨）'].sum().reset_index()
+    grouped = df.groupby(['类别', '发往地'], observed=True)['重量（吨）'].sum().reset_index()
     if grouped.empty: return
 
     # 1. 获取品类颜色映射 (逻辑必须与桑基图完全一致，确保视觉统一)
@@ -306,7 +306,7 @@ def add_week_radar(fig, df):
     Returns:
         float: 周统计数据中的最大值，用于设置雷达图范围
     """
-    week_stats = df.groupby('星期')['重量（吨）'].sum().reindex(WEEK_ORDER, fill_value=0)
+    week_stats = df.groupby('星期', observed=True)['重量（吨）'].sum().reindex(WEEK_ORDER, fill_value=0)
     fig.add_trace(go.Scatterpolar(
         r=week_stats.values, theta=week_stats.index, fill='toself',
         name='周度发货分布', line_color='#FF00CC', opacity=0.8